@@ -0,0 +1,269 @@
+"""Audio helpers between TTS and video generation (duration, silence trimming, native-format conversion)."""
+
+import io
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+def audio_duration(audio_bytes: bytes, filename: str = "audio.mp3") -> float:
+    """Duration in seconds from the decoded sample count, falling back to the container header."""
+    try:
+        import soundfile as sf
+
+        info = sf.info(io.BytesIO(audio_bytes))
+        if info.frames > 0 and info.samplerate > 0:
+            return round(info.frames / info.samplerate, 3)
+    except Exception:
+        pass
+
+    try:
+        from mutagen import File as MutagenFile
+
+        suffix = os.path.splitext(filename)[1] or ".mp3"
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            tmp.write(audio_bytes)
+            temp_path = tmp.name
+        try:
+            media = MutagenFile(temp_path)
+        finally:
+            os.remove(temp_path)
+        if media and getattr(media, "info", None) and getattr(media.info, "length", None):
+            return round(float(media.info.length), 3)
+    except Exception:
+        return 0.0
+    return 0.0
+
+
+@dataclass
+class ConditionedAudio:
+    audio_bytes: bytes
+    filename: str
+    original_duration_sec: float
+    duration_sec: float
+    trimmed_leading_sec: float = 0.0
+    trimmed_trailing_sec: float = 0.0
+    collapsed_pause_sec: float = 0.0
+    applied: bool = False
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def saved_sec(self) -> float:
+        return round(max(0.0, self.original_duration_sec - self.duration_sec), 3)
+
+    def saved_frames(self, fps: int) -> int:
+        return int(round(self.saved_sec * fps))
+
+
+def _voiced_frames(mono, sample_rate: int, frame_sec: float, silence_db: float, dynamic_range_db: float):
+    """Energy VAD: per-frame voiced mask and the frame length in samples."""
+    import numpy as np
+
+    hop = max(1, int(sample_rate * frame_sec))
+    n_frames = len(mono) // hop
+    if n_frames == 0:
+        return np.zeros(0, dtype=bool), hop
+    frames = mono[: n_frames * hop].reshape(n_frames, hop)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    level_db = 20.0 * np.log10(rms + 1e-10)
+    # quiet recordings: stay within dynamic_range_db of the loud part instead of a fixed floor only
+    threshold = max(silence_db, float(np.percentile(level_db, 95)) - dynamic_range_db)
+    return level_db > threshold, hop
+
+
+def _silent_runs(voiced) -> List[Tuple[int, int]]:
+    """(start, end) frame ranges of consecutive unvoiced frames."""
+    import numpy as np
+
+    padded = np.concatenate(([True], voiced, [True])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _decode(audio_bytes: bytes):
+    """(samples float32 [n, channels], sample_rate, soundfile info) or raises."""
+    import soundfile as sf
+
+    data, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+    return data, sample_rate, sf.info(io.BytesIO(audio_bytes))
+
+
+def _encode(data, sample_rate: int, fmt: str, subtype: Optional[str]) -> bytes:
+    import soundfile as sf
+
+    if subtype and not sf.check_format(fmt, subtype):
+        subtype = None
+    buffer = io.BytesIO()
+    sf.write(buffer, data, sample_rate, format=fmt, subtype=subtype)
+    return buffer.getvalue()
+
+
+def _trim(data, sample_rate: int, silence_db: float, dynamic_range_db: float, edge_pad_sec: float, max_pause_sec: float, frame_sec: float):
+    """Samples with silence cut, plus (leading, trailing, collapsed) sample counts; None when silent."""
+    import numpy as np
+
+    total = data.shape[0]
+    voiced, hop = _voiced_frames(data.mean(axis=1), sample_rate, frame_sec, silence_db, dynamic_range_db)
+    if not voiced.any():
+        return None
+
+    # keep (start, end) sample ranges: speech plus edge_pad on both ends, long pauses shortened
+    voiced_idx = np.flatnonzero(voiced)
+    pad = int(edge_pad_sec * sample_rate)
+    start = max(0, int(voiced_idx[0]) * hop - pad)
+    end = min(total, (int(voiced_idx[-1]) + 1) * hop + pad)
+    keep: List[Tuple[int, int]] = []
+    cursor = start
+    collapsed = 0
+    max_pause = int(max_pause_sec * sample_rate)
+    for run_start, run_end in _silent_runs(voiced[voiced_idx[0] : voiced_idx[-1] + 1]):
+        gap_start = (int(voiced_idx[0]) + run_start) * hop
+        gap_end = (int(voiced_idx[0]) + run_end) * hop
+        if gap_end - gap_start <= max_pause:
+            continue
+        # keep half of the allowed pause on each side of the cut
+        keep.append((cursor, gap_start + max_pause // 2))
+        cursor = gap_end - (max_pause - max_pause // 2)
+        collapsed += (gap_end - gap_start) - max_pause
+    keep.append((cursor, end))
+
+    # short fades at every cut so the joins do not click
+    fade = min(int(0.005 * sample_rate), min(e - s for s, e in keep) // 2)
+    pieces = []
+    for s, e in keep:
+        piece = data[s:e].copy()
+        if fade > 0:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)[:, None]
+            piece[:fade] *= ramp
+            piece[-fade:] *= ramp[::-1]
+        pieces.append(piece)
+    return np.concatenate(pieces), (start, total - end, collapsed)
+
+
+def _resample(data, sample_rate: int, target_rate: int):
+    """Band-limited FFT resampling of [n, channels] samples (the spectrum above the new Nyquist is dropped)."""
+    import numpy as np
+
+    if sample_rate == target_rate or data.shape[0] == 0:
+        return data
+    n_in = data.shape[0]
+    # zero padding keeps the circular FFT from wrapping the end onto the start
+    pad = int(0.05 * sample_rate)
+    padded = np.concatenate([data, np.zeros((pad, data.shape[1]), dtype=data.dtype)])
+    n_out_padded = int(round(padded.shape[0] * target_rate / sample_rate))
+    spectrum = np.fft.rfft(padded, axis=0)
+    bins = n_out_padded // 2 + 1
+    if bins <= spectrum.shape[0]:
+        spectrum = spectrum[:bins]
+    else:
+        spectrum = np.concatenate([spectrum, np.zeros((bins - spectrum.shape[0], data.shape[1]), dtype=spectrum.dtype)])
+    out = np.fft.irfft(spectrum, n=n_out_padded, axis=0) * (n_out_padded / padded.shape[0])
+    out = out[: int(round(n_in * target_rate / sample_rate))]
+    return np.clip(out, -1.0, 1.0).astype(np.float32)
+
+
+def condition_audio(
+    audio_bytes: bytes,
+    filename: str,
+    trim: bool = True,
+    target_sample_rate: int = 16000,
+    silence_db: float = -45.0,
+    dynamic_range_db: float = 40.0,
+    edge_pad_sec: float = 0.15,
+    max_pause_sec: float = 0.8,
+    frame_sec: float = 0.02,
+    min_saving_sec: float = 0.05,
+    max_duration_sec: float = 0.0,
+    peak_db: Optional[float] = None,
+    native_format: str = "WAV",
+) -> ConditionedAudio:
+    """Decode once, optionally trim silence, then downmix/resample to mono 16-bit native_format
+    (WAV or FLAC) at target_sample_rate.
+
+    target_sample_rate=0 keeps channels, rate and container (only trimming is applied).
+    max_duration_sec > 0 cuts longer audio at the quietest frame of its last second;
+    peak_db scales the audio so its peak sits at that level (dBFS).
+    Returns the input untouched (applied=False) when nothing changed or the audio cannot be processed.
+    """
+    unchanged = ConditionedAudio(audio_bytes, filename, 0.0, 0.0)
+    try:
+        import numpy as np
+        import soundfile  # noqa: F401
+    except ImportError as e:
+        unchanged.notes.append(f"skipped: {e.name} not installed")
+        return unchanged
+
+    try:
+        data, sample_rate, info = _decode(audio_bytes)
+    except Exception as e:
+        unchanged.notes.append(f"skipped: cannot decode audio ({e})")
+        return unchanged
+
+    total = data.shape[0]
+    unchanged.original_duration_sec = unchanged.duration_sec = round(total / sample_rate, 3)
+    result = ConditionedAudio(audio_bytes, filename, unchanged.original_duration_sec, unchanged.duration_sec)
+
+    if trim:
+        trimmed = _trim(data, sample_rate, silence_db, dynamic_range_db, edge_pad_sec, max_pause_sec, frame_sec)
+        if trimmed is None:
+            result.notes.append("not trimmed: no speech detected")
+        elif (total - trimmed[0].shape[0]) / sample_rate < min_saving_sec:
+            result.notes.append("not trimmed: nothing worth trimming")
+        else:
+            data, (leading, trailing, collapsed) = trimmed
+            result.trimmed_leading_sec = round(leading / sample_rate, 3)
+            result.trimmed_trailing_sec = round(trailing / sample_rate, 3)
+            result.collapsed_pause_sec = round(collapsed / sample_rate, 3)
+            result.applied = True
+
+    limit = int(max_duration_sec * sample_rate)
+    if limit > 0 and data.shape[0] > limit:
+        # cut in the quietest frame of the last second so a word is not chopped in half
+        hop = max(1, int(sample_rate * frame_sec))
+        window_start = max(0, limit - sample_rate)
+        window = data[window_start:limit].mean(axis=1)
+        n_frames = len(window) // hop
+        cut = limit
+        if n_frames:
+            energy = np.square(window[: n_frames * hop].reshape(n_frames, hop)).mean(axis=1)
+            cut = window_start + int(np.argmin(energy)) * hop + hop // 2
+        data = data[:cut].copy()
+        fade = min(int(0.02 * sample_rate), cut)
+        data[cut - fade :] *= np.linspace(1.0, 0.0, fade, dtype=np.float32)[:, None]
+        result.notes.append(f"cut to {cut / sample_rate:.2f}s")
+        result.applied = True
+
+    base = os.path.splitext(os.path.basename(filename or "audio"))[0]
+    native = target_sample_rate and (
+        info.channels != 1 or sample_rate != target_sample_rate or info.format != native_format or info.subtype != "PCM_16"
+    )
+    if native:
+        data = _resample(data.mean(axis=1, keepdims=True), sample_rate, target_sample_rate)
+        sample_rate = target_sample_rate
+
+    # after resampling, which can move the peak
+    if peak_db is not None and data.shape[0]:
+        peak = float(np.abs(data).max())
+        if peak > 0:
+            gain = 10 ** (peak_db / 20) / peak
+            if abs(20 * np.log10(gain)) > 0.1:
+                data = np.clip(data * gain, -1.0, 1.0).astype(np.float32)
+                result.applied = True
+
+    if native:
+        result.audio_bytes = _encode(data, sample_rate, native_format, "PCM_16")
+        result.filename = base + {"WAV": ".wav", "FLAC": ".flac"}[native_format]
+        result.applied = True
+    elif result.applied:
+        # re-encode in the same container when soundfile can write it, otherwise as WAV
+        fmt = info.format if info.format in ("WAV", "FLAC", "OGG") else "WAV"
+        result.audio_bytes = _encode(data, sample_rate, fmt, info.subtype)
+        result.filename = base + {"WAV": ".wav", "FLAC": ".flac", "OGG": ".ogg"}[fmt]
+    else:
+        return result
+
+    result.duration_sec = round(data.shape[0] / sample_rate, 3)
+    return result
@@ -48,10 +48,34 @@ class Settings(BaseSettings):
     comfyui_ws_url: str = "ws://127.0.0.1:8188/ws"
     comfyui_timeout_sec: int = 900
     tts_generation_timeout_sec: int = 0
+    # silence trimming of generated audio (fewer video frames in follow_audio mode)
+    audio_trim_enabled: bool = True
+    audio_trim_silence_db: float = -45.0
+    audio_trim_edge_pad_sec: float = 0.15
+    audio_trim_max_pause_sec: float = 0.8
+    # the video model gets a mono 16-bit FLAC copy at this rate (its wav2vec input); the user keeps the
+    # full-band audio. 0: the video model gets the user's audio too
+    audio_target_sample_rate: int = 16000
+
+    # reference-voice library (samples registered once, reused by voice_id)
+    voice_sample_rate: int = 24000
+    voice_max_duration_sec: float = 15.0
+    voice_peak_db: float = -1.0
+    voice_runninghub_file_ttl_sec: int = 86400  # re-upload the sample to RunningHub after this; 0: never
     comfyui_poll_interval_sec: float = 3.0
     comfyui_client_id: str = "digital-human-backend"
     comfy_base_path: str = ""
-    comfy_stop_server_after_completion: bool = True
+    comfy_stop_server_after_completion: bool = False
+    comfy_pool_size: int = 1
+    comfy_pool_base_port: int = 4333
+    comfy_pool_max_processes: int = 16  # processes with their own pool; process n uses base + n * size
+    comfy_pool_idle_timeout_sec: int = 1800  # 0: keep servers running until shutdown
+    comfy_pool_max_restarts: int = 3  # crash restarts allowed per server within 10 minutes
+    comfy_pool_warmup: bool = False
+    comfy_pool_warmup_count: int = 0  # 0: warm every pooled server
+    comfy_server_startup_timeout_sec: int = 120
+    comfy_ws_recv_timeout_sec: float = 30.0  # quiet websocket -> check /history for completion
+    comfy_workspace_dir: str = "./outputs/comfy_workspaces"  # per-server input/output/temp dirs
     infinitetalk_workflow_path: str = os.path.abspath(
         os.path.join(os.path.dirname(__file__), "..", "..", "infinitetalk单人_syncfix_api.json")
     )
@@ -69,6 +93,7 @@ class Settings(BaseSettings):
     runninghub_api_key: str = ""
     runninghub_audio_workflow_id: str = "2021124895765172225"
     runninghub_video_workflow_id: str = "2021102605702795266"
+    infinitetalk_workflow_num_frames: int = 0  # num_frames saved in the video workflow; only for reporting saved frames
     runninghub_poll_interval_sec: float = 5.0
     runninghub_audio_timeout_sec: int = 0
     runninghub_video_timeout_sec: int = 0
@@ -79,10 +104,45 @@ class Settings(BaseSettings):
 
     # 2.0 defaults
     default_duration_mode: str = "follow_audio"
-    video_provider: str = "infinitetalk"
+    video_provider: str = "infinitetalk"  # preferred backend: infinitetalk / seedance / auto
+    # seedance voices the script itself (not the task's TTS/cloned voice), so it is opt-in
+    video_providers_enabled: str = "infinitetalk"
+    video_provider_spill_in_flight: int = 0  # preferred backend busy with this many jobs -> route elsewhere; 0: never
+    video_failover_enabled: bool = True
+    video_provider_degraded_after_failures: int = 3
+    video_provider_degraded_cooldown_sec: int = 300
+    seedance_video_timeout_sec: int = 600
+    video_faststart_enabled: bool = True  # move moov before mdat before uploading the final video
+    video_faststart_spool_mb: float = 64.0  # rewritten video kept in memory up to this size, then on disk
 
     # service
     output_folder_path: str = "./outputs/"
 
+    # task store / generation workers
+    task_store_path: str = "./outputs/tasks.db"
+    generation_worker_mode: str = "inline"  # inline: run in API process; process: enqueue for worker.py
+    worker_processes: int = 2
+    worker_concurrency: int = 2
+    worker_poll_interval_sec: float = 1.0
+    worker_job_stale_sec: int = 120
+    worker_job_max_attempts: int = 2
+
+    # content-addressed disk cache of downloaded input files (keyed by URL, deduplicated by content hash)
+    download_cache_enabled: bool = True
+    download_cache_dir: str = "./outputs/download_cache"
+    download_cache_max_mb: float = 2048.0  # least recently used files are evicted above this
+    download_cache_max_object_mb: float = 32.0  # larger downloads (e.g. provider videos) are not cached
+    download_cache_hosts: str = ""  # comma-separated hosts whose URLs never change content; empty: the OSS host
+
+    # in-memory task cache (evicted records are reloaded from the task store)
+    task_cache_max_entries: int = 1000
+    task_cache_max_mb: float = 64.0
+    task_cache_ttl_sec: int = 3600
+    task_cache_terminal_ttl_sec: int = 300
+
+    # diagnostics
+    trace_max_spans_per_task: int = 2000
+    trace_retention_days: float = 7.0  # stored spans older than this are pruned; 0 keeps them
+
 
 settings = Settings()
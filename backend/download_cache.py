@@ -0,0 +1,238 @@
+"""Content-addressed disk cache for downloaded input files (portraits, scenes, model images, audio)."""
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class DownloadCache:
+    """URL -> bytes cache on disk with content-hash dedup, a byte cap with LRU eviction and single-flight.
+
+    Layout under root: objects/<sha256[:2]>/<sha256> holds the content, urls/<sha256(url)> holds the
+    content hash of that URL, so URLs serving the same bytes share one object. Every file is written
+    to a temp file and renamed into place, so readers never see a partial file. Entries are never
+    revalidated, so only URLs on the given hosts are cached: our OSS gives every upload a unique key.
+    Any other URL (e.g. a user-supplied portrait link whose content may change) is fetched every time.
+
+    LRU order is the object mtime (touched on every hit), so it survives restarts. Each process
+    accounts for the objects it has seen; other processes sharing the directory evict on their own.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_object_bytes: int, hosts: Iterable[str]) -> None:
+        self.root = root
+        self.hosts = frozenset(h.strip().lower() for h in hosts if h and h.strip())
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_object_bytes = max(0, int(max_object_bytes))
+        # content sha256 -> size, least recently used first; loaded from disk on first use
+        self._objects: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        # url -> download shared by every caller asking for it meanwhile
+        self._inflight: Dict[str, "asyncio.Task[Tuple[bytes, bool]]"] = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.dedup = 0
+        self.evictions = 0
+        self.errors = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+
+    async def get(self, url: str, fetch: Callable[[str], Awaitable[bytes]]) -> bytes:
+        """Bytes of url from the cache, or from fetch(url) (then stored). Concurrent calls share one fetch."""
+        if not self.cacheable(url):
+            with self._lock:
+                self.bypassed += 1
+            return await fetch(url)
+        task = self._inflight.get(url)
+        joined = task is not None
+        if task is None:
+            task = asyncio.ensure_future(self._load(url, fetch))
+            self._inflight[url] = task
+            task.add_done_callback(lambda t: self._finish(url, t))
+        # shielded: one caller giving up must not cancel the download the others wait for
+        data, from_cache = await asyncio.shield(task)
+        with self._lock:
+            if joined:
+                self.coalesced += 1
+            elif from_cache:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.bytes_downloaded += len(data)
+            if joined or from_cache:
+                self.bytes_saved += len(data)
+        return data
+
+    def cacheable(self, url: str) -> bool:
+        return (urlparse(url).hostname or "").lower() in self.hosts
+
+    def _finish(self, url: str, task: "asyncio.Task[Tuple[bytes, bool]]") -> None:
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        # retrieve the exception so a download nobody waits for anymore does not warn
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(self, url: str, fetch: Callable[[str], Awaitable[bytes]]) -> Tuple[bytes, bool]:
+        data = await asyncio.to_thread(self._read, url)
+        if data is not None:
+            return data, True
+        data = await fetch(url)
+        try:
+            await asyncio.to_thread(self._write, url, data)
+        except OSError:
+            # a full or read-only disk must not fail the download itself
+            with self._lock:
+                self.errors += 1
+        return data, False
+
+    @staticmethod
+    def _hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _url_path(self, url: str) -> str:
+        return os.path.join(self.root, "urls", self._hash(url.encode("utf-8")))
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def _atomic_write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _ensure_loaded(self) -> None:
+        """Index the objects already on disk (oldest first) and drop URL entries whose object is gone."""
+        if self._loaded:
+            return
+        found = []
+        objects_dir = os.path.join(self.root, "objects")
+        for dirpath, _, filenames in os.walk(objects_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.startswith(".tmp-"):
+                    # left behind by a crash mid-write
+                    self._remove(path)
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, name, st.st_size))
+        for _, digest, size in sorted(found):
+            self._objects[digest] = size
+            self._bytes += size
+
+        urls_dir = os.path.join(self.root, "urls")
+        if os.path.isdir(urls_dir):
+            for name in os.listdir(urls_dir):
+                path = os.path.join(urls_dir, name)
+                digest = self._read_text(path)
+                if name.startswith(".tmp-") or digest not in self._objects:
+                    self._remove(path)
+        self._loaded = True
+
+    @staticmethod
+    def _read_text(path: str) -> Optional[str]:
+        try:
+            with open(path, "r", encoding="ascii") as f:
+                return f.read().strip()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _read(self, url: str) -> Optional[bytes]:
+        url_path = self._url_path(url)
+        with self._lock:
+            self._ensure_loaded()
+            digest = self._read_text(url_path)
+            if not digest:
+                return None
+            path = self._object_path(digest)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                # evicted (possibly by another process)
+                self._remove(url_path)
+                self._bytes -= self._objects.pop(digest, 0)
+                return None
+            if digest not in self._objects:
+                # written by another process sharing the directory
+                self._bytes += len(data)
+            self._objects[digest] = len(data)
+            self._objects.move_to_end(digest)
+            return data
+
+    def _write(self, url: str, data: bytes) -> None:
+        if not data or len(data) > self.max_object_bytes or len(data) > self.max_bytes:
+            return
+        digest = self._hash(data)
+        path = self._object_path(digest)
+        with self._lock:
+            self._ensure_loaded()
+            if os.path.exists(path):
+                # same content under another URL
+                self.dedup += 1
+                os.utime(path)
+            else:
+                self._atomic_write(path, data)
+            if digest not in self._objects:
+                self._bytes += len(data)
+            self._objects[digest] = len(data)
+            self._objects.move_to_end(digest)
+            self._atomic_write(self._url_path(url), digest.encode("ascii"))
+            self._evict()
+
+    def _evict(self) -> None:
+        # URL entries of evicted objects are dropped when they are next looked up
+        while self._bytes > self.max_bytes and len(self._objects) > 1:
+            digest, size = self._objects.popitem(last=False)
+            self._bytes -= size
+            self._remove(self._object_path(digest))
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            return {
+                "entries": len(self._objects),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_object_bytes": self.max_object_bytes,
+                "hosts": sorted(self.hosts),
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+                "dedup": self.dedup,
+                "evictions": self.evictions,
+                "write_errors": self.errors,
+                "bytes_saved": self.bytes_saved,
+                "bytes_downloaded": self.bytes_downloaded,
+                "in_flight": len(self._inflight),
+            }
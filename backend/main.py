@@ -1,9 +1,12 @@
 ﻿"""数字人后端 API - FastAPI 应用"""
+import asyncio
+import logging
 import os
 import uuid
-from typing import List, Optional
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, Header, HTTPException, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
@@ -13,10 +16,17 @@ from models import (
     DigitalHumanResult,
     MaterialUploadResponse,
     ScriptGenerationResponse,
+    TaskData,
     TaskStatus,
     TaskStatusResponse,
+    VoiceProfile,
+    VoiceProfileResponse,
 )
+from services import comfyui_service, video_router, voice_library_service
 from task_manager import task_manager
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
 
 os.makedirs(settings.output_folder_path, exist_ok=True)
 
@@ -32,8 +42,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+@app.on_event("startup")
+async def warm_up_comfy_pool():
+    if not settings.comfy_pool_warmup:
+        return
+
+    async def warm_up() -> None:
+        try:
+            await comfyui_service.warm_up()
+        except Exception:
+            logger.exception("ComfyUI pool warm-up failed")
+
+    # Do not block API startup on model loading.
+    asyncio.create_task(warm_up())
+
+
+@app.on_event("shutdown")
+async def stop_comfy_pool():
+    await comfyui_service.shutdown()
+
+
+# task_id -> (version, serialized TaskStatusResponse); status polls of an unchanged task reuse the bytes.
+_status_cache: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+
 
 @app.get("/")
 async def root():
@@ -48,9 +82,9 @@ async def upload_materials(
 ):
     try:
         if not task_id:
-            task_id = task_manager.create_task()
-        elif not task_manager.get_task(task_id):
-            task_id = task_manager.create_task()
+            task_id = await task_manager.create_task_async()
+        elif not await task_manager.get_task_async(task_id):
+            task_id = await task_manager.create_task_async()
 
         scene_data = []
         for img in scene_images[:2]:
@@ -91,7 +125,7 @@ async def generate_script(
     language: str = Form(default="zh", description="输出语言: zh/en"),
 ):
     try:
-        task = task_manager.get_task(task_id)
+        task = await task_manager.get_task_async(task_id)
         if not task:
             raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
 
@@ -123,21 +157,24 @@ async def generate_audio(
     task_id: str = Form(..., description="任务ID"),
     language: Optional[str] = Form(default=None, description="可选覆盖任务语言"),
     voice_text: Optional[str] = Form(default=None, description="可选覆盖任务文案，支持前端编辑后提交"),
-    reference_audio: Optional[UploadFile] = File(default=None, description="参考音频（必传）"),
+    reference_audio: Optional[UploadFile] = File(default=None, description="参考音频（与 voice_id 二选一）"),
+    voice_id: Optional[str] = Form(default=None, description="声音库中的声音 ID（与参考音频二选一）"),
 ):
     """仅使用 MegaTTS3 生成音频。"""
-    task = task_manager.get_task(task_id)
+    task = await task_manager.get_task_async(task_id)
     if not task:
         raise HTTPException(status_code=404, detail=format_error("TASK_NOT_FOUND", f"任务 {task_id} 不存在"))
 
     try:
-        if reference_audio is None:
-            raise AppError("MEGA_TTS3_REFERENCE_AUDIO_REQUIRED", "参考音频为必填项。")
+        voice_id = (voice_id or "").strip() or None
+        if reference_audio is None and not voice_id:
+            raise AppError("MEGA_TTS3_REFERENCE_AUDIO_REQUIRED", "参考音频或 voice_id 为必填项。")
 
         reference_audio_bytes = None
         reference_audio_filename = "reference.wav"
-        reference_audio_bytes = await reference_audio.read()
-        reference_audio_filename = reference_audio.filename or reference_audio_filename
+        if reference_audio is not None and not voice_id:
+            reference_audio_bytes = await reference_audio.read()
+            reference_audio_filename = reference_audio.filename or reference_audio_filename
 
         result = await task_manager.generate_audio(
             task_id=task_id,
@@ -145,12 +182,15 @@ async def generate_audio(
             voice_text_override=voice_text,
             reference_audio_bytes=reference_audio_bytes,
             reference_audio_filename=reference_audio_filename,
+            voice_id=voice_id,
         )
 
         return AudioGenerationResponse(
             task_id=task_id,
             audio_url=result["audio_url"],
             audio_duration_sec=result["audio_duration_sec"],
+            audio_trimmed_sec=result.get("audio_trimmed_sec", 0.0),
+            video_frames_saved=result.get("video_frames_saved", 0),
             tts_engine_used=result["tts_engine_used"],
             fallback_used=False,
             message="音频生成成功",
@@ -169,7 +209,7 @@ async def start_generation(
     fixed_duration_sec: Optional[int] = Form(default=None, description="固定时长秒数（仅 fixed 模式有效）"),
 ):
     try:
-        task = task_manager.get_task(task_id)
+        task = await task_manager.get_task_async(task_id)
         if not task:
             raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
 
@@ -196,11 +236,49 @@ async def start_generation(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _status_etag(task_id: str, version: int) -> str:
+    return f'"{task_id}-{version}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
 @app.get("/api/digital-human/status/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(task_id: str):
-    task = task_manager.get_task(task_id)
+async def get_task_status(task_id: str, if_none_match: Optional[str] = Header(default=None)):
+    version = await task_manager.get_task_version_async(task_id)
+    if version is None:
+        _status_cache.pop(task_id, None)
+        raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
+
+    etag = _status_etag(task_id, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    cached = _status_cache.get(task_id)
+    if cached and cached[0] == version:
+        _status_cache.move_to_end(task_id)
+        return Response(content=cached[1], media_type="application/json", headers=headers)
+
+    task = await task_manager.get_task_async(task_id)
     if not task:
         raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
+    body = _build_status_response(task).model_dump_json().encode("utf-8")
+    # The record may have moved on since the version lookup; label the body with what was serialized.
+    headers["ETag"] = _status_etag(task_id, task.version)
+    _status_cache[task_id] = (task.version, body)
+    _status_cache.move_to_end(task_id)
+    while len(_status_cache) > settings.task_cache_max_entries:
+        _status_cache.popitem(last=False)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _build_status_response(task: TaskData) -> TaskStatusResponse:
+    task_id = task.task_id
 
     result = None
     if task.status in [TaskStatus.AUDIO_READY, TaskStatus.COMPLETED]:
@@ -216,6 +294,7 @@ async def get_task_status(task_id: str):
             "aspect_ratio_applied": task.aspect_ratio_applied,
             "runninghub_audio_task_id": task.runninghub_audio_task_id,
             "runninghub_video_task_id": task.runninghub_video_task_id,
+            "ark_video_task_id": task.ark_video_task_id,
         }
 
     return TaskStatusResponse(
@@ -231,7 +310,7 @@ async def get_task_status(task_id: str):
 
 @app.get("/api/digital-human/result/{task_id}", response_model=DigitalHumanResult)
 async def get_task_result(task_id: str):
-    task = task_manager.get_task(task_id)
+    task = await task_manager.get_task_async(task_id)
     if not task:
         raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
 
@@ -252,7 +331,7 @@ async def get_task_result(task_id: str):
 
 @app.get("/api/digital-human/debug/{task_id}")
 async def get_task_debug(task_id: str):
-    task = task_manager.get_task(task_id)
+    task = await task_manager.get_full_task_async(task_id)
     if not task:
         raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
 
@@ -288,35 +367,128 @@ async def get_task_debug(task_id: str):
             "seedream_reference_image_url": task.seedream_reference_image_url,
             "audio_url": task.audio_url,
             "final_audio_url": task.final_audio_url,
+            "video_audio_url": task.video_audio_url,
             "audio_duration_sec": task.audio_duration_sec,
+            "audio_original_duration_sec": task.audio_original_duration_sec,
+            "audio_trimmed_sec": task.audio_trimmed_sec,
+            "video_frames_saved": task.video_frames_saved,
+            "video_frame_budget": task.video_frame_budget,
             "tts_engine_used": task.tts_engine_used,
             "video_provider": task.video_provider,
             "comfy_prompt_id": task.comfy_prompt_id,
             "runninghub_audio_task_id": task.runninghub_audio_task_id,
             "runninghub_video_task_id": task.runninghub_video_task_id,
+            "ark_video_task_id": task.ark_video_task_id,
             "aspect_ratio_applied": task.aspect_ratio_applied,
             "video_url": task.video_url,
         },
+        "timing": await asyncio.to_thread(tracer.waterfall, task_id),
     }
 
 
+@app.get("/api/digital-human/debug/{task_id}/trace")
+async def get_task_trace(task_id: str, format: str = "chrome"):
+    """导出任务耗时 span：chrome（chrome://tracing / Perfetto）或 otlp（OTLP/JSON）。"""
+    task = await task_manager.get_task_async(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
+
+    if format == "chrome":
+        return await asyncio.to_thread(tracer.to_chrome_trace, task_id)
+    if format == "otlp":
+        return await asyncio.to_thread(tracer.to_otlp, task_id)
+    raise HTTPException(status_code=400, detail=format_error("INVALID_REQUEST", "format 应为 chrome 或 otlp"))
+
+
 @app.get("/api/digital-human/task/{task_id}")
 async def get_task_detail(task_id: str):
-    task = task_manager.get_task(task_id)
+    task = await task_manager.get_full_task_async(task_id)
     if not task:
         raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
     return task.model_dump()
 
 
+@app.post("/api/digital-human/task/{task_id}/cancel")
+async def cancel_task(task_id: str):
+    """取消任务：停止本地生成并取消 RunningHub 上排队/运行中的任务。"""
+    try:
+        return await task_manager.cancel_task(task_id)
+    except AppError as e:
+        status_code = 404 if e.code == "TASK_NOT_FOUND" else 400
+        raise HTTPException(status_code=status_code, detail=format_error(e.code, e.message))
+
+
 @app.delete("/api/digital-human/task/{task_id}")
 async def delete_task(task_id: str):
-    success = task_manager.delete_task(task_id)
+    if await task_manager.get_task_async(task_id):
+        await task_manager.cancel_task(task_id)
+    success = await task_manager.delete_task_async(task_id)
+    _status_cache.pop(task_id, None)
     if not success:
         raise HTTPException(status_code=404, detail=f"任务 {task_id} 不存在")
 
     return {"message": f"任务 {task_id} 已删除"}
 
 
+def _voice_response(voice: VoiceProfile, message: str = "") -> VoiceProfileResponse:
+    return VoiceProfileResponse(**voice.model_dump(include=set(VoiceProfileResponse.model_fields)), message=message)
+
+
+@app.post("/api/voices", response_model=VoiceProfileResponse)
+async def register_voice(
+    audio: UploadFile = File(..., description="参考音频样本"),
+    name: str = Form(default="", description="声音名称"),
+):
+    """注册参考声音：裁剪静音、截取有效时长并归一化后保存，之后生成音频时传 voice_id 即可。
+
+    按音频内容去重：同一份音频再次注册时不会新建声音，而是原样返回已有声音（名称仍为首次注册时的名称，
+    message 会说明），请求中的 name 被忽略。
+    """
+    try:
+        voice, created = await voice_library_service.register(
+            name, await audio.read(), audio.filename or "voice.wav"
+        )
+        if not created:
+            return _voice_response(voice, f"该音频已注册为声音「{voice.name}」，返回已有声音")
+        return _voice_response(voice, "声音已注册")
+    except AppError as e:
+        raise HTTPException(status_code=400, detail=format_error(e.code, e.message))
+
+
+@app.get("/api/voices", response_model=List[VoiceProfileResponse])
+async def list_voices():
+    return [_voice_response(voice) for voice in await asyncio.to_thread(voice_library_service.list)]
+
+
+@app.get("/api/voices/{voice_id}", response_model=VoiceProfileResponse)
+async def get_voice(voice_id: str):
+    try:
+        return _voice_response(await asyncio.to_thread(voice_library_service.get, voice_id))
+    except AppError as e:
+        raise HTTPException(status_code=404, detail=format_error(e.code, e.message))
+
+
+@app.delete("/api/voices/{voice_id}")
+async def delete_voice(voice_id: str):
+    if not await asyncio.to_thread(voice_library_service.delete, voice_id):
+        raise HTTPException(status_code=404, detail=format_error("VOICE_NOT_FOUND", f"声音 {voice_id} 不存在"))
+    return {"message": f"声音 {voice_id} 已删除"}
+
+
+@app.get("/api/system/stats")
+async def get_system_stats():
+    return {
+        "task_cache": task_manager.tasks.stats(),
+        "comfy_pool": comfyui_service.pool_stats(),
+        "video_providers": video_router.snapshot(),
+        "download_cache": task_manager.download_cache.stats() if task_manager.download_cache else None,
+        "task_store": {
+            "blob_bytes": await asyncio.to_thread(task_manager.store.blob_bytes),
+            "jobs": await asyncio.to_thread(task_manager.store.job_counts),
+        },
+    }
+
+
 @app.get("/api/config/languages")
 async def get_languages():
     return {
@@ -25,6 +25,7 @@ class TaskStatus(str, Enum):
     GENERATING_VIDEO = "generating_video"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 class TTSEngineEnum(str, Enum):
@@ -69,6 +70,8 @@ class AudioGenerationResponse(BaseModel):
     task_id: str
     audio_url: str
     audio_duration_sec: float
+    audio_trimmed_sec: float = 0.0
+    video_frames_saved: int = 0
     tts_engine_used: TTSEngineEnum
     fallback_used: bool = False
     message: str = "音频生成成功"
@@ -113,8 +116,36 @@ class DigitalHumanResult(BaseModel):
     message: str = ""
 
 
+class VoiceProfile(BaseModel):
+    voice_id: str
+    name: str = ""
+    filename: str = ""
+    source_sha256: str = ""
+    sample_rate: int = 0
+    duration_sec: float = 0
+    original_duration_sec: float = 0
+    size_bytes: int = 0
+    created_at: str = ""
+    # RunningHub input file name of the processed sample, re-uploaded once it is older than the TTL
+    runninghub_file: Optional[str] = None
+    runninghub_uploaded_at: Optional[float] = None
+
+
+class VoiceProfileResponse(BaseModel):
+    voice_id: str
+    name: str
+    filename: str
+    sample_rate: int
+    duration_sec: float
+    original_duration_sec: float
+    size_bytes: int
+    created_at: str
+    message: str = ""
+
+
 class TaskData(BaseModel):
     task_id: str
+    version: int = 0  # bumped by TaskManager.update_task; used for status ETags
     status: TaskStatus = TaskStatus.PENDING
     progress: float = 0
     current_step: str = ""
@@ -139,14 +170,21 @@ class TaskData(BaseModel):
 
     tts_engine_used: Optional[TTSEngineEnum] = None
     final_audio_url: Optional[str] = None
+    video_audio_url: Optional[str] = None  # mono copy at AUDIO_TARGET_SAMPLE_RATE, only fed to the video model
     audio_duration_sec: Optional[float] = None
     duration_mode: DurationModeEnum = DurationModeEnum.FOLLOW_AUDIO
     fixed_duration_sec: Optional[int] = None
     audio_source: AudioSourceEnum = AudioSourceEnum.AUTO
+    voice_id: Optional[str] = None
+    audio_original_duration_sec: Optional[float] = None
+    audio_trimmed_sec: Optional[float] = None
+    video_frames_saved: Optional[int] = None
+    video_frame_budget: Optional[dict] = None
     video_provider: str = "infinitetalk"
     comfy_prompt_id: Optional[str] = None
     runninghub_audio_task_id: Optional[str] = None
     runninghub_video_task_id: Optional[str] = None
+    ark_video_task_id: Optional[str] = None
     aspect_ratio_applied: Optional[str] = None
 
     model_image_url: Optional[str] = None
@@ -0,0 +1,179 @@
+"""Move the MP4 moov box in front of mdat (no re-encode) so players can start before the download ends."""
+
+import io
+import struct
+import tempfile
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+# boxes on the path from moov to the chunk offset tables
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+_COPY_CHUNK = 1024 * 1024
+
+
+class FaststartError(Exception):
+    """The file is not an MP4 layout this module can rewrite."""
+
+
+class _Box:
+    def __init__(self, box_type: bytes, payload: bytes = b"", children: Optional[List["_Box"]] = None) -> None:
+        self.type = box_type
+        self.payload = payload
+        self.children = children
+
+    def serialize(self) -> bytes:
+        body = b"".join(child.serialize() for child in self.children) if self.children is not None else self.payload
+        if len(body) + 8 > 0xFFFFFFFF:
+            return struct.pack(">I4sQ", 1, self.type, len(body) + 16) + body
+        return struct.pack(">I4s", len(body) + 8, self.type) + body
+
+
+def _read_top_level(f: BinaryIO, file_size: int) -> List[Tuple[bytes, int, int]]:
+    """(type, offset, size) of each top-level box."""
+    boxes = []
+    offset = 0
+    while offset < file_size:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            raise FaststartError("truncated box header")
+        size, box_type = struct.unpack(">I4s", header)
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = file_size - offset
+        if size < 8 or offset + size > file_size:
+            raise FaststartError(f"invalid size for box {box_type!r} at {offset}")
+        boxes.append((box_type, offset, size))
+        offset += size
+    return boxes
+
+
+def _parse(data: bytes) -> List[_Box]:
+    boxes = []
+    pos = 0
+    while pos < len(data):
+        if len(data) - pos < 8:
+            raise FaststartError("truncated box inside moov")
+        size, box_type = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header or pos + size > len(data):
+            raise FaststartError(f"invalid size for box {box_type!r} inside moov")
+        body = data[pos + header : pos + size]
+        if box_type in _CONTAINERS:
+            boxes.append(_Box(box_type, children=_parse(body)))
+        else:
+            boxes.append(_Box(box_type, payload=body))
+        pos += size
+    return boxes
+
+
+def _offset_tables(boxes: List[_Box]):
+    for box in boxes:
+        if box.children is not None:
+            yield from _offset_tables(box.children)
+        elif box.type in (b"stco", b"co64"):
+            yield box
+
+
+def _read_offsets(box: _Box) -> Tuple[bytes, List[int]]:
+    version_flags = box.payload[:4]
+    count = struct.unpack_from(">I", box.payload, 4)[0]
+    fmt = ">%dI" if box.type == b"stco" else ">%dQ"
+    offsets = list(struct.unpack_from(fmt % count, box.payload, 8))
+    return version_flags, offsets
+
+
+def _shift_offsets(moov: _Box, shift: int) -> None:
+    """Add shift to every chunk offset; stco tables that would overflow 32 bits become co64."""
+    for box in _offset_tables([moov]):
+        version_flags, offsets = _read_offsets(box)
+        shifted = [o + shift for o in offsets]
+        if box.type == b"stco" and shifted and max(shifted) > 0xFFFFFFFF:
+            box.type = b"co64"
+        fmt = ">%dI" if box.type == b"stco" else ">%dQ"
+        box.payload = version_flags + struct.pack(">I", len(shifted)) + struct.pack(fmt % len(shifted), *shifted)
+
+
+def faststart(src: BinaryIO, dst: BinaryIO) -> bool:
+    """Write src to dst with moov moved before the first mdat.
+
+    Returns False (dst untouched) when moov already comes first. Media data is copied as is,
+    only the chunk offset tables (stco/co64) inside moov are patched.
+    """
+    src.seek(0, 2)
+    file_size = src.tell()
+    boxes = _read_top_level(src, file_size)
+
+    moov_entry = next((b for b in boxes if b[0] == b"moov"), None)
+    mdat_index = next((i for i, b in enumerate(boxes) if b[0] == b"mdat"), None)
+    if moov_entry is None:
+        raise FaststartError("no moov box")
+    if mdat_index is None or boxes.index(moov_entry) < mdat_index:
+        return False
+
+    _, moov_offset, moov_size = moov_entry
+    src.seek(moov_offset)
+    raw = src.read(moov_size)
+    header = 16 if struct.unpack_from(">I", raw)[0] == 1 else 8
+    moov = _Box(b"moov", children=_parse(raw[header:]))
+    if any(child.type == b"cmov" for child in moov.children):
+        raise FaststartError("compressed moov is not supported")
+
+    # everything from the first mdat on moves back by the new moov size; converting stco to co64
+    # grows moov, so repeat until the size is stable
+    insert_at = boxes[mdat_index][1]
+    moved = [b for b in boxes[mdat_index:] if b is not moov_entry]
+    new_size = moov_size
+    original = [(box, box.type, box.payload) for box in _offset_tables([moov])]
+    while True:
+        for box, box_type, payload in original:
+            box.type, box.payload = box_type, payload
+        # only media between the first mdat and moov is supported (the normal "moov at the end" layout)
+        for box in _offset_tables([moov]):
+            _, offsets = _read_offsets(box)
+            if any(o < insert_at or o >= moov_offset for o in offsets):
+                raise FaststartError("chunk offsets outside the media data before moov")
+        _shift_offsets(moov, new_size)
+        encoded = moov.serialize()
+        if len(encoded) == new_size:
+            break
+        new_size = len(encoded)
+
+    src.seek(0)
+    _copy(src, dst, insert_at)
+    dst.write(encoded)
+    for _, offset, size in moved:
+        src.seek(offset)
+        _copy(src, dst, size)
+    dst.flush()
+    return True
+
+
+def _copy(src: BinaryIO, dst: BinaryIO, length: int) -> None:
+    remaining = length
+    while remaining > 0:
+        chunk = src.read(min(_COPY_CHUNK, remaining))
+        if not chunk:
+            raise FaststartError("unexpected end of file")
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+
+def faststart_to_spool(data: Union[bytes, BinaryIO], max_memory_bytes: int) -> Optional[BinaryIO]:
+    """Fast-start copy in a SpooledTemporaryFile (rewound), or None when data is already fast-start."""
+    src = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+    try:
+        if not faststart(src, spool):
+            spool.close()
+            return None
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
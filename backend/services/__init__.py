@@ -6,6 +6,8 @@ from .comfyui_service import comfyui_service
 from .runninghub_service import runninghub_service
 from .mega_tts3_service import mega_tts3_service
 from .infinitetalk_service import infinitetalk_service
+from .video_backends import video_router
+from .voice_library_service import voice_library_service
 
 __all__ = [
     "tos_service",
@@ -15,4 +17,6 @@ __all__ = [
     "runninghub_service",
     "mega_tts3_service",
     "infinitetalk_service",
+    "video_router",
+    "voice_library_service",
 ]
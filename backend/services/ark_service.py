@@ -1,12 +1,15 @@
 ﻿"""BytePlus Ark API service - image and video generation."""
 
 import asyncio
+import base64
+import binascii
 from typing import Any, Dict, List, Optional, Union
 
 import httpx
 
 from config import settings
 from models import PlatformEnum
+from tracing import tracer
 
 
 class ArkService:
@@ -41,6 +44,57 @@ class ArkService:
     ) -> str:
         """Generate image with Seedream API."""
 
+        result = await self._request_image(prompt, reference_image_url, platform, response_format="url")
+        image_url = self._extract_image_url(result)
+        if not image_url:
+            raise Exception("Failed to extract image URL from response")
+
+        return image_url
+
+    async def generate_image_bytes(
+        self,
+        prompt: str,
+        reference_image_url: Optional[Union[str, List[str]]] = None,
+        platform: Optional[PlatformEnum] = None,
+    ) -> bytes:
+        """Generate image with Seedream API and return the encoded image inline (b64_json).
+
+        Falls back to one download when the response only carries a URL.
+        """
+
+        result = await self._request_image(prompt, reference_image_url, platform, response_format="b64_json")
+        encoded = self._extract_image_b64(result)
+        if encoded:
+            try:
+                return base64.b64decode(encoded, validate=False)
+            except (binascii.Error, ValueError) as e:
+                raise Exception(f"Failed to decode b64_json image: {e}") from e
+
+        image_url = self._extract_image_url(result)
+        if not image_url:
+            raise Exception("Failed to extract image from response")
+        async with httpx.AsyncClient(timeout=120.0, event_hooks=tracer.http_event_hooks()) as client:
+            response = await client.get(image_url)
+        if response.status_code != 200:
+            raise Exception(f"Image download failed: {response.status_code} {image_url}")
+        return response.content
+
+    @staticmethod
+    def image_extension(data: bytes) -> str:
+        """File extension matching the image bytes (Seedream returns JPEG or PNG)."""
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return ".png"
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return ".webp"
+        return ".jpg"
+
+    async def _request_image(
+        self,
+        prompt: str,
+        reference_image_url: Optional[Union[str, List[str]]],
+        platform: Optional[PlatformEnum],
+        response_format: str,
+    ) -> Dict[str, Any]:
         reference_images: List[str] = []
         if isinstance(reference_image_url, list):
             reference_images = [str(u).strip() for u in reference_image_url if str(u).strip()]
@@ -65,7 +119,7 @@ class ArkService:
         request_body = {
             "model": self.seedream_model,
             "prompt": full_prompt,
-            "response_format": "url",
+            "response_format": response_format,
             "size": self.seedream_size,
             "stream": False,
             "watermark": self.seedream_watermark,
@@ -77,7 +131,7 @@ class ArkService:
             # Seedream 4.5 supports native multi-image input.
             request_body["image"] = reference_images if len(reference_images) > 1 else reference_images[0]
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
+        async with httpx.AsyncClient(timeout=120.0, event_hooks=tracer.http_event_hooks()) as client:
             response = await client.post(
                 f"{self.base_url}/api/v3/images/generations",
                 headers=self._get_headers(),
@@ -87,13 +141,15 @@ class ArkService:
             if response.status_code != 200:
                 raise Exception(f"Image generation failed: {response.status_code} {response.text}")
 
-            result = response.json()
-
-            image_url = self._extract_image_url(result)
-            if not image_url:
-                raise Exception("Failed to extract image URL from response")
+            return response.json()
 
-            return image_url
+    def _extract_image_b64(self, result: Dict) -> Optional[str]:
+        """First b64_json image in the response, if any."""
+        items = result.get("data") if isinstance(result.get("data"), list) else [result.get("data") or result]
+        for item in items:
+            if isinstance(item, dict) and isinstance(item.get("b64_json"), str) and item["b64_json"].strip():
+                return item["b64_json"].strip()
+        return None
 
     def _extract_image_url(self, result: Dict) -> Optional[str]:
         """Extract image URL from API response."""
@@ -133,6 +189,7 @@ class ArkService:
         prompt: str,
         voice_text: str = "",
         language: str = "zh",
+        duration: Optional[int] = None,
     ) -> str:
         """Create video generation task with Seedance API, return task id."""
 
@@ -148,7 +205,7 @@ class ArkService:
             voiceover_lines.append("Please generate voice audio for the above text and keep lip-sync natural.")
             full_prompt += "\n\n" + "\n".join(voiceover_lines)
 
-        duration = 12
+        duration = int(duration or self.seedance_duration or 12)
         text = f"{full_prompt} --duration {duration} --camerafixed {'true' if self.seedance_camera_fixed else 'false'}"
 
         request_body = {
@@ -161,7 +218,7 @@ class ArkService:
             "duration": duration,
         }
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
+        async with httpx.AsyncClient(timeout=120.0, event_hooks=tracer.http_event_hooks()) as client:
             response = await client.post(
                 f"{self.base_url}/api/v3/contents/generations/tasks",
                 headers=self._get_headers(),
@@ -188,7 +245,7 @@ class ArkService:
     async def query_video_task(self, task_id: str) -> Dict[str, Any]:
         """Query video generation task status."""
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with httpx.AsyncClient(timeout=60.0, event_hooks=tracer.http_event_hooks()) as client:
             response = await client.get(
                 f"{self.base_url}/api/v3/contents/generations/tasks/{task_id}",
                 headers=self._get_headers(),
@@ -199,6 +256,18 @@ class ArkService:
 
             return response.json()
 
+    async def cancel_video_task(self, task_id: str) -> bool:
+        """Cancel a queued video task (Ark deletes the task; a running one is left to finish)."""
+        try:
+            async with httpx.AsyncClient(timeout=30.0, event_hooks=tracer.http_event_hooks()) as client:
+                response = await client.delete(
+                    f"{self.base_url}/api/v3/contents/generations/tasks/{task_id}",
+                    headers=self._get_headers(),
+                )
+        except httpx.HTTPError:
+            return False
+        return response.status_code in (200, 204)
+
     def parse_video_result(self, result: Dict) -> Dict[str, Any]:
         """Parse video generation result."""
 
@@ -0,0 +1,222 @@
+"""Pool of long-lived local ComfyUI servers used by ComfyUIService."""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from errors import AppError
+
+
+class ComfyServerInstance:
+    """One ComfyUI server (port) and the ComfyRunner that drives it."""
+
+    def __init__(self, index: int, port: int, runner: Any) -> None:
+        self.index = index
+        self.port = port
+        self.runner = runner
+        self.busy = False
+        self.started = False
+        self.last_used = time.monotonic()
+        self.runs = 0
+        self.restart_times: Deque[float] = deque()
+        self.disabled_reason: Optional[str] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "port": self.port,
+            "busy": self.busy,
+            "started": self.started,
+            "idle_sec": round(time.monotonic() - self.last_used, 1),
+            "runs": self.runs,
+            "recent_restarts": len(self.restart_times),
+            "disabled_reason": self.disabled_reason,
+        }
+
+
+class ComfyServerPool:
+    """Keep ComfyUI processes warm between runs instead of starting one per prompt.
+
+    - readiness: a server is handed out only after its HTTP API answers
+    - crashes: a server whose process died is restarted, at most max_restarts per restart_window_sec
+    - idle: servers unused for idle_timeout_sec are stopped (0 keeps them forever)
+    """
+
+    def __init__(
+        self,
+        runner_factory: Callable[[int], Any],
+        size: int,
+        base_port: int,
+        idle_timeout_sec: float,
+        max_restarts: int,
+        restart_window_sec: float = 600.0,
+    ) -> None:
+        self.idle_timeout_sec = float(idle_timeout_sec)
+        self.max_restarts = max(0, int(max_restarts))
+        self.restart_window_sec = float(restart_window_sec)
+        self.instances: List[ComfyServerInstance] = [
+            ComfyServerInstance(i, base_port + i, runner_factory(base_port + i)) for i in range(max(1, int(size)))
+        ]
+        self._available: Optional[asyncio.Condition] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+
+    def _start_blocking(self, instance: ComfyServerInstance) -> None:
+        runner = instance.runner
+        if instance.started and not runner.server_exited() and runner.is_ready():
+            return
+
+        if instance.started or runner.server_exited():
+            # The server was up before and is gone now: count it as a crash restart.
+            now = time.monotonic()
+            while instance.restart_times and now - instance.restart_times[0] > self.restart_window_sec:
+                instance.restart_times.popleft()
+            if len(instance.restart_times) >= self.max_restarts:
+                instance.disabled_reason = (
+                    f"ComfyUI on port {instance.port} crashed {len(instance.restart_times)} times "
+                    f"within {int(self.restart_window_sec)}s"
+                )
+                instance.started = False
+                raise AppError("COMFY_SERVER_UNAVAILABLE", instance.disabled_reason)
+            instance.restart_times.append(now)
+            runner.stop_server()
+
+        instance.started = False
+        runner.start_server()
+        instance.started = True
+
+    async def _ensure_ready(self, instance: ComfyServerInstance) -> None:
+        try:
+            await asyncio.to_thread(self._start_blocking, instance)
+        except AppError:
+            raise
+        except Exception as e:
+            raise AppError("COMFY_WORKFLOW_ERROR", f"ComfyUI server start failed on port {instance.port}: {e}") from e
+
+    def _pick(self) -> Optional[ComfyServerInstance]:
+        now = time.monotonic()
+        for instance in self.instances:
+            # A crash-looping server is retried again once its restart window has passed.
+            if instance.disabled_reason and (
+                not instance.restart_times or now - instance.restart_times[-1] > self.restart_window_sec
+            ):
+                instance.disabled_reason = None
+                instance.restart_times.clear()
+        free = [i for i in self.instances if not i.busy and i.disabled_reason is None]
+        if not free:
+            return None
+        # Prefer servers that are already warm, then the most recently used one.
+        free.sort(key=lambda i: (not i.started, -i.last_used))
+        return free[0]
+
+    async def acquire(self) -> ComfyServerInstance:
+        self._ensure_reaper()
+        cond = self._condition()
+        while True:
+            async with cond:
+                while True:
+                    if all(i.disabled_reason for i in self.instances):
+                        raise AppError(
+                            "COMFY_SERVER_UNAVAILABLE", "; ".join(i.disabled_reason or "" for i in self.instances)
+                        )
+                    instance = self._pick()
+                    if instance:
+                        instance.busy = True
+                        break
+                    await cond.wait()
+
+            try:
+                await self._ensure_ready(instance)
+                return instance
+            except BaseException:
+                await self.release(instance)
+                if instance.disabled_reason is None:
+                    raise
+                # This server hit its restart cap; try another one.
+
+    async def release(self, instance: ComfyServerInstance, stop: bool = False) -> None:
+        instance.last_used = time.monotonic()
+        if stop and instance.started:
+            await asyncio.to_thread(instance.runner.stop_server)
+            instance.started = False
+        cond = self._condition()
+        async with cond:
+            instance.busy = False
+            cond.notify()
+
+    @asynccontextmanager
+    async def lease(self, stop_after: bool = False) -> AsyncIterator[ComfyServerInstance]:
+        instance = await self.acquire()
+        try:
+            instance.runs += 1
+            yield instance
+        finally:
+            await self.release(instance, stop=stop_after)
+
+    async def warm_up(self, count: Optional[int] = None) -> None:
+        """Start servers ahead of the first request (all of them by default)."""
+        targets = self.instances[: count or len(self.instances)]
+
+        async def warm(instance: ComfyServerInstance) -> None:
+            if instance.busy:
+                return
+            instance.busy = True
+            try:
+                await self._ensure_ready(instance)
+            finally:
+                await self.release(instance)
+
+        results = await asyncio.gather(*(warm(i) for i in targets), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors and len(errors) == len(targets):
+            raise errors[0]
+        self._ensure_reaper()
+
+    def _ensure_reaper(self) -> None:
+        if self.idle_timeout_sec <= 0 or (self._reaper and not self._reaper.done()):
+            return
+        self._reaper = asyncio.create_task(self._reap_idle_loop())
+
+    async def _reap_idle_loop(self) -> None:
+        interval = max(5.0, min(60.0, self.idle_timeout_sec / 4))
+        while True:
+            await asyncio.sleep(interval)
+            await self.reap_idle()
+
+    async def reap_idle(self) -> int:
+        now = time.monotonic()
+        stopped = 0
+        for instance in self.instances:
+            if instance.busy or not instance.started or now - instance.last_used < self.idle_timeout_sec:
+                continue
+            instance.busy = True
+            try:
+                await asyncio.to_thread(instance.runner.stop_server)
+                instance.started = False
+                stopped += 1
+            finally:
+                await self.release(instance)
+        return stopped
+
+    async def shutdown(self) -> None:
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for instance in self.instances:
+            if instance.started or instance.runner.owns_server():
+                await asyncio.to_thread(instance.runner.stop_server)
+                instance.started = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self.instances),
+            "idle_timeout_sec": self.idle_timeout_sec,
+            "max_restarts": self.max_restarts,
+            "instances": [i.stats() for i in self.instances],
+        }
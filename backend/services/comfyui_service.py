@@ -9,10 +9,17 @@ import sys
 import tempfile
 import threading
 import uuid
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
 
 from config import settings
 from errors import AppError
+from .comfy_server_pool import ComfyServerPool
+from .workflow_compiler import CompiledWorkflow, WorkflowCompiler
+
+try:
+    import fcntl
+except ImportError:  # Windows: one backend process per machine
+    fcntl = None
 
 
 class ComfyUIService:
@@ -20,14 +27,26 @@ class ComfyUIService:
 
     def __init__(self) -> None:
         self.timeout_sec = settings.comfyui_timeout_sec
-        self._staged_files: Dict[str, bytes] = {}
         self._run_cache: Dict[str, Dict[str, Any]] = {}
-        self._runner = None
-        self._runner_workdir: Optional[str] = None
-        self._torch_runtime_checked = False
-        self._cwd_lock = threading.Lock()
+        # prompt_id -> runner executing it (None while waiting for a pooled server)
+        self._active_prompts: Dict[str, Any] = {}
+        # prompt_id -> ComfyUI's own prompt id, for queue_prompts entries that are already queued
+        self._server_prompt_ids: Dict[str, str] = {}
+        # prompt_ids running through queue_prompts, and those cancelled before reaching ComfyUI's queue
+        self._batch_prompts: Set[str] = set()
+        self._cancel_requested: Set[str] = set()
+        self._pool: Optional[ComfyServerPool] = None
+        self._pool_lock = threading.Lock()
+        # lock file held while this process owns its port range (see _claim_port_slot)
+        self._port_slot_file: Optional[Any] = None
+        # None: not checked yet; "": torch available; otherwise the failure reason.
+        self._torch_runtime_error: Optional[str] = None
         self._backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self._third_party_dir = os.path.join(self._backend_dir, "third_party")
+        self._workspace_root = os.path.abspath(settings.comfy_workspace_dir)
+        # Inputs are written once per prompt here, then renamed into the leased server's input dir.
+        self._staging_root = os.path.join(self._workspace_root, "staging")
+        self._compiler = WorkflowCompiler(self.workflow_to_prompt)
         self._ensure_third_party_path()
 
     def _ensure_third_party_path(self) -> None:
@@ -52,72 +71,68 @@ class ComfyUIService:
             "ComfyUI main.py not found. Please set COMFY_BASE_PATH to a valid ComfyUI directory.",
         )
 
-    def _prepare_runner_workdir(self) -> str:
-        """Use comfy_runner package directory as runtime cwd for relative data paths."""
-        comfy_runner_dir = os.path.join(self._third_party_dir, "comfy_runner")
-        if not os.path.isdir(comfy_runner_dir):
-            raise AppError(
-                "COMFY_WORKFLOW_ERROR",
-                f"comfy_runner directory not found: {comfy_runner_dir}",
-            )
-        return comfy_runner_dir
-
     def _verify_torch_runtime(self) -> None:
-        if self._torch_runtime_checked:
-            return
-
-        try:
-            proc = subprocess.run(
-                [sys.executable, "-c", "import torch, torchaudio"],
-                capture_output=True,
-                text=True,
-                timeout=30,
-            )
-        except Exception as e:
-            raise AppError(
-                "COMFY_WORKFLOW_ERROR",
-                f"PyTorch runtime check failed: {e}",
-            ) from e
-
-        if proc.returncode != 0:
-            err_lines = (proc.stderr or proc.stdout or "").strip().splitlines()
-            reason = err_lines[-1] if err_lines else "unknown runtime error"
+        """Check torch/torchaudio once per process; the subprocess result (ok or failure) is cached."""
+        if self._torch_runtime_error is None:
+            try:
+                proc = subprocess.run(
+                    [sys.executable, "-c", "import torch, torchaudio"],
+                    capture_output=True,
+                    text=True,
+                    timeout=30,
+                )
+            except Exception as e:
+                raise AppError(
+                    "COMFY_WORKFLOW_ERROR",
+                    f"PyTorch runtime check failed: {e}",
+                ) from e
+
+            if proc.returncode != 0:
+                err_lines = (proc.stderr or proc.stdout or "").strip().splitlines()
+                self._torch_runtime_error = err_lines[-1] if err_lines else "unknown runtime error"
+            else:
+                self._torch_runtime_error = ""
+
+        if self._torch_runtime_error:
             raise AppError(
                 "COMFY_WORKFLOW_ERROR",
-                f"PyTorch runtime unavailable: {reason}",
+                f"PyTorch runtime unavailable: {self._torch_runtime_error}",
             )
 
-        self._torch_runtime_checked = True
-
     def _run_predict(
         self,
         runner: Any,
         workflow_api_path: str,
         input_paths: List[str],
         output_dir: str,
+        client_id: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
     ) -> Any:
-        workdir = self._runner_workdir or self._third_party_dir
-        with self._cwd_lock:
-            previous_cwd = os.getcwd()
-            try:
-                os.chdir(workdir)
-                return runner.predict(
-                    workflow_input=workflow_api_path,
-                    file_path_list=input_paths,
-                    stop_server_after_completion=settings.comfy_stop_server_after_completion,
-                    output_folder=output_dir,
-                )
-            finally:
-                os.chdir(previous_cwd)
+        # comfy_runner uses absolute paths and a per-server workspace, so runs on different
+        # pooled servers can execute concurrently without touching the process cwd.
+        return runner.predict(
+            workflow_input=workflow_api_path,
+            file_path_list=input_paths,
+            # Server lifetime is managed by the pool (COMFY_STOP_SERVER_AFTER_COMPLETION is applied on release).
+            stop_server_after_completion=False,
+            output_folder=output_dir,
+            client_id=client_id,
+            progress_callback=progress_callback,
+            ws_recv_timeout=settings.comfy_ws_recv_timeout_sec,
+            execution_timeout=max(30, int(self.timeout_sec)),
+            history_poll_interval=settings.comfyui_poll_interval_sec,
+        )
 
-    def _get_runner(self):
-        """Lazily initialize ComfyRunner."""
-        if self._runner is not None:
-            return self._runner
+    def _get_pool(self) -> ComfyServerPool:
+        """Lazily initialize the pool of ComfyRunner-managed servers."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self._create_pool()
+            return self._pool
 
+    def _create_pool(self) -> ComfyServerPool:
         try:
             comfy_base_path = self._resolve_comfy_base_path()
-            self._runner_workdir = self._prepare_runner_workdir()
 
             normalized_base_path = comfy_base_path
             if not normalized_base_path.endswith(("/", "\\")):
@@ -129,8 +144,19 @@ class ComfyUIService:
 
             from comfy_runner.inf import ComfyRunner  # type: ignore
 
-            self._runner = ComfyRunner()
-            return self._runner
+            size = max(1, settings.comfy_pool_size)
+            base_port = settings.comfy_pool_base_port + self._claim_port_slot() * size
+            return ComfyServerPool(
+                runner_factory=lambda port: ComfyRunner(
+                    port=port,
+                    startup_timeout=settings.comfy_server_startup_timeout_sec,
+                    workspace_dir=os.path.join(self._workspace_root, f"server_{port}"),
+                ),
+                size=size,
+                base_port=base_port,
+                idle_timeout_sec=settings.comfy_pool_idle_timeout_sec,
+                max_restarts=settings.comfy_pool_max_restarts,
+            )
         except AppError:
             raise
         except Exception as e:
@@ -139,6 +165,30 @@ class ComfyUIService:
                 f"Local workflow runner init failed: {e}",
             ) from e
 
+    def _claim_port_slot(self) -> int:
+        """Reserve a port range for this process's pool.
+
+        Every uvicorn worker and generation worker process has its own pool; without separate
+        ranges they would attach to and restart each other's servers. Slot n owns ports
+        base + n * size ... base + n * size + size - 1 and is held through a lock file until exit.
+        """
+        if fcntl is None:
+            return 0
+        os.makedirs(self._workspace_root, exist_ok=True)
+        for slot in range(max(1, settings.comfy_pool_max_processes)):
+            handle = open(os.path.join(self._workspace_root, f"port_slot_{slot}.lock"), "a+b")
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            self._port_slot_file = handle
+            return slot
+        raise AppError(
+            "COMFY_SERVER_UNAVAILABLE",
+            f"all {settings.comfy_pool_max_processes} ComfyUI port ranges are taken by other backend processes",
+        )
+
     async def load_workflow(self, path: str) -> Dict[str, Any]:
         """Load workflow JSON from disk."""
         try:
@@ -153,19 +203,58 @@ class ComfyUIService:
             raise AppError("COMFY_WORKFLOW_ERROR", f"workflow root must be an object: {path}")
         return data
 
-    async def upload_image(self, file_bytes: bytes, filename: str) -> str:
-        """Stage image input and return staged filename."""
-        return self._stage_file(file_bytes, filename)
-
-    async def upload_audio(self, file_bytes: bytes, filename: str) -> str:
-        """Stage audio input and return staged filename."""
-        return self._stage_file(file_bytes, filename)
-
-    def _stage_file(self, file_bytes: bytes, filename: str) -> str:
-        safe_name = os.path.basename(filename or "input.bin")
-        staged_name = f"{uuid.uuid4().hex}_{safe_name}"
-        self._staged_files[staged_name] = file_bytes
-        return staged_name
+    async def compile_workflow(self, path: str) -> CompiledWorkflow:
+        """Parsed API prompt + parameter slots of a workflow file; re-read only when the file changes."""
+        return await asyncio.to_thread(self._compiler.get, path)
+
+    @staticmethod
+    def new_prompt_id() -> str:
+        """Allocate a prompt_id up front so inputs can be staged for it before queue_prompt."""
+        return str(uuid.uuid4())
+
+    async def upload_image(self, file_bytes: bytes, filename: str, prompt_id: str) -> str:
+        """Stage image input for prompt_id and return its ComfyUI input-relative name."""
+        return await asyncio.to_thread(self._stage_file, file_bytes, filename, prompt_id)
+
+    async def upload_audio(self, file_bytes: bytes, filename: str, prompt_id: str) -> str:
+        """Stage audio input for prompt_id and return its ComfyUI input-relative name."""
+        return await asyncio.to_thread(self._stage_file, file_bytes, filename, prompt_id)
+
+    def _staging_dir(self, prompt_id: str) -> str:
+        return os.path.join(self._staging_root, os.path.basename(prompt_id))
+
+    def _stage_file(self, file_bytes: bytes, filename: str, prompt_id: str) -> str:
+        safe_name = os.path.basename(filename or "input.bin") or "input.bin"
+        staging_dir = self._staging_dir(prompt_id)
+        os.makedirs(staging_dir, exist_ok=True)
+        with open(os.path.join(staging_dir, safe_name), "wb") as f:
+            f.write(file_bytes)
+        # The run's inputs live in input/<prompt_id>/ on the server that executes it.
+        return f"{os.path.basename(prompt_id)}/{safe_name}"
+
+    def _place_inputs(self, prompt_id: str, input_dir: str) -> Optional[str]:
+        """Move staged inputs into <input_dir>/<prompt_id>/ without copying file contents."""
+        staging_dir = self._staging_dir(prompt_id)
+        if not os.path.isdir(staging_dir):
+            return None
+        target = os.path.join(input_dir, os.path.basename(prompt_id))
+        os.makedirs(input_dir, exist_ok=True)
+        try:
+            os.replace(staging_dir, target)
+        except OSError:
+            # Different filesystem or leftover target: hardlink per file, copy as the last resort.
+            os.makedirs(target, exist_ok=True)
+            for name in os.listdir(staging_dir):
+                src = os.path.join(staging_dir, name)
+                dst = os.path.join(target, name)
+                if os.path.exists(dst):
+                    os.remove(dst)
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return target
 
     def workflow_to_prompt(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
         """Convert UI workflow JSON (nodes/links) into Comfy API prompt JSON."""
@@ -227,21 +316,26 @@ class ComfyUIService:
         sample_value = workflow.get(sample_key)
         return isinstance(sample_key, str) and isinstance(sample_value, dict) and "class_type" in sample_value
 
-    async def queue_prompt(self, workflow: Dict[str, Any], is_api_prompt: bool = False) -> str:
-        """Execute workflow locally and cache run outputs by prompt_id."""
-        runner = await asyncio.to_thread(self._get_runner)
-
-        if is_api_prompt or self._looks_like_api_prompt(workflow):
-            prompt = workflow
-        else:
-            prompt = self.workflow_to_prompt(workflow)
-
-        if not isinstance(prompt, dict) or not prompt:
-            raise AppError("COMFY_WORKFLOW_ERROR", "workflow parse failed: empty/invalid prompt")
-
-        prompt_id = str(uuid.uuid4())
+    async def queue_prompt(
+        self,
+        workflow: Dict[str, Any],
+        is_api_prompt: bool = False,
+        prompt_id: Optional[str] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> str:
+        """Execute workflow locally and cache run outputs by prompt_id.
+
+        Pass a pre-generated prompt_id to be able to cancel_prompt() while the run is in flight.
+        on_progress receives comfy_runner's node-level progress dicts on the event loop thread.
+        """
+        pool = await asyncio.to_thread(self._get_pool)
+        prompt = self._to_api_prompt(workflow, is_api_prompt)
+
+        prompt_id = prompt_id or self.new_prompt_id()
+        progress_callback = self._threadsafe_callback(on_progress) if on_progress else None
+        self._active_prompts[prompt_id] = None
         run_dir = tempfile.mkdtemp(prefix="comfy_local_run_")
-        input_paths: List[str] = []
+        placed_inputs_dir: Optional[str] = None
         workflow_api_path = os.path.join(run_dir, "workflow_api.json")
         output_dir = os.path.join(run_dir, "output")
         os.makedirs(output_dir, exist_ok=True)
@@ -250,61 +344,35 @@ class ComfyUIService:
             with open(workflow_api_path, "w", encoding="utf-8") as f:
                 json.dump(prompt, f, ensure_ascii=False)
 
-            for name, content in self._staged_files.items():
-                path = os.path.join(run_dir, name)
-                with open(path, "wb") as f:
-                    f.write(content)
-                input_paths.append(path)
-
-            result = await asyncio.wait_for(
-                asyncio.to_thread(self._run_predict, runner, workflow_api_path, input_paths, output_dir),
-                timeout=max(30, int(self.timeout_sec)),
-            )
-
-            output_files: List[str] = []
-            if isinstance(result, dict):
-                raw_paths = result.get("file_paths", []) or []
-                for item in raw_paths:
-                    if isinstance(item, str):
-                        output_files.append(item)
-                    elif isinstance(item, dict) and item.get("path"):
-                        output_files.append(str(item["path"]))
-
-            if not output_files:
-                for root, _, files in os.walk(output_dir):
-                    for file in files:
-                        output_files.append(os.path.join(root, file))
-
-            file_meta_list: List[Dict[str, Any]] = []
-            for path in output_files:
-                # comfy_runner may return either absolute paths or copied file basenames.
-                if os.path.isabs(path):
-                    abs_path = os.path.abspath(path)
-                else:
-                    abs_path = os.path.abspath(os.path.join(output_dir, path))
-                if not os.path.exists(abs_path):
-                    continue
-                file_meta_list.append(
-                    {
-                        "filename": os.path.basename(abs_path),
-                        "subfolder": "",
-                        "type": "output",
-                        "_abs_path": abs_path,
-                    }
-                )
-
-            history = {
-                "prompt_id": prompt_id,
-                "outputs": {
-                    "local_runner": {
-                        "files": file_meta_list,
-                        "text": (result or {}).get("text_output", []) if isinstance(result, dict) else [],
-                    }
-                },
-            }
+            async with pool.lease(stop_after=settings.comfy_stop_server_after_completion) as instance:
+                self._active_prompts[prompt_id] = instance.runner
+                placed_inputs_dir = await asyncio.to_thread(self._place_inputs, prompt_id, instance.runner.input_dir)
+                try:
+                    # Inputs are already in place, so the runner has nothing to copy or clear.
+                    result = await self._run_leased(
+                        instance,
+                        lambda: self._run_predict(
+                            instance.runner,
+                            workflow_api_path,
+                            [],
+                            output_dir,
+                            prompt_id,
+                            progress_callback,
+                        ),
+                        client_id=prompt_id,
+                        # the runner enforces the same limit itself; this only guards a stuck thread
+                        timeout=max(30, int(self.timeout_sec)) + 30,
+                    )
+                finally:
+                    if placed_inputs_dir:
+                        shutil.rmtree(placed_inputs_dir, ignore_errors=True)
+
+            error = self._result_error(result)
+            if error:
+                raise error
 
             self._run_cache[prompt_id] = {
-                "history": history,
+                "history": self._history_from_result(prompt_id, result),
                 "run_dir": run_dir,
             }
             return prompt_id
@@ -315,7 +383,223 @@ class ComfyUIService:
         except Exception as e:
             raise AppError("COMFY_WORKFLOW_ERROR", f"local workflow execution failed: {e}") from e
         finally:
-            self._staged_files.clear()
+            self._active_prompts.pop(prompt_id, None)
+            shutil.rmtree(self._staging_dir(prompt_id), ignore_errors=True)
+            if prompt_id not in self._run_cache:
+                # failed, timed out or cancelled: nobody will call cleanup_prompt for this run
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+    async def _run_leased(self, instance: Any, fn: Callable[[], Any], client_id: str, timeout: float) -> Any:
+        """Run fn (which drives instance's server) in a thread; return only once that thread has returned.
+
+        On timeout or cancellation the run is interrupted and, if the thread does not stop within a grace
+        period, the server is stopped (the pool starts it again on the next lease). Either way the caller
+        keeps its lease until the thread is gone, so no other prompt shares the server with it.
+        """
+        worker = asyncio.ensure_future(asyncio.to_thread(fn))
+        try:
+            done, _ = await asyncio.wait({worker}, timeout=timeout)
+        except asyncio.CancelledError:
+            await asyncio.shield(self._abandon_run(instance, worker, client_id))
+            raise
+        if worker not in done:
+            await asyncio.shield(self._abandon_run(instance, worker, client_id))
+            raise asyncio.TimeoutError()
+        return worker.result()
+
+    async def _abandon_run(self, instance: Any, worker: "asyncio.Future[Any]", client_id: str) -> None:
+        runner = instance.runner
+        # marks client_id cancelled (the runner's wait loop checks it) and interrupts the running prompt
+        await asyncio.to_thread(runner.stop_current_generation, client_id, 1)
+        grace = float(settings.comfy_ws_recv_timeout_sec) + float(settings.comfyui_poll_interval_sec) + 10
+        done, _ = await asyncio.wait({worker}, timeout=grace)
+        if worker not in done:
+            await asyncio.to_thread(runner.stop_server)
+            instance.started = False
+            await asyncio.wait({worker})
+        if not worker.cancelled():
+            worker.exception()  # retrieved; the caller reports the timeout or cancellation instead
+
+    async def queue_prompts(
+        self,
+        workflows: List[Dict[str, Any]],
+        prompt_ids: Optional[List[str]] = None,
+        is_api_prompt: bool = False,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Optional[AppError]]:
+        """Run several workflows on one leased server, queued together and followed over one websocket.
+
+        Returns prompt_id -> None (result ready for wait_for_history) or the AppError of that prompt.
+        Stage inputs per prompt_id beforehand as for queue_prompt. cancel_prompt(prompt_id) stops
+        only that entry; the rest of the batch keeps running.
+        """
+        pool = await asyncio.to_thread(self._get_pool)
+        prompts = [self._to_api_prompt(workflow, is_api_prompt) for workflow in workflows]
+        prompt_ids = list(prompt_ids or [self.new_prompt_id() for _ in prompts])
+        if len(prompt_ids) != len(prompts):
+            raise AppError("COMFY_WORKFLOW_ERROR", "prompt_ids and workflows length mismatch")
+
+        batch_id = self.new_prompt_id()
+        progress_callback = None
+        if on_progress:
+            loop_callback = self._threadsafe_callback(on_progress)
+            progress_callback = lambda event: loop_callback({**event, "prompt_id": prompt_ids[event["index"]]})
+
+        run_dirs: Dict[str, str] = {}
+        placed: List[str] = []
+        for prompt_id, prompt in zip(prompt_ids, prompts):
+            self._active_prompts[prompt_id] = None
+            self._batch_prompts.add(prompt_id)
+            run_dir = tempfile.mkdtemp(prefix="comfy_local_run_")
+            run_dirs[prompt_id] = run_dir
+            os.makedirs(os.path.join(run_dir, "output"), exist_ok=True)
+            with open(os.path.join(run_dir, "workflow_api.json"), "w", encoding="utf-8") as f:
+                json.dump(prompt, f, ensure_ascii=False)
+
+        outcome: Dict[str, Optional[AppError]] = {}
+        try:
+            async with pool.lease(stop_after=settings.comfy_stop_server_after_completion) as instance:
+                runner = instance.runner
+                for prompt_id in prompt_ids:
+                    self._active_prompts[prompt_id] = runner
+                    placed_dir = await asyncio.to_thread(self._place_inputs, prompt_id, runner.input_dir)
+                    if placed_dir:
+                        placed.append(placed_dir)
+                try:
+                    results = await self._run_leased(
+                        instance,
+                        lambda: runner.predict_batch(
+                            workflow_inputs=[os.path.join(run_dirs[pid], "workflow_api.json") for pid in prompt_ids],
+                            output_folders=[os.path.join(run_dirs[pid], "output") for pid in prompt_ids],
+                            client_id=batch_id,
+                            progress_callback=progress_callback,
+                            on_queued=lambda index, server_id: self._on_queued(runner, prompt_ids[index], server_id),
+                            ws_recv_timeout=settings.comfy_ws_recv_timeout_sec,
+                            execution_timeout=max(30, int(self.timeout_sec)) * len(prompts),
+                            history_poll_interval=settings.comfyui_poll_interval_sec,
+                        ),
+                        client_id=batch_id,
+                        timeout=max(30, int(self.timeout_sec)) * len(prompts) + 30,
+                    )
+                finally:
+                    for placed_dir in placed:
+                        shutil.rmtree(placed_dir, ignore_errors=True)
+        except asyncio.TimeoutError:
+            results = [{"error": "local workflow execution timed out", "error_type": "TimeoutError"}] * len(prompts)
+        except AppError as e:
+            results = [{"error": e.message, "error_type": e.code}] * len(prompts)
+        except Exception as e:
+            results = [{"error": str(e), "error_type": type(e).__name__}] * len(prompts)
+        finally:
+            for prompt_id in prompt_ids:
+                self._active_prompts.pop(prompt_id, None)
+                self._server_prompt_ids.pop(prompt_id, None)
+                self._batch_prompts.discard(prompt_id)
+                self._cancel_requested.discard(prompt_id)
+                shutil.rmtree(self._staging_dir(prompt_id), ignore_errors=True)
+
+        for prompt_id, result in zip(prompt_ids, results):
+            error = self._result_error(result)
+            if error:
+                shutil.rmtree(run_dirs[prompt_id], ignore_errors=True)
+            else:
+                self._run_cache[prompt_id] = {
+                    "history": self._history_from_result(prompt_id, result),
+                    "run_dir": run_dirs[prompt_id],
+                }
+            outcome[prompt_id] = error
+        return outcome
+
+    def _to_api_prompt(self, workflow: Dict[str, Any], is_api_prompt: bool) -> Dict[str, Any]:
+        if is_api_prompt or self._looks_like_api_prompt(workflow):
+            prompt = workflow
+        else:
+            prompt = self.workflow_to_prompt(workflow)
+
+        if not isinstance(prompt, dict) or not prompt:
+            raise AppError("COMFY_WORKFLOW_ERROR", "workflow parse failed: empty/invalid prompt")
+        return prompt
+
+    @staticmethod
+    def _result_error(result: Any) -> Optional[AppError]:
+        if not isinstance(result, dict) or not result.get("error"):
+            return None
+        if result.get("error_type") in ("TimeoutError", "COMFY_QUEUE_TIMEOUT"):
+            return AppError("COMFY_QUEUE_TIMEOUT", f"local workflow execution timed out: {result['error']}")
+        return AppError("COMFY_WORKFLOW_ERROR", f"local workflow execution failed: {result['error']}")
+
+    @staticmethod
+    def _history_from_result(prompt_id: str, result: Any) -> Dict[str, Any]:
+        # comfy_runner already moved every output into the run's output dir and reports where
+        # (with the producing node and output group), so nothing is scanned or read here.
+        outputs: Dict[str, Any] = {}
+        for item in (result or {}).get("files", []) if isinstance(result, dict) else []:
+            abs_path = item.get("path")
+            if not abs_path or not os.path.exists(abs_path):
+                continue
+            node_output = outputs.setdefault(str(item.get("node_id") or "local_runner"), {})
+            node_output.setdefault(item.get("group") or "files", []).append(
+                {
+                    "filename": os.path.basename(abs_path),
+                    "subfolder": item.get("subfolder", ""),
+                    "type": "output",
+                    "_abs_path": abs_path,
+                }
+            )
+        text_output = (result or {}).get("text_output", []) if isinstance(result, dict) else []
+        if text_output:
+            outputs.setdefault("local_runner", {})["text"] = text_output
+        return {"prompt_id": prompt_id, "outputs": outputs}
+
+    @staticmethod
+    def _threadsafe_callback(
+        callback: Callable[[Dict[str, Any]], None]
+    ) -> Callable[[Dict[str, Any]], None]:
+        """Wrap an event-loop callback so comfy_runner can call it from its worker thread."""
+        loop = asyncio.get_running_loop()
+
+        def call(event: Dict[str, Any]) -> None:
+            loop.call_soon_threadsafe(callback, event)
+
+        return call
+
+    def _on_queued(self, runner: Any, prompt_id: str, server_id: str) -> None:
+        """Called from the runner thread once a queue_prompts entry is in ComfyUI's queue."""
+        self._server_prompt_ids[prompt_id] = server_id
+        if prompt_id in self._cancel_requested:
+            runner.cancel_prompt(server_id)
+
+    async def cancel_prompt(self, prompt_id: str) -> bool:
+        """Stop one local prompt; other prompts on the same server (other users, batch entries) keep running.
+
+        A queue_prompt run has its own client_id, which ComfyRunner.stop_current_generation marks
+        cancelled. A queue_prompts entry is removed from ComfyUI's queue (or interrupted if it is
+        the one executing), or right after it is queued if that has not happened yet.
+        """
+        if not prompt_id or prompt_id not in self._active_prompts:
+            return False
+        runner = self._active_prompts.get(prompt_id)
+        if prompt_id in self._batch_prompts:
+            self._cancel_requested.add(prompt_id)
+            server_id = self._server_prompt_ids.get(prompt_id)
+            if runner is None or server_id is None:
+                return True  # not queued yet; _on_queued cancels it as soon as it is
+            return bool(await asyncio.to_thread(runner.cancel_prompt, server_id))
+        if runner is None:
+            return False
+        return bool(await asyncio.to_thread(runner.stop_current_generation, prompt_id))
+
+    async def warm_up(self) -> None:
+        """Check the torch runtime and start pooled ComfyUI servers before the first request."""
+        pool = await asyncio.to_thread(self._get_pool)
+        await pool.warm_up(settings.comfy_pool_warmup_count or None)
+
+    async def shutdown(self) -> None:
+        if self._pool is not None:
+            await self._pool.shutdown()
+
+    def pool_stats(self) -> Optional[Dict[str, Any]]:
+        return self._pool.stats() if self._pool is not None else None
 
     async def wait_for_history(self, prompt_id: str) -> Dict[str, Any]:
         """Return cached run history by prompt_id."""
@@ -361,18 +645,41 @@ class ComfyUIService:
                 return file_meta
         return None
 
-    async def download_file(self, file_meta: Dict[str, Any]) -> bytes:
-        """Read output file bytes from local path recorded in metadata."""
+    def output_path(self, file_meta: Dict[str, Any]) -> str:
+        """Local path of an output file; valid until cleanup_prompt()."""
         abs_path = file_meta.get("_abs_path")
         if not abs_path:
             raise AppError("COMFY_WORKFLOW_ERROR", f"file metadata missing _abs_path: {file_meta}")
         if not os.path.exists(abs_path):
             raise AppError("COMFY_WORKFLOW_ERROR", f"output file not found: {abs_path}")
-        with open(abs_path, "rb") as f:
+        return abs_path
+
+    async def iter_file(self, file_meta: Dict[str, Any], chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+        """Stream an output file in chunks instead of loading it whole."""
+        abs_path = self.output_path(file_meta)
+        f = await asyncio.to_thread(open, abs_path, "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    async def download_file(self, file_meta: Dict[str, Any]) -> bytes:
+        """Read output file bytes (prefer output_path/iter_file for large outputs)."""
+        abs_path = self.output_path(file_meta)
+        return await asyncio.to_thread(self._read_file, abs_path)
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
             return f.read()
 
     def cleanup_prompt(self, prompt_id: str) -> None:
-        """Cleanup temp run directory for a prompt_id."""
+        """Cleanup staged inputs and the temp run directory for a prompt_id."""
+        shutil.rmtree(self._staging_dir(prompt_id), ignore_errors=True)
         run = self._run_cache.pop(prompt_id, None)
         if not run:
             return
@@ -1,6 +1,7 @@
 ﻿"""IndexTTS2 workflow service."""
+import asyncio
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from config import settings
 from errors import AppError
@@ -21,96 +22,127 @@ class IndexTTSService:
         emo_text: str = "",
         reference_audio_bytes: Optional[bytes] = None,
         reference_audio_filename: str = "reference.mp3",
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
     ) -> Dict[str, Any]:
         if not text.strip():
             raise AppError("INDEX_TTS_FAILED", "文本为空，无法生成音频")
 
-        workflow = await comfyui_service.load_workflow(settings.indextts2_workflow_path)
+        compiled = await comfyui_service.compile_workflow(settings.indextts2_workflow_path)
+        reference_audio_bytes, reference_audio_filename = self._reference_audio(
+            reference_audio_bytes, reference_audio_filename
+        )
+        prompt_id = comfyui_service.new_prompt_id()
+        try:
+            prompt = await self._build_prompt(
+                compiled, prompt_id, text, emo_text, reference_audio_bytes, reference_audio_filename
+            )
+            await comfyui_service.queue_prompt(
+                prompt, is_api_prompt=True, prompt_id=prompt_id, on_progress=on_progress
+            )
+            return await self._read_result(prompt_id)
+        finally:
+            comfyui_service.cleanup_prompt(prompt_id)
+
+    async def generate_audio_batch(
+        self,
+        texts: List[str],
+        emo_texts: Optional[List[str]] = None,
+        reference_audio_bytes: Optional[bytes] = None,
+        reference_audio_filename: str = "reference.mp3",
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> List[Union[Dict[str, Any], AppError]]:
+        """Generate several clips on one warm server: queued together, followed over one websocket.
+
+        Returns one entry per text, in order: the generate_audio result or the AppError of that clip.
+        on_progress events carry the clip's "index".
+        """
+        if not texts or any(not (text or "").strip() for text in texts):
+            raise AppError("INDEX_TTS_FAILED", "文本为空，无法生成音频")
+        emo_texts = list(emo_texts or [""] * len(texts))
+        if len(emo_texts) != len(texts):
+            raise AppError("INDEX_TTS_FAILED", "emo_texts 与 texts 数量不一致")
+
+        compiled = await comfyui_service.compile_workflow(settings.indextts2_workflow_path)
+        reference_audio_bytes, reference_audio_filename = self._reference_audio(
+            reference_audio_bytes, reference_audio_filename
+        )
+        prompt_ids = [comfyui_service.new_prompt_id() for _ in texts]
+        try:
+            prompts = await asyncio.gather(
+                *(
+                    self._build_prompt(
+                        compiled, prompt_id, text, emo_text, reference_audio_bytes, reference_audio_filename
+                    )
+                    for prompt_id, text, emo_text in zip(prompt_ids, texts, emo_texts)
+                )
+            )
+            errors = await comfyui_service.queue_prompts(
+                prompts, prompt_ids=prompt_ids, is_api_prompt=True, on_progress=on_progress
+            )
+            results: List[Union[Dict[str, Any], AppError]] = []
+            for prompt_id in prompt_ids:
+                error = errors.get(prompt_id)
+                if error is None:
+                    try:
+                        results.append(await self._read_result(prompt_id))
+                    except AppError as e:
+                        results.append(e)
+                else:
+                    results.append(error)
+            return results
+        finally:
+            for prompt_id in prompt_ids:
+                comfyui_service.cleanup_prompt(prompt_id)
 
+    @staticmethod
+    def _reference_audio(reference_audio_bytes: Optional[bytes], reference_audio_filename: str):
         # 可选覆盖参考音频：
         # 1) 显式传入 reference_audio
         # 2) 或配置 index_tts_default_reference_audio_path
         # 否则沿用 workflow 内置参考音频，不再报错。
-        uploaded_ref_name: Optional[str] = None
         if reference_audio_bytes is None:
             default_ref = settings.index_tts_default_reference_audio_path
             if default_ref and os.path.exists(default_ref):
                 with open(default_ref, "rb") as f:
                     reference_audio_bytes = f.read()
                 reference_audio_filename = os.path.basename(default_ref)
+        return reference_audio_bytes, reference_audio_filename
 
+    async def _build_prompt(
+        self,
+        compiled: Any,
+        prompt_id: str,
+        text: str,
+        emo_text: str,
+        reference_audio_bytes: Optional[bytes],
+        reference_audio_filename: str,
+    ) -> Dict[str, Any]:
+        prompt = compiled.instantiate()
+        uploaded_ref_name: Optional[str] = None
         if reference_audio_bytes is not None:
-            uploaded_ref_name = await comfyui_service.upload_audio(reference_audio_bytes, reference_audio_filename)
+            uploaded_ref_name = await comfyui_service.upload_audio(
+                reference_audio_bytes, reference_audio_filename, prompt_id
+            )
 
-        self._set_prompt_text(workflow, self.TEXT_NODE_ID, text.strip())
-        self._set_prompt_text(workflow, self.EMO_TEXT_NODE_ID, emo_text.strip() or "平静自然")
+        compiled.set_widget(prompt, self.TEXT_NODE_ID, 0, text.strip())
+        compiled.set_widget(prompt, self.EMO_TEXT_NODE_ID, 0, emo_text.strip() or "平静自然")
         if uploaded_ref_name:
-            self._set_load_audio_filename(workflow, self.REFERENCE_AUDIO_NODE_ID, uploaded_ref_name)
-
-        main_node = self._find_node(workflow, self.MAIN_NODE_ID)
-        self._set_widget_value(main_node, "use_emo_text", bool(emo_text.strip()))
-
-        prompt_id = await comfyui_service.queue_prompt(workflow)
-        try:
-            history = await comfyui_service.wait_for_history(prompt_id)
-            files = comfyui_service.extract_output_files(history)
-            audio_file = comfyui_service.pick_first_audio_file(files)
-            if not audio_file:
-                raise AppError("INDEX_TTS_FAILED", f"IndexTTS2 未产出音频文件, prompt_id={prompt_id}")
-
-            audio_bytes = await comfyui_service.download_file(audio_file)
-            return {
-                "audio_bytes": audio_bytes,
-                "audio_filename": audio_file.get("filename", "index_tts_output.mp3"),
-                "comfy_prompt_id": prompt_id,
-            }
-        finally:
-            comfyui_service.cleanup_prompt(prompt_id)
-
-    def _find_node(self, workflow: Dict[str, Any], node_id: int) -> Dict[str, Any]:
-        for node in workflow.get("nodes") or []:
-            if int(node.get("id", -1)) == node_id:
-                return node
-        raise AppError("COMFY_WORKFLOW_ERROR", f"workflow 缺少节点: {node_id}")
-
-    def _set_prompt_text(self, workflow: Dict[str, Any], node_id: int, text: str) -> None:
-        node = self._find_node(workflow, node_id)
-        widgets = node.get("widgets_values")
-        if isinstance(widgets, list):
-            if not widgets:
-                widgets.append(text)
-            else:
-                widgets[0] = text
-        else:
-            node["widgets_values"] = [text]
-
-    def _set_load_audio_filename(self, workflow: Dict[str, Any], node_id: int, filename: str) -> None:
-        node = self._find_node(workflow, node_id)
-        widgets = node.get("widgets_values")
-        if isinstance(widgets, list):
-            if not widgets:
-                widgets.append(filename)
-            else:
-                widgets[0] = filename
-        else:
-            node["widgets_values"] = [filename]
-
-    def _set_widget_value(self, node: Dict[str, Any], input_name: str, value: Any) -> None:
-        inputs = node.get("inputs") or []
-        widget_input_names = [inp.get("name") for inp in inputs if inp.get("widget")]
-        if input_name not in widget_input_names:
-            return
-
-        idx = widget_input_names.index(input_name)
-        widgets = node.get("widgets_values")
-        if isinstance(widgets, list):
-            if idx >= len(widgets):
-                widgets.extend([None] * (idx - len(widgets) + 1))
-            widgets[idx] = value
-        elif isinstance(widgets, dict):
-            widgets[input_name] = value
-        else:
-            node["widgets_values"] = [value]
-
+            compiled.set_widget(prompt, self.REFERENCE_AUDIO_NODE_ID, 0, uploaded_ref_name)
+        compiled.set_input(prompt, self.MAIN_NODE_ID, "use_emo_text", bool(emo_text.strip()))
+        return prompt
+
+    async def _read_result(self, prompt_id: str) -> Dict[str, Any]:
+        history = await comfyui_service.wait_for_history(prompt_id)
+        files = comfyui_service.extract_output_files(history)
+        audio_file = comfyui_service.pick_first_audio_file(files)
+        if not audio_file:
+            raise AppError("INDEX_TTS_FAILED", f"IndexTTS2 未产出音频文件, prompt_id={prompt_id}")
+
+        audio_bytes = await comfyui_service.download_file(audio_file)
+        return {
+            "audio_bytes": audio_bytes,
+            "audio_filename": audio_file.get("filename", "index_tts_output.mp3"),
+            "comfy_prompt_id": prompt_id,
+        }
 
 index_tts_service = IndexTTSService()
@@ -1,9 +1,12 @@
 """Infinitetalk video service via RunningHub."""
 
+import asyncio
+import math
 import os
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 from urllib.parse import urlparse
 
+from audio_conditioning import audio_duration
 from config import settings
 from errors import AppError
 from models import DurationModeEnum, PlatformEnum
@@ -20,6 +23,8 @@ class InfinitetalkService:
     ASPECT_RATIO_NODE_ID = "204"
     ASPECT_RATIO_FIT_MODE = "crop"
     FPS = 25
+    # the video VAE compresses 4 frames per latent step plus the first frame: num_frames = 4n + 1
+    FRAME_MULTIPLE = 4
     PLATFORM_ASPECT_RATIO_MAP = {
         PlatformEnum.TIKTOK.value: "9:16",
         PlatformEnum.INSTAGRAM.value: "1:1",
@@ -35,16 +40,16 @@ class InfinitetalkService:
         platform: PlatformEnum = PlatformEnum.TIKTOK,
         duration_mode: DurationModeEnum = DurationModeEnum.FOLLOW_AUDIO,
         fixed_duration_sec: int = 12,
+        on_task_created: Optional[Callable[[str], None]] = None,
+        audio_duration_sec: Optional[float] = None,
     ) -> Dict[str, Any]:
-        uploaded_image_name = await runninghub_service.upload_file(
-            file_bytes=image_bytes,
-            filename=image_filename,
-            file_type="input",
-        )
-        uploaded_audio_name = await runninghub_service.upload_file(
-            file_bytes=audio_bytes,
-            filename=audio_filename,
-            file_type="input",
+        """Run the workflow; num_frames always follows the audio (or the fixed duration) exactly.
+
+        audio_duration_sec is measured from audio_bytes when not given.
+        """
+        uploaded_image_name, uploaded_audio_name = await asyncio.gather(
+            runninghub_service.upload_file(file_bytes=image_bytes, filename=image_filename, file_type="input"),
+            runninghub_service.upload_file(file_bytes=audio_bytes, filename=audio_filename, file_type="input"),
         )
 
         aspect_ratio = self._aspect_ratio_for_platform(platform)
@@ -77,13 +82,21 @@ class InfinitetalkService:
         ]
 
         if duration_mode == DurationModeEnum.FIXED:
-            node_info_list.append(
-                {
-                    "nodeId": self.MULTITALK_EMBEDS_NODE_ID,
-                    "fieldName": "num_frames",
-                    "fieldValue": self._fixed_num_frames(fixed_duration_sec),
-                }
-            )
+            content_frames = max(1, int(fixed_duration_sec or 12)) * self.FPS
+        else:
+            if not audio_duration_sec or audio_duration_sec <= 0:
+                audio_duration_sec = await asyncio.to_thread(audio_duration, audio_bytes, audio_filename)
+            if not audio_duration_sec or audio_duration_sec <= 0:
+                raise AppError("VIDEO_GENERATION_FAILED", "无法读取音频时长，不能计算视频帧数")
+            content_frames = max(1, math.ceil(audio_duration_sec * self.FPS - 1e-6))
+        num_frames = self._frame_budget(content_frames)
+        node_info_list.append(
+            {
+                "nodeId": self.MULTITALK_EMBEDS_NODE_ID,
+                "fieldName": "num_frames",
+                "fieldValue": num_frames,
+            }
+        )
 
         created = await runninghub_service.create_task(
             workflow_id_or_url=settings.runninghub_video_workflow_id,
@@ -91,10 +104,14 @@ class InfinitetalkService:
             timeout_sec=max(60, int(settings.runninghub_video_timeout_sec)),
         )
         task_id = created["task_id"]
+        if on_task_created:
+            on_task_created(task_id)
 
+        phase_durations: Dict[str, float] = {}
         outputs = await runninghub_service.wait_for_outputs(
             task_id=task_id,
             timeout_sec=0,
+            phase_durations=phase_durations,
         )
         video_output = runninghub_service.pick_first_video_output(outputs)
         if not video_output:
@@ -116,10 +133,33 @@ class InfinitetalkService:
             "comfy_prompt_id": task_id,
             "runninghub_task_id": task_id,
             "aspect_ratio_applied": aspect_ratio,
+            "frame_budget": self._frame_report(num_frames, content_frames, phase_durations.get("runninghub.execution")),
         }
 
-    def _fixed_num_frames(self, fixed_duration_sec: int) -> int:
-        return max(1, int(fixed_duration_sec or 12)) * self.FPS
+    def _frame_budget(self, content_frames: int) -> int:
+        """Smallest valid frame count (4n + 1) that covers content_frames."""
+        steps = math.ceil((max(1, content_frames) - 1) / self.FRAME_MULTIPLE)
+        return steps * self.FRAME_MULTIPLE + 1
+
+    def _frame_report(self, num_frames: int, content_frames: int, render_sec: Optional[float]) -> Dict[str, Any]:
+        """Frames rendered beyond the content and, when the workflow default is known, frames avoided."""
+        report: Dict[str, Any] = {
+            "num_frames": num_frames,
+            "content_frames": content_frames,
+            "padding_frames": num_frames - content_frames,
+            "render_sec": round(render_sec, 1) if render_sec is not None else None,
+            "workflow_default_frames": None,
+            "frames_saved": None,
+            "render_sec_saved": None,
+        }
+        default_frames = int(settings.infinitetalk_workflow_num_frames or 0)
+        if default_frames > 0:
+            report["workflow_default_frames"] = default_frames
+            report["frames_saved"] = default_frames - num_frames
+            if render_sec:
+                # render time is roughly linear in the number of frames
+                report["render_sec_saved"] = round(render_sec / num_frames * (default_frames - num_frames), 1)
+        return report
 
     def _aspect_ratio_for_platform(self, platform: PlatformEnum) -> str:
         platform_value = platform.value if isinstance(platform, PlatformEnum) else str(platform).lower()
@@ -8,6 +8,7 @@ import httpx
 
 from config import settings
 from errors import AppError
+from tracing import tracer
 
 logger = logging.getLogger(__name__)
 
@@ -37,7 +38,7 @@ class LLMService:
         
         url = f"{self.base_url}/chat/completions"
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with httpx.AsyncClient(timeout=60.0, event_hooks=tracer.http_event_hooks()) as client:
             response = await client.post(
                 url,
                 headers=self._get_headers(),
@@ -1,7 +1,7 @@
 """MegaTTS3 workflow service via RunningHub."""
 
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from urllib.parse import urlparse
 
 from config import settings
@@ -21,26 +21,31 @@ class MegaTTS3Service:
         text: str,
         reference_audio_bytes: Optional[bytes] = None,
         reference_audio_filename: str = "reference.wav",
+        on_task_created: Optional[Callable[[str], None]] = None,
+        reference_audio_file: Optional[str] = None,
     ) -> Dict[str, Any]:
+        """reference_audio_file: RunningHub file name of an already uploaded sample (skips the upload)."""
         final_text = (text or "").strip()
         if not final_text:
             raise AppError("MEGA_TTS3_FAILED", "Text is empty; cannot generate audio.")
 
-        if reference_audio_bytes is None:
+        if reference_audio_bytes is None and not reference_audio_file:
             default_ref = (settings.mega_tts_default_reference_audio_path or "").strip()
             if default_ref and os.path.exists(default_ref):
                 with open(default_ref, "rb") as f:
                     reference_audio_bytes = f.read()
                 reference_audio_filename = os.path.basename(default_ref)
 
-        if reference_audio_bytes is None:
+        if reference_audio_file:
+            uploaded_ref_name = reference_audio_file
+        elif reference_audio_bytes is None:
             raise AppError("MEGA_TTS3_REFERENCE_AUDIO_REQUIRED", "参考音频必传，缺少语音克隆样本。")
-
-        uploaded_ref_name = await runninghub_service.upload_file(
-            file_bytes=reference_audio_bytes,
-            filename=reference_audio_filename,
-            file_type="input",
-        )
+        else:
+            uploaded_ref_name = await runninghub_service.upload_file(
+                file_bytes=reference_audio_bytes,
+                filename=reference_audio_filename,
+                file_type="input",
+            )
 
         node_info_list: List[Dict[str, Any]] = [
             {
@@ -66,6 +71,8 @@ class MegaTTS3Service:
             timeout_sec=max(30, int(settings.runninghub_audio_timeout_sec)),
         )
         task_id = created["task_id"]
+        if on_task_created:
+            on_task_created(task_id)
         wait_timeout_sec = int(settings.runninghub_audio_timeout_sec)
         outputs = await runninghub_service.wait_for_outputs(
             task_id=task_id,
@@ -11,6 +11,7 @@ import httpx
 
 from config import settings
 from errors import AppError
+from tracing import tracer
 
 
 class RunningHubService:
@@ -18,6 +19,8 @@ class RunningHubService:
 
     RUNNING_CODES = {804, 813}
     FAILED_CODE = 805
+    # 813 = waiting in RunningHub queue, 804 = executing on a worker.
+    PHASE_BY_CODE = {813: "runninghub.queue_wait", 804: "runninghub.execution"}
 
     def __init__(self) -> None:
         self.base_url = settings.runninghub_base_url.rstrip("/")
@@ -57,7 +60,7 @@ class RunningHubService:
 
     async def _post_json(self, path: str, payload: Dict[str, Any], timeout_sec: int = 120) -> Dict[str, Any]:
         url = f"{self.base_url}{path}"
-        async with httpx.AsyncClient(timeout=float(timeout_sec)) as client:
+        async with httpx.AsyncClient(timeout=float(timeout_sec), event_hooks=tracer.http_event_hooks()) as client:
             response = await client.post(url, headers=self._headers(), json=payload)
 
         if response.status_code != 200:
@@ -83,7 +86,7 @@ class RunningHubService:
         files = {"file": (safe_name, file_bytes, mime)}
 
         url = f"{self.base_url}/task/openapi/upload"
-        async with httpx.AsyncClient(timeout=float(self.upload_timeout_sec)) as client:
+        async with httpx.AsyncClient(timeout=float(self.upload_timeout_sec), event_hooks=tracer.http_event_hooks()) as client:
             response = await client.post(url, headers=self._headers(), data=payload, files=files)
 
         if response.status_code != 200:
@@ -168,55 +171,89 @@ class RunningHubService:
             "raw": body,
         }
 
+    async def cancel_task(self, task_id: str) -> bool:
+        """Ask RunningHub to cancel a queued/running task so its GPU slot is released."""
+        api_key = self._ensure_api_key()
+        payload = {"apiKey": api_key, "taskId": task_id}
+        try:
+            body = await self._post_json("/task/openapi/cancel", payload, timeout_sec=30)
+        except AppError:
+            return False
+        return body.get("code") == 0
+
     async def query_outputs(self, task_id: str) -> Dict[str, Any]:
         api_key = self._ensure_api_key()
         payload = {"apiKey": api_key, "taskId": task_id}
         return await self._post_json("/task/openapi/outputs", payload, timeout_sec=self.api_timeout_sec)
 
-    async def wait_for_outputs(self, task_id: str, timeout_sec: int) -> List[Dict[str, Any]]:
+    async def wait_for_outputs(
+        self,
+        task_id: str,
+        timeout_sec: int,
+        phase_durations: Optional[Dict[str, float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Poll until the task has outputs; phase_durations (if given) gets seconds per phase."""
         timeout_value = int(timeout_sec)
         deadline = None if timeout_value <= 0 else (time.monotonic() + max(1, timeout_value))
 
-        while True:
-            if deadline is not None and time.monotonic() >= deadline:
-                raise AppError("RUNNINGHUB_TASK_TIMEOUT", f"任务超时({timeout_sec}s): taskId={task_id}")
-
-            body = await self.query_outputs(task_id)
-            code = body.get("code")
-            data = body.get("data")
-
-            if code == 0:
-                if isinstance(data, list):
-                    return [item for item in data if isinstance(item, dict)]
-                raise AppError(
-                    "RUNNINGHUB_TASK_STATUS_ERROR",
-                    f"任务返回成功但 data 结构异常, taskId={task_id}, body={json.dumps(body, ensure_ascii=False)[:500]}",
-                )
+        phase_name = "runninghub.queue_wait"
+        phase_start = time.time()
 
-            if code in self.RUNNING_CODES:
-                await asyncio.sleep(self.poll_interval_sec)
-                continue
+        try:
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise AppError("RUNNINGHUB_TASK_TIMEOUT", f"任务超时({timeout_sec}s): taskId={task_id}")
+
+                body = await self.query_outputs(task_id)
+                code = body.get("code")
+                data = body.get("data")
+
+                next_phase = self.PHASE_BY_CODE.get(code)
+                if next_phase and next_phase != phase_name:
+                    now = time.time()
+                    tracer.record(phase_name, "upstream", phase_start, now, runninghub_task_id=task_id)
+                    if phase_durations is not None:
+                        phase_durations[phase_name] = phase_durations.get(phase_name, 0.0) + now - phase_start
+                    phase_name, phase_start = next_phase, now
+
+                if code == 0:
+                    if isinstance(data, list):
+                        return [item for item in data if isinstance(item, dict)]
+                    raise AppError(
+                        "RUNNINGHUB_TASK_STATUS_ERROR",
+                        f"任务返回成功但 data 结构异常, taskId={task_id}, body={json.dumps(body, ensure_ascii=False)[:500]}",
+                    )
 
-            if code == self.FAILED_CODE:
-                failed_reason = data.get("failedReason") if isinstance(data, dict) else None
-                if isinstance(failed_reason, dict):
-                    node_name = failed_reason.get("node_name")
-                    message = failed_reason.get("exception_message")
+                if code in self.RUNNING_CODES:
+                    await asyncio.sleep(self.poll_interval_sec)
+                    continue
+
+                if code == self.FAILED_CODE:
+                    failed_reason = data.get("failedReason") if isinstance(data, dict) else None
+                    if isinstance(failed_reason, dict):
+                        node_name = failed_reason.get("node_name")
+                        message = failed_reason.get("exception_message")
+                        raise AppError(
+                            "RUNNINGHUB_TASK_FAILED",
+                            f"任务失败, taskId={task_id}, node={node_name}, message={message}",
+                        )
                     raise AppError(
                         "RUNNINGHUB_TASK_FAILED",
-                        f"任务失败, taskId={task_id}, node={node_name}, message={message}",
+                        f"任务失败, taskId={task_id}, body={json.dumps(body, ensure_ascii=False)[:500]}",
                     )
+
                 raise AppError(
-                    "RUNNINGHUB_TASK_FAILED",
-                    f"任务失败, taskId={task_id}, body={json.dumps(body, ensure_ascii=False)[:500]}",
+                    "RUNNINGHUB_TASK_STATUS_ERROR",
+                    f"未知任务状态, taskId={task_id}, code={code}, msg={body.get('msg')}",
                 )
+        finally:
+            now = time.time()
+            tracer.record(phase_name, "upstream", phase_start, now, runninghub_task_id=task_id)
+            if phase_durations is not None:
+                phase_durations[phase_name] = phase_durations.get(phase_name, 0.0) + now - phase_start
 
-            raise AppError(
-                "RUNNINGHUB_TASK_STATUS_ERROR",
-                f"未知任务状态, taskId={task_id}, code={code}, msg={body.get('msg')}",
-            )
     async def download_file(self, file_url: str, timeout_sec: int = 300) -> bytes:
-        async with httpx.AsyncClient(timeout=float(timeout_sec)) as client:
+        async with httpx.AsyncClient(timeout=float(timeout_sec), event_hooks=tracer.http_event_hooks()) as client:
             resp = await client.get(file_url)
         if resp.status_code != 200:
             raise AppError(
@@ -1,8 +1,9 @@
 """OSS对象存储服务（中台通用上传接口）"""
 import mimetypes
-from typing import Dict, Any
+from typing import Any, BinaryIO, Dict, Union
 import httpx
 from config import settings
+from tracing import tracer
 
 
 class OSSService:
@@ -18,8 +19,10 @@ class OSSService:
         guessed, _ = mimetypes.guess_type(filename)
         return guessed or fallback or "application/octet-stream"
 
-    async def upload_file(self, file_content: bytes, object_key: str, content_type: str = "image/jpeg") -> str:
-        """上传文件到 OSS 并返回可访问 URL"""
+    async def upload_file(
+        self, file_content: Union[bytes, BinaryIO], object_key: str, content_type: str = "image/jpeg"
+    ) -> str:
+        """上传文件到 OSS 并返回可访问 URL（file_content 可为 bytes 或已定位到开头的文件对象）"""
         filename = object_key.split("/")[-1] if object_key else "upload.bin"
         resolved_content_type = self._guess_content_type(filename, content_type)
 
@@ -27,7 +30,7 @@ class OSSService:
         data = {"type": self.upload_type}
         files = {"file": (filename, file_content, resolved_content_type)}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
+        async with httpx.AsyncClient(timeout=self.timeout, event_hooks=tracer.http_event_hooks()) as client:
             response = await client.post(url, data=data, files=files)
 
         if response.status_code != 200:
@@ -0,0 +1,332 @@
+"""Video generation backends (Infinitetalk on RunningHub, Seedance on Ark) and a load-aware router."""
+
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from config import settings
+from errors import AppError
+from models import DurationModeEnum, PlatformEnum
+from tracing import tracer
+from .ark_service import ark_service
+from .infinitetalk_service import infinitetalk_service
+from .runninghub_service import runninghub_service
+
+
+@dataclass
+class VideoRequest:
+    """Everything a backend may need; each backend uses the part it understands."""
+
+    task_id: str
+    image_url: str  # may be "" while image_url_ready is still uploading the image
+    audio_url: str
+    prompt_text: str
+    voice_text: str
+    language: str
+    platform: PlatformEnum
+    duration_mode: DurationModeEnum
+    fixed_duration_sec: int
+    fetch: Callable[[str], Awaitable[bytes]]
+    on_task_created: Optional[Callable[[str], None]] = None  # RunningHub task id (Infinitetalk)
+    on_ark_task_created: Optional[Callable[[str], None]] = None  # Ark video task id (Seedance)
+    image_bytes: Optional[bytes] = None
+    image_filename: str = ""
+    image_url_ready: Optional["asyncio.Task[str]"] = None
+    audio_duration_sec: Optional[float] = None
+    # backend name -> provider task created for this request (see VideoBackend.release)
+    upstream_task_ids: Dict[str, str] = field(default_factory=dict)
+
+    async def get_image_bytes(self) -> bytes:
+        if self.image_bytes is None:
+            self.image_bytes = await self.fetch(await self.get_image_url())
+        return self.image_bytes
+
+    async def get_image_url(self) -> str:
+        if not self.image_url and self.image_url_ready is not None:
+            # shielded: a backend giving up must not cancel the shared upload
+            self.image_url = await asyncio.shield(self.image_url_ready)
+        return self.image_url
+
+
+class VideoBackend(ABC):
+    """One video provider. generate() returns video_bytes/video_filename plus provider task ids."""
+
+    name = ""
+    # latency assumed before the first run finished, seconds
+    default_latency_sec = 300.0
+    # True: lip-syncs the task's own (TTS / cloned) audio; False: voices voice_text itself
+    uses_task_audio = True
+
+    def is_available(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def generate(self, request: VideoRequest) -> Dict[str, Any]:
+        ...
+
+    async def release(self, request: VideoRequest) -> None:
+        """Cancel the provider task a failed generate() left behind, so it stops holding a GPU slot."""
+
+
+class InfinitetalkBackend(VideoBackend):
+    """Lip-synced video of the task's own audio, via the Infinitetalk workflow on RunningHub."""
+
+    name = "infinitetalk"
+    default_latency_sec = 600.0
+
+    def is_available(self) -> bool:
+        return bool(settings.runninghub_api_key and settings.runninghub_video_workflow_id)
+
+    async def generate(self, request: VideoRequest) -> Dict[str, Any]:
+        def on_task_created(rh_task_id: str) -> None:
+            request.upstream_task_ids[self.name] = rh_task_id
+            if request.on_task_created:
+                request.on_task_created(rh_task_id)
+
+        with tracer.span("download.inputs"):
+            image_bytes, audio_bytes = await asyncio.gather(
+                request.get_image_bytes(), request.fetch(request.audio_url)
+            )
+        # keep the real container in the name (the video input copy is FLAC after conditioning)
+        audio_ext = os.path.splitext(urlparse(request.audio_url).path)[1] or ".wav"
+        with tracer.span("infinitetalk.generate_video"):
+            return await infinitetalk_service.generate_video(
+                image_bytes=image_bytes,
+                image_filename=request.image_filename or f"model_{request.task_id}.jpg",
+                audio_bytes=audio_bytes,
+                audio_filename=f"audio_{request.task_id}{audio_ext}",
+                prompt_text=request.prompt_text,
+                platform=request.platform,
+                duration_mode=request.duration_mode,
+                fixed_duration_sec=request.fixed_duration_sec,
+                on_task_created=on_task_created,
+                audio_duration_sec=request.audio_duration_sec,
+            )
+
+    async def release(self, request: VideoRequest) -> None:
+        rh_task_id = request.upstream_task_ids.pop(self.name, None)
+        if rh_task_id:
+            await runninghub_service.cancel_task(rh_task_id)
+
+
+class SeedanceBackend(VideoBackend):
+    """Seedance image-to-video on Ark; speaks voice_text itself instead of using the task audio."""
+
+    name = "seedance"
+    default_latency_sec = 240.0
+    uses_task_audio = False
+
+    def is_available(self) -> bool:
+        return bool(settings.ark_api_key)
+
+    async def generate(self, request: VideoRequest) -> Dict[str, Any]:
+        duration = None
+        if request.duration_mode == DurationModeEnum.FIXED:
+            duration = request.fixed_duration_sec
+        try:
+            with tracer.span("seedance.generate_video"):
+                ark_task_id = await ark_service.create_video_task(
+                    image_url=await request.get_image_url(),
+                    prompt=request.prompt_text,
+                    voice_text=request.voice_text,
+                    language=request.language,
+                    duration=duration,
+                )
+                request.upstream_task_ids[self.name] = ark_task_id
+                if request.on_ark_task_created:
+                    request.on_ark_task_created(ark_task_id)
+                video_url = await ark_service.wait_for_video(
+                    ark_task_id,
+                    max_wait=max(60, int(settings.seedance_video_timeout_sec)),
+                    interval=max(1, int(settings.runninghub_poll_interval_sec)),
+                )
+        except AppError:
+            raise
+        except Exception as e:
+            raise AppError("VIDEO_GENERATION_FAILED", f"Seedance 视频生成失败: {e}") from e
+
+        with tracer.span("download.video"):
+            video_bytes = await request.fetch(video_url)
+        return {
+            "video_bytes": video_bytes,
+            "video_filename": os.path.basename(urlparse(video_url).path) or "seedance_output.mp4",
+            "comfy_prompt_id": None,
+            "runninghub_task_id": None,
+            "ark_video_task_id": ark_task_id,
+            "aspect_ratio_applied": None,
+        }
+
+    async def release(self, request: VideoRequest) -> None:
+        ark_task_id = request.upstream_task_ids.pop(self.name, None)
+        if ark_task_id:
+            await ark_service.cancel_video_task(ark_task_id)
+
+
+class _BackendStats:
+    """Per-process load and health of one backend."""
+
+    # weight of the newest observation in the moving averages
+    ALPHA = 0.3
+
+    def __init__(self, default_latency_sec: float) -> None:
+        self.in_flight = 0
+        self.latency_sec = default_latency_sec
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.degraded_until = 0.0
+
+    def record(self, ok: bool, latency_sec: Optional[float] = None) -> None:
+        self.error_rate = (1 - self.ALPHA) * self.error_rate + self.ALPHA * (0.0 if ok else 1.0)
+        if ok:
+            self.consecutive_failures = 0
+            self.degraded_until = 0.0
+            if latency_sec is not None:
+                self.latency_sec = (1 - self.ALPHA) * self.latency_sec + self.ALPHA * latency_sec
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= max(1, settings.video_provider_degraded_after_failures):
+            self.degraded_until = time.monotonic() + settings.video_provider_degraded_cooldown_sec
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self.degraded_until
+
+    def expected_wait_sec(self, in_flight: int) -> float:
+        """Rough time until a new job here finishes, inflated by the chance it has to be redone."""
+        return (in_flight + 1) * self.latency_sec / max(0.05, 1.0 - self.error_rate)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "latency_sec": round(self.latency_sec, 1),
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "degraded": self.degraded,
+        }
+
+
+class VideoRouter:
+    """Pick a backend per task from queue depth, latency and error rate; fail over on provider errors.
+
+    Only backends with the same audio source (uses_task_audio) are candidates for one task: those of
+    settings.video_provider, or for "auto" the ones using the task's audio when it has any. Load and
+    health never move a task between the two classes, so there is no failover or spill between
+    Infinitetalk (task audio) and Seedance (voices the script itself); changing VIDEO_PROVIDER does.
+    Within the candidates the preferred backend keeps every task until it has
+    video_provider_spill_in_flight jobs in flight or is degraded, the rest are ranked by expected wait.
+
+    Jobs in flight come from the task store when one is attached (running jobs of every worker
+    process), otherwise from this process. Latency and error rates are kept per process.
+    """
+
+    # errors caused by the request itself; another provider would fail the same way
+    NON_RETRYABLE_CODES = {"INVALID_REQUEST", "TASK_NOT_FOUND", "AUDIO_REQUIRED", "IMAGE_UPLOAD_FAILED"}
+
+    def __init__(self, backends: List[VideoBackend]) -> None:
+        self.backends: Dict[str, VideoBackend] = {b.name: b for b in backends}
+        self.stats: Dict[str, _BackendStats] = {b.name: _BackendStats(b.default_latency_sec) for b in backends}
+        self._store: Any = None
+
+    def attach_store(self, store: Any) -> None:
+        """Count jobs in flight across processes from the shared TaskStore."""
+        self._store = store
+
+    async def _in_flight(self, task_id: str) -> Dict[str, int]:
+        if self._store is None:
+            return {name: stats.in_flight for name, stats in self.stats.items()}
+        try:
+            return await asyncio.to_thread(self._store.video_jobs_in_flight, task_id)
+        except Exception:
+            # routing must not fail on a busy store; fall back to this process's view
+            return {name: stats.in_flight for name, stats in self.stats.items()}
+
+    def _enabled(self) -> List[str]:
+        names = [n.strip().lower() for n in settings.video_providers_enabled.split(",") if n.strip()]
+        return [n for n in names if n in self.backends and self.backends[n].is_available()]
+
+    def plan(self, has_audio: bool = True, in_flight: Optional[Dict[str, int]] = None) -> List[str]:
+        """Backends in the order they should be tried for the next task."""
+        enabled = self._enabled()
+        if not enabled:
+            raise AppError("VIDEO_GENERATION_FAILED", "没有可用的视频生成服务，请检查 VIDEO_PROVIDERS_ENABLED 与 API Key 配置")
+        if in_flight is None:
+            in_flight = {name: stats.in_flight for name, stats in self.stats.items()}
+
+        # the audio source (and so the voice) is fixed by configuration, never by load or health
+        preferred = (settings.video_provider or "auto").strip().lower()
+        if preferred in self.backends:
+            uses_task_audio = self.backends[preferred].uses_task_audio
+        else:
+            uses_task_audio = has_audio and any(self.backends[n].uses_task_audio for n in enabled)
+        candidates = [n for n in enabled if self.backends[n].uses_task_audio == uses_task_audio]
+        if not candidates:
+            raise AppError(
+                "VIDEO_GENERATION_FAILED",
+                f"首选视频服务 {preferred} 不可用，且没有使用相同音频来源的其他服务，请检查 VIDEO_PROVIDERS_ENABLED 与 API Key 配置",
+            )
+
+        # healthy before degraded, then shortest expected wait
+        ranked = sorted(
+            candidates,
+            key=lambda n: (self.stats[n].degraded, self.stats[n].expected_wait_sec(in_flight.get(n, 0))),
+        )
+        if preferred in candidates:
+            spill_at = settings.video_provider_spill_in_flight
+            saturated = spill_at > 0 and in_flight.get(preferred, 0) >= spill_at
+            if not self.stats[preferred].degraded and not saturated:
+                ranked.remove(preferred)
+                ranked.insert(0, preferred)
+        if not settings.video_failover_enabled:
+            ranked = ranked[:1]
+        return ranked
+
+    async def generate(
+        self,
+        request: VideoRequest,
+        on_backend: Optional[Callable[[str], None]] = None,
+    ) -> Dict[str, Any]:
+        """Run request on the best backend, trying the next one when a provider fails.
+
+        on_backend(name) is called before each attempt. The result carries "provider".
+        """
+        last_error: Optional[AppError] = None
+        in_flight = await self._in_flight(request.task_id)
+        for name in self.plan(has_audio=bool(request.audio_url), in_flight=in_flight):
+            backend, stats = self.backends[name], self.stats[name]
+            if on_backend:
+                on_backend(name)
+            stats.in_flight += 1
+            started = time.monotonic()
+            try:
+                result = await backend.generate(request)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e if isinstance(e, AppError) else AppError("VIDEO_GENERATION_FAILED", str(e))
+                # e.g. a poll timeout: the provider job may still be queued or running upstream
+                try:
+                    await backend.release(request)
+                except Exception:
+                    pass
+                if error.code in self.NON_RETRYABLE_CODES:
+                    raise error from e
+                stats.record(ok=False)
+                last_error = error
+                continue
+            finally:
+                stats.in_flight -= 1
+            stats.record(ok=True, latency_sec=time.monotonic() - started)
+            return {**result, "provider": name}
+
+        assert last_error is not None
+        raise last_error
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+
+video_router = VideoRouter([InfinitetalkBackend(), SeedanceBackend()])
@@ -0,0 +1,128 @@
+"""Reference-voice library: samples registered once and reused by voice_id."""
+
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from audio_conditioning import condition_audio
+from config import settings
+from errors import AppError
+from models import VoiceProfile
+from .runninghub_service import runninghub_service
+
+
+class VoiceLibraryService:
+    """Store preprocessed voice samples in the task store and cache their RunningHub upload."""
+
+    def __init__(self) -> None:
+        self._store = None
+        # one upload per voice at a time in this process
+        self._upload_locks: Dict[str, asyncio.Lock] = {}
+
+    def attach_store(self, store) -> None:
+        self._store = store
+
+    def _require_store(self):
+        if self._store is None:
+            raise AppError("VOICE_LIBRARY_UNAVAILABLE", "声音库未初始化")
+        return self._store
+
+    async def register(self, name: str, audio_bytes: bytes, filename: str) -> Tuple[VoiceProfile, bool]:
+        """Trim, resample and peak-normalize a sample and store it; returns (voice, created).
+
+        Samples are deduplicated by content: registering the same bytes again returns the existing
+        voice (created=False) unchanged, under the name it was first registered with.
+        """
+        store = self._require_store()
+        if not audio_bytes:
+            raise AppError("INVALID_REQUEST", "参考音频不能为空")
+
+        source_sha256 = hashlib.sha256(audio_bytes).hexdigest()
+        existing = await asyncio.to_thread(store.find_voice_by_source, source_sha256)
+        if existing:
+            return existing, False
+
+        conditioned = await asyncio.to_thread(
+            condition_audio,
+            audio_bytes,
+            filename,
+            trim=True,
+            target_sample_rate=settings.voice_sample_rate,
+            silence_db=settings.audio_trim_silence_db,
+            edge_pad_sec=settings.audio_trim_edge_pad_sec,
+            max_pause_sec=settings.audio_trim_max_pause_sec,
+            max_duration_sec=settings.voice_max_duration_sec,
+            peak_db=settings.voice_peak_db,
+        )
+        if not conditioned.original_duration_sec:
+            raise AppError("INVALID_REQUEST", f"无法解析参考音频: {'; '.join(conditioned.notes)}")
+
+        voice_id = uuid.uuid4().hex
+        base = os.path.splitext(os.path.basename(filename or "voice"))[0] or "voice"
+        voice = VoiceProfile(
+            voice_id=voice_id,
+            name=(name or "").strip() or base,
+            filename=f"voice_{voice_id}{os.path.splitext(conditioned.filename)[1] or '.wav'}",
+            source_sha256=source_sha256,
+            sample_rate=settings.voice_sample_rate,
+            duration_sec=conditioned.duration_sec,
+            original_duration_sec=conditioned.original_duration_sec,
+            size_bytes=len(conditioned.audio_bytes),
+            created_at=datetime.now().isoformat(),
+        )
+        await asyncio.to_thread(store.save_voice, voice, conditioned.audio_bytes)
+        return voice, True
+
+    def get(self, voice_id: str) -> VoiceProfile:
+        voice = self._require_store().load_voice(voice_id)
+        if not voice:
+            raise AppError("VOICE_NOT_FOUND", f"声音 {voice_id} 不存在")
+        return voice
+
+    def list(self) -> List[VoiceProfile]:
+        return self._require_store().list_voices()
+
+    def delete(self, voice_id: str) -> bool:
+        self._upload_locks.pop(voice_id, None)
+        return self._require_store().delete_voice(voice_id)
+
+    async def runninghub_file(self, voice_id: str) -> str:
+        """RunningHub input file name of the voice sample, uploading only when no fresh handle is cached."""
+        store = self._require_store()
+        lock = self._upload_locks.setdefault(voice_id, asyncio.Lock())
+        async with lock:
+            voice = await asyncio.to_thread(store.load_voice, voice_id)
+            if not voice:
+                raise AppError("VOICE_NOT_FOUND", f"声音 {voice_id} 不存在")
+            ttl = settings.voice_runninghub_file_ttl_sec
+            if voice.runninghub_file and voice.runninghub_uploaded_at and (
+                ttl <= 0 or time.time() - voice.runninghub_uploaded_at < ttl
+            ):
+                return voice.runninghub_file
+
+            audio = await asyncio.to_thread(store.load_voice_audio, voice_id)
+            uploaded = await runninghub_service.upload_file(file_bytes=audio, filename=voice.filename, file_type="input")
+            uploaded_at = time.time()
+
+            def apply(v: VoiceProfile) -> None:
+                v.runninghub_file = uploaded
+                v.runninghub_uploaded_at = uploaded_at
+
+            await asyncio.to_thread(store.update_voice, voice_id, apply)
+            return uploaded
+
+    def forget_runninghub_file(self, voice_id: str) -> None:
+        """Drop the cached handle (e.g. RunningHub no longer has the file); the next run uploads again."""
+
+        def apply(v: VoiceProfile) -> None:
+            v.runninghub_file = None
+            v.runninghub_uploaded_at = None
+
+        self._require_store().update_voice(voice_id, apply)
+
+
+voice_library_service = VoiceLibraryService()
@@ -0,0 +1,103 @@
+"""Parse workflow JSON files once and hand out cheap per-request copies of the API prompt."""
+
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List
+
+from errors import AppError
+
+
+class CompiledWorkflow:
+    """API-format prompt of one workflow file plus node id -> widget input slots."""
+
+    def __init__(self, path: str, mtime: float, prompt: Dict[str, Any], widget_slots: Dict[str, List[str]]) -> None:
+        self.path = path
+        self.mtime = mtime
+        self.prompt = prompt
+        # node id -> widget input names in widgets_values order (index 0 is the node's first widget)
+        self.widget_slots = widget_slots
+
+    def instantiate(self) -> Dict[str, Any]:
+        """Copy of the prompt whose node input dicts can be changed without touching the template."""
+        return {
+            node_id: {**node, "inputs": dict(node.get("inputs") or {})}
+            for node_id, node in self.prompt.items()
+        }
+
+    def widget_name(self, node_id: Any, index: int = 0) -> str:
+        slots = self.widget_slots.get(str(node_id))
+        if slots is None:
+            raise AppError("COMFY_WORKFLOW_ERROR", f"workflow 缺少节点: {node_id}")
+        if index >= len(slots):
+            raise AppError("COMFY_WORKFLOW_ERROR", f"workflow 节点 {node_id} 没有第 {index + 1} 个参数")
+        return slots[index]
+
+    def set_widget(self, prompt: Dict[str, Any], node_id: Any, index: int, value: Any) -> None:
+        """Set the index-th widget of a node (what widgets_values[index] was in the UI workflow)."""
+        prompt[str(node_id)]["inputs"][self.widget_name(node_id, index)] = value
+
+    def set_input(self, prompt: Dict[str, Any], node_id: Any, name: str, value: Any) -> bool:
+        """Set a named widget input; returns False when the node has no such widget."""
+        if name not in self.widget_slots.get(str(node_id), []):
+            return False
+        prompt[str(node_id)]["inputs"][name] = value
+        return True
+
+
+class WorkflowCompiler:
+    """Cache of CompiledWorkflow per file path, recompiled when the file's mtime changes."""
+
+    def __init__(self, to_prompt: Callable[[Dict[str, Any]], Dict[str, Any]]) -> None:
+        self._to_prompt = to_prompt
+        self._cache: Dict[str, CompiledWorkflow] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> CompiledWorkflow:
+        abs_path = os.path.abspath(path)
+        try:
+            mtime = os.stat(abs_path).st_mtime
+        except FileNotFoundError as e:
+            raise AppError("COMFY_WORKFLOW_ERROR", f"workflow file not found: {path}") from e
+
+        with self._lock:
+            compiled = self._cache.get(abs_path)
+            if compiled is not None and compiled.mtime == mtime:
+                return compiled
+
+        compiled = self._compile(abs_path, mtime)
+        with self._lock:
+            self._cache[abs_path] = compiled
+        return compiled
+
+    def _compile(self, path: str, mtime: float) -> CompiledWorkflow:
+        try:
+            with open(path, "r", encoding="utf-8-sig") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise AppError("COMFY_WORKFLOW_ERROR", f"workflow JSON decode failed: {path}") from e
+        if not isinstance(data, dict):
+            raise AppError("COMFY_WORKFLOW_ERROR", f"workflow root must be an object: {path}")
+
+        if "nodes" in data:
+            prompt = self._to_prompt(data)
+            widget_slots = {
+                str(node.get("id")): [inp.get("name") for inp in node.get("inputs") or [] if inp.get("widget")]
+                for node in data.get("nodes") or []
+            }
+        else:
+            # already an API prompt: every literal (non-link) input is a settable slot
+            prompt = data
+            widget_slots = {
+                str(node_id): [k for k, v in (node.get("inputs") or {}).items() if not self._is_link(v)]
+                for node_id, node in data.items()
+                if isinstance(node, dict)
+            }
+
+        if not prompt:
+            raise AppError("COMFY_WORKFLOW_ERROR", f"workflow parse failed: empty/invalid prompt: {path}")
+        return CompiledWorkflow(path, mtime, prompt, widget_slots)
+
+    @staticmethod
+    def _is_link(value: Any) -> bool:
+        return isinstance(value, list) and len(value) == 2 and isinstance(value[1], int)
@@ -0,0 +1,134 @@
+"""Bounded in-memory cache of hot task records; the SQLite task store is the backing tier."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from models import TaskData
+
+
+class TaskCache:
+    """LRU cache of TaskData with idle TTL, a shorter TTL for finished tasks, and entry/byte caps.
+
+    Evicting is always safe: every update is written to the task store first, so a miss
+    just means the next read loads the record from SQLite.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_sec: float,
+        terminal_ttl_sec: float,
+        is_terminal: Callable[[TaskData], bool],
+    ) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_sec = float(ttl_sec)
+        self.terminal_ttl_sec = float(terminal_ttl_sec)
+        self.is_terminal = is_terminal
+        # task_id -> (task, estimated size in bytes, last access monotonic time)
+        self._entries: "OrderedDict[str, Tuple[TaskData, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions: Dict[str, int] = {"ttl": 0, "terminal_ttl": 0, "entries": 0, "bytes": 0}
+
+    @staticmethod
+    def _estimate_size(task: TaskData) -> int:
+        return len(task.model_dump_json())
+
+    def _expired(self, task: TaskData, accessed_at: float, now: float) -> Optional[str]:
+        if self.is_terminal(task):
+            if self.terminal_ttl_sec > 0 and now - accessed_at > self.terminal_ttl_sec:
+                return "terminal_ttl"
+        elif self.ttl_sec > 0 and now - accessed_at > self.ttl_sec:
+            return "ttl"
+        return None
+
+    def _remove(self, task_id: str) -> Optional[TaskData]:
+        entry = self._entries.pop(task_id, None)
+        if entry is None:
+            return None
+        self._bytes -= entry[1]
+        return entry[0]
+
+    def get(self, task_id: str) -> Optional[TaskData]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            task, size, accessed_at = entry
+            reason = self._expired(task, accessed_at, now)
+            if reason:
+                self._remove(task_id)
+                self.evictions[reason] += 1
+                self.misses += 1
+                return None
+            self._entries[task_id] = (task, size, now)
+            self._entries.move_to_end(task_id)
+            self.hits += 1
+            return task
+
+    def put(self, task: TaskData) -> None:
+        size = self._estimate_size(task)
+        with self._lock:
+            self._remove(task.task_id)
+            self._entries[task.task_id] = (task, size, time.monotonic())
+            self._bytes += size
+            self._evict_locked()
+
+    def pop(self, task_id: str) -> Optional[TaskData]:
+        with self._lock:
+            return self._remove(task_id)
+
+    def evict_expired(self) -> int:
+        now = time.monotonic()
+        evicted = 0
+        with self._lock:
+            for task_id, (task, _, accessed_at) in list(self._entries.items()):
+                reason = self._expired(task, accessed_at, now)
+                if reason:
+                    self._remove(task_id)
+                    self.evictions[reason] += 1
+                    evicted += 1
+        return evicted
+
+    def _evict_locked(self) -> None:
+        # Least recently used first; the newest entry is always kept.
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions["entries"] += 1
+        while self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self.evictions["bytes"] += 1
+
+    def __contains__(self, task_id: str) -> bool:
+        with self._lock:
+            return task_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        self.evict_expired()
+        with self._lock:
+            terminal = sum(1 for task, _, _ in self._entries.values() if self.is_terminal(task))
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "terminal_entries": terminal,
+                "estimated_bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_sec": self.ttl_sec,
+                "terminal_ttl_sec": self.terminal_ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": dict(self.evictions),
+            }
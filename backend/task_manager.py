@@ -1,19 +1,25 @@
 ﻿"""Task manager for digital human generation."""
 import asyncio
+import concurrent.futures
+import functools
 import json
+import threading
+import logging
 import mimetypes
 import os
-import tempfile
 import uuid
 from datetime import datetime
 from io import BytesIO
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
 
 import httpx
-from mutagen import File as MutagenFile
 
+from audio_conditioning import audio_duration, condition_audio
 from config import settings
+from download_cache import DownloadCache
 from errors import AppError
+from mp4_faststart import FaststartError, faststart_to_spool
 from models import (
     AudioSourceEnum,
     DurationModeEnum,
@@ -26,18 +32,65 @@ from models import (
 )
 from services import (
     ark_service,
-    mega_tts3_service,
     infinitetalk_service,
+    mega_tts3_service,
     llm_service,
+    runninghub_service,
     tos_service,
+    video_router,
+    voice_library_service,
 )
+from services.video_backends import VideoRequest
+from task_cache import TaskCache
+from task_store import TaskStore
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
 
 
 class TaskManager:
     """Manage all task states and orchestration."""
 
+    GENERATE_VIDEO_JOB = "generate_video"
+    TERMINAL_STATUSES = {TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED}
+    # Large text fields kept in the store's blob table instead of the hot task record.
+    BLOB_FIELDS = ("person_prompt", "action_text", "image_prompt_raw_response")
+
     def __init__(self):
-        self.tasks: Dict[str, TaskData] = {}
+        self.tasks = TaskCache(
+            max_entries=settings.task_cache_max_entries,
+            max_bytes=int(settings.task_cache_max_mb * 1024 * 1024),
+            ttl_sec=settings.task_cache_ttl_sec,
+            terminal_ttl_sec=settings.task_cache_terminal_ttl_sec,
+            is_terminal=lambda task: task.status in self.TERMINAL_STATUSES,
+        )
+        # In-flight asyncio work per task in this process, so cancel_task can stop it.
+        self._running: Dict[str, asyncio.Task] = {}
+        # one thread, so store calls from coroutines keep their submission order
+        self._store_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-store")
+        self._update_lock = threading.Lock()
+        self.store = TaskStore(settings.task_store_path)
+        # In process mode API workers and generation workers all write tasks,
+        # so reads and updates go through the shared store instead of the local cache.
+        self.shared_store = settings.generation_worker_mode == "process"
+        tracer.attach_store(self.store)
+        voice_library_service.attach_store(self.store)
+        if self.shared_store:
+            # jobs run in several worker processes; route on their combined load
+            video_router.attach_store(self.store)
+        # input files (portrait, scene, model image, audio) are re-read on retries and regenerations
+        self.download_cache: Optional[DownloadCache] = None
+        if settings.download_cache_enabled:
+            # entries are never revalidated, so only our own OSS URLs (unique key per upload) qualify
+            cache_hosts = settings.download_cache_hosts.split(",")
+            if not settings.download_cache_hosts.strip():
+                cache_hosts = [urlparse(settings.oss_base_url).hostname or ""]
+            self.download_cache = DownloadCache(
+                settings.download_cache_dir,
+                max_bytes=int(settings.download_cache_max_mb * 1024 * 1024),
+                max_object_bytes=int(settings.download_cache_max_object_mb * 1024 * 1024),
+                hosts=cache_hosts,
+            )
 
     @staticmethod
     def _drain_background_task(task: asyncio.Task) -> None:
@@ -49,44 +102,217 @@ class TaskManager:
 
     def create_task(self) -> str:
         task_id = str(uuid.uuid4())
-        self.tasks[task_id] = TaskData(task_id=task_id, video_provider=settings.video_provider)
+        task = TaskData(task_id=task_id, video_provider=settings.video_provider)
+        self.store.save_task(task)
+        self.tasks.put(task)
         return task_id
 
+    async def create_task_async(self) -> str:
+        return await self._in_store_thread(self.create_task)
+
     def get_task(self, task_id: str) -> Optional[TaskData]:
-        return self.tasks.get(task_id)
+        """Return the hot task record; BLOB_FIELDS are empty here, see get_full_task."""
+        if not self.shared_store:
+            task = self.tasks.get(task_id)
+            if task is not None:
+                return task
+
+        stored = self.store.load_task(task_id)
+        if stored is None:
+            self.tasks.pop(task_id)
+            return None
+        self.tasks.put(stored)
+        return stored
+
+    async def get_task_async(self, task_id: str) -> Optional[TaskData]:
+        if not self.shared_store:
+            task = self.tasks.get(task_id)
+            if task is not None:
+                return task
+        return await self._in_store_thread(self.get_task, task_id)
+
+    def get_task_version(self, task_id: str) -> Optional[int]:
+        """Current task version without loading the record (None if the task does not exist)."""
+        if not self.shared_store:
+            task = self.tasks.get(task_id)
+            if task is not None:
+                return task.version
+        return self.store.load_version(task_id)
+
+    async def get_task_version_async(self, task_id: str) -> Optional[int]:
+        if not self.shared_store:
+            task = self.tasks.get(task_id)
+            if task is not None:
+                return task.version
+        return await self._in_store_thread(self.store.load_version, task_id)
+
+    def get_task_blobs(self, task_id: str) -> Dict[str, str]:
+        return self.store.load_blobs(task_id)
+
+    def get_full_task(self, task_id: str) -> Optional[TaskData]:
+        """Task record with the offloaded large fields filled back in (debug/detail views)."""
+        task = self.get_task(task_id)
+        if task is None:
+            return None
+        blobs = self.get_task_blobs(task_id)
+        return task.model_copy(update=blobs) if blobs else task
+
+    async def get_full_task_async(self, task_id: str) -> Optional[TaskData]:
+        return await self._in_store_thread(self.get_full_task, task_id)
+
+    def update_task(self, task_id: str, reopen: bool = False, **kwargs) -> bool:
+        """Apply field updates; returns False if the task is gone or the update was refused.
+
+        A cancelled task is not moved back to a running status by late pipeline updates;
+        only user-initiated steps pass reopen=True to start it again. Blocks on SQLite:
+        coroutines use update_task_async (or update_task_later from sync callbacks).
+        """
+        blobs = {key: kwargs.pop(key) for key in self.BLOB_FIELDS if key in kwargs}
+        new_status = kwargs.get("status")
+
+        def apply(task: TaskData) -> Optional[bool]:
+            if (
+                not reopen
+                and task.status == TaskStatus.CANCELLED
+                and new_status is not None
+                and new_status not in self.TERMINAL_STATUSES
+            ):
+                return False
+            for key, value in kwargs.items():
+                if hasattr(task, key):
+                    setattr(task, key, value)
+            # Records written before offloading may still carry the fields inline.
+            for key in blobs:
+                setattr(task, key, TaskData.model_fields[key].default)
+            task.version += 1
+
+        with self._update_lock:
+            if self.shared_store:
+                task = self.store.update_task(task_id, apply)
+                if not task:
+                    return False
+            else:
+                task = self.get_task(task_id)
+                if not task or apply(task) is False:
+                    return False
+                self.store.save_task(task)
+            if blobs:
+                self.store.save_blobs(task_id, blobs)
+            self.tasks.put(task)
+
+        self._save_intermediate(task_id, task, blobs_changed=bool(blobs))
+        return True
 
-    def update_task(self, task_id: str, **kwargs) -> bool:
-        task = self.tasks.get(task_id)
-        if not task:
-            return False
+    async def update_task_async(self, task_id: str, reopen: bool = False, **kwargs) -> bool:
+        return await self._in_store_thread(self.update_task, task_id, reopen, **kwargs)
 
-        for key, value in kwargs.items():
-            if hasattr(task, key):
-                setattr(task, key, value)
-        self._save_intermediate(task_id)
-        return True
+    def update_task_later(self, task_id: str, **kwargs) -> None:
+        """Queue an update from a sync callback; it is applied before any store call submitted after it."""
+        future = self._store_executor.submit(self.update_task, task_id, **kwargs)
+        future.add_done_callback(self._log_store_error)
 
-    def _save_intermediate(self, task_id: str) -> None:
-        task = self.tasks.get(task_id)
+    @staticmethod
+    def _log_store_error(future: "concurrent.futures.Future") -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("task store update failed", exc_info=future.exception())
+
+    async def _in_store_thread(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run blocking task store I/O on the store thread so a busy SQLite lock never stalls the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._store_executor, functools.partial(fn, *args, **kwargs))
+
+    def _save_intermediate(self, task_id: str, task: Optional[TaskData] = None, blobs_changed: bool = False) -> None:
+        """Dump the task record to the Desktop; the large fields go to a separate file, only when they change."""
+        task = task or self.get_task(task_id)
         if not task:
             return
 
         desktop = os.path.join(os.path.expanduser("~"), "Desktop", "数字人中间产物")
         os.makedirs(desktop, exist_ok=True)
-        payload = task.model_dump()
-        payload["saved_at"] = datetime.now().isoformat()
-        file_path = os.path.join(desktop, f"{task_id}.json")
-        with open(file_path, "w", encoding="utf-8") as f:
+        saved_at = datetime.now().isoformat()
+        payload = task.model_dump(exclude=set(self.BLOB_FIELDS))
+        payload["saved_at"] = saved_at
+        with open(os.path.join(desktop, f"{task_id}.json"), "w", encoding="utf-8") as f:
             json.dump(payload, f, ensure_ascii=False, indent=2)
 
+        if blobs_changed:
+            blobs = {key: "" for key in self.BLOB_FIELDS}
+            blobs.update(self.get_task_blobs(task_id))
+            blobs["saved_at"] = saved_at
+            with open(os.path.join(desktop, f"{task_id}.blobs.json"), "w", encoding="utf-8") as f:
+                json.dump(blobs, f, ensure_ascii=False, indent=2)
+
     def delete_task(self, task_id: str) -> bool:
-        if task_id in self.tasks:
-            del self.tasks[task_id]
+        existed = self.tasks.pop(task_id) is not None
+        existed = self.store.delete_task(task_id) or existed
+        if existed:
+            tracer.drop(task_id)
+        return existed
+
+    async def delete_task_async(self, task_id: str) -> bool:
+        return await self._in_store_thread(self.delete_task, task_id)
+
+    async def _is_cancelled(self, task_id: str) -> bool:
+        task = await self.get_task_async(task_id)
+        return bool(task and task.status == TaskStatus.CANCELLED)
+
+    def _track(self, task_id: str, task: asyncio.Task) -> asyncio.Task:
+        self._running[task_id] = task
+        task.add_done_callback(lambda t: self._running.pop(task_id, None) if self._running.get(task_id) is t else None)
+        return task
+
+    async def cancel_local(self, task_id: str) -> bool:
+        """Stop the pipeline coroutine for task_id running in this process."""
+        running = self._running.pop(task_id, None)
+        if running and not running.done():
+            running.cancel()
             return True
         return False
 
-    def _fail_task(self, task_id: str, code: str, message: str) -> None:
-        self.update_task(
+    async def cancel_task(self, task_id: str) -> Dict[str, Any]:
+        """Cancel a task: stop local work and release the upstream RunningHub job."""
+        task = await self.get_task_async(task_id)
+        if not task:
+            raise AppError("TASK_NOT_FOUND", f"Task {task_id} not found")
+        if task.status in self.TERMINAL_STATUSES:
+            return {"task_id": task_id, "status": task.status, "cancelled": False}
+
+        previous_status = task.status
+        # Mark first: worker processes poll this status, and late failures must not overwrite it.
+        await self.update_task_async(
+            task_id, status=TaskStatus.CANCELLED, current_step="已取消", error=None, error_code=None
+        )
+        local_cancelled = await self.cancel_local(task_id)
+
+        upstream_id = None
+        if previous_status == TaskStatus.GENERATING_AUDIO:
+            upstream_id = task.runninghub_audio_task_id
+        elif previous_status in (TaskStatus.GENERATING_IMAGE, TaskStatus.GENERATING_VIDEO):
+            upstream_id = task.runninghub_video_task_id
+        upstream_cancelled = False
+        if upstream_id:
+            upstream_cancelled = await runninghub_service.cancel_task(upstream_id)
+        # Seedance runs on Ark instead of RunningHub
+        ark_task_id = task.ark_video_task_id if previous_status == TaskStatus.GENERATING_VIDEO else None
+        ark_cancelled = False
+        if ark_task_id:
+            ark_cancelled = await ark_service.cancel_video_task(ark_task_id)
+
+        return {
+            "task_id": task_id,
+            "status": TaskStatus.CANCELLED,
+            "cancelled": True,
+            "local_cancelled": local_cancelled,
+            "runninghub_task_id": upstream_id,
+            "runninghub_cancelled": upstream_cancelled,
+            "ark_task_id": ark_task_id,
+            "ark_cancelled": ark_cancelled,
+        }
+
+    async def _fail_task(self, task_id: str, code: str, message: str) -> None:
+        if await self._is_cancelled(task_id):
+            return
+        await self.update_task_async(
             task_id,
             status=TaskStatus.FAILED,
             current_step="失败",
@@ -95,31 +321,19 @@ class TaskManager:
         )
 
     async def _download_binary(self, url: str) -> bytes:
-        async with httpx.AsyncClient(timeout=120.0) as client:
+        if self.download_cache is None:
+            return await self._fetch_binary(url)
+        return await self.download_cache.get(url, self._fetch_binary)
+
+    async def _fetch_binary(self, url: str) -> bytes:
+        async with httpx.AsyncClient(timeout=120.0, event_hooks=tracer.http_event_hooks()) as client:
             resp = await client.get(url)
         if resp.status_code != 200:
             raise AppError("VIDEO_GENERATION_FAILED", f"下载素材失败: {resp.status_code} {url}")
         return resp.content
 
     def _audio_duration(self, audio_bytes: bytes, filename: str = "audio.mp3") -> float:
-        try:
-            suffix = os.path.splitext(filename)[1] or ".mp3"
-            temp_path = ""
-            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-                tmp.write(audio_bytes)
-                tmp.flush()
-                temp_path = tmp.name
-            media = MutagenFile(temp_path)
-            try:
-                if temp_path and os.path.exists(temp_path):
-                    os.remove(temp_path)
-            except Exception:
-                pass
-            if media and getattr(media, "info", None) and getattr(media.info, "length", None):
-                return round(float(media.info.length), 3)
-        except Exception:
-            return 0.0
-        return 0.0
+        return audio_duration(audio_bytes, filename)
 
     async def _upload_audio_bytes(self, task_id: str, audio_bytes: bytes, filename: str) -> str:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -178,6 +392,7 @@ class TaskManager:
         object_key = f"seedream_ref_{timestamp}_{task_id}.jpg"
         return await tos_service.upload_file(merged_bytes, object_key, "image/jpeg")
 
+    @tracer.stage("upload_materials")
     async def upload_materials(
         self,
         task_id: str,
@@ -185,12 +400,13 @@ class TaskManager:
         portrait_image: Optional[bytes] = None,
         portrait_filename: str = "portrait.jpg",
     ) -> Dict[str, Any]:
-        task = self.get_task(task_id)
+        task = await self.get_task_async(task_id)
         if not task:
             raise AppError("TASK_NOT_FOUND", f"Task {task_id} not found")
 
-        self.update_task(
+        await self.update_task_async(
             task_id,
+            reopen=True,
             status=TaskStatus.UPLOADING,
             current_step="上传素材",
             progress=10,
@@ -212,7 +428,7 @@ class TaskManager:
                 object_key = f"portrait_{timestamp}_{task_id}_{portrait_filename}"
                 portrait_url = await tos_service.upload_file(portrait_image, object_key)
 
-            self.update_task(
+            await self.update_task_async(
                 task_id,
                 scene_images=scene_urls,
                 portrait_image=portrait_url,
@@ -228,9 +444,10 @@ class TaskManager:
         except AppError:
             raise
         except Exception as e:
-            self._fail_task(task_id, "UPLOAD_FAILED", str(e))
+            await self._fail_task(task_id, "UPLOAD_FAILED", str(e))
             raise
 
+    @tracer.stage("generate_script")
     async def generate_script(
         self,
         task_id: str,
@@ -238,7 +455,7 @@ class TaskManager:
         selling_points: str = "",
         language: str = "zh",
     ) -> Dict[str, str]:
-        task = self.get_task(task_id)
+        task = await self.get_task_async(task_id)
         if not task:
             raise AppError("TASK_NOT_FOUND", f"Task {task_id} not found")
 
@@ -252,8 +469,9 @@ class TaskManager:
         if not normalized_product and not normalized_points:
             raise AppError("SCRIPT_INPUT_REQUIRED", "介绍主体和核心信息不能同时为空。")
 
-        self.update_task(
+        await self.update_task_async(
             task_id,
+            reopen=True,
             status=TaskStatus.GENERATING_SCRIPT,
             current_step="生成脚本",
             progress=35,
@@ -271,9 +489,10 @@ class TaskManager:
                 normalized_points,
                 language,
             )
-            current_snapshot = self.get_task(task_id) or task
+            current_snapshot = await self.get_task_async(task_id) or task
+            blobs = await self._in_store_thread(self.get_task_blobs, task_id)
 
-            self.update_task(
+            await self.update_task_async(
                 task_id,
                 voice_text=voice_text,
                 progress=50,
@@ -282,16 +501,17 @@ class TaskManager:
 
             return {
                 "voice_text": voice_text,
-                "person_prompt": current_snapshot.person_prompt or "",
-                "action_text": current_snapshot.action_text or "",
+                "person_prompt": blobs.get("person_prompt") or current_snapshot.person_prompt or "",
+                "action_text": blobs.get("action_text") or current_snapshot.action_text or "",
             }
 
         except AppError:
             raise
         except Exception as e:
-            self._fail_task(task_id, "SCRIPT_GENERATION_FAILED", str(e))
+            await self._fail_task(task_id, "SCRIPT_GENERATION_FAILED", str(e))
             raise
 
+    @tracer.stage("generate_audio")
     async def generate_audio(
         self,
         task_id: str,
@@ -299,9 +519,10 @@ class TaskManager:
         voice_text_override: Optional[str] = None,
         reference_audio_bytes: Optional[bytes] = None,
         reference_audio_filename: str = "reference.wav",
+        voice_id: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Generate audio using MegaTTS3 only."""
-        task = self.get_task(task_id)
+        """Generate audio using MegaTTS3 only, cloning either the uploaded sample or a library voice."""
+        task = await self.get_task_async(task_id)
         if not task:
             raise AppError("TASK_NOT_FOUND", f"Task {task_id} not found")
 
@@ -318,58 +539,119 @@ class TaskManager:
             script_mode = task.script_mode
             if script_mode != ScriptModeEnum.LLM:
                 script_mode = ScriptModeEnum.MANUAL
-            self.update_task(task_id, voice_text=patched_text, script_mode=script_mode)
+            await self.update_task_async(task_id, voice_text=patched_text, script_mode=script_mode)
 
-        refreshed = self.get_task(task_id)
+        refreshed = await self.get_task_async(task_id)
         text = ((refreshed.voice_text if refreshed else task.voice_text) or "").strip()
         if not text:
             raise AppError("MEGA_TTS3_FAILED", "任务尚未生成脚本，无法生成音频")
-        if reference_audio_bytes is None:
-            raise AppError("MEGA_TTS3_REFERENCE_AUDIO_REQUIRED", "请上传参考音频后再生成音频。")
+        if reference_audio_bytes is None and not voice_id:
+            raise AppError("MEGA_TTS3_REFERENCE_AUDIO_REQUIRED", "请上传参考音频或选择声音（voice_id）后再生成音频。")
+        if voice_id:
+            voice_library_service.get(voice_id)
 
-        self.update_task(
+        await self.update_task_async(
             task_id,
+            reopen=True,
             status=TaskStatus.GENERATING_AUDIO,
             current_step="生成音频",
             progress=60,
             language=language_enum,
+            voice_id=voice_id,
             error=None,
             error_code=None,
         )
 
         try:
+            reference_audio_file = None
+            if voice_id:
+                with tracer.span("voice_library.runninghub_file"):
+                    reference_audio_file = await voice_library_service.runninghub_file(voice_id)
             timeout_sec = int(settings.tts_generation_timeout_sec)
-            generation_task = asyncio.create_task(
-                mega_tts3_service.generate_audio(
-                    text=text,
-                    reference_audio_bytes=reference_audio_bytes,
-                    reference_audio_filename=reference_audio_filename,
+            with tracer.span("mega_tts3.generate_audio"):
+                generation_task = asyncio.create_task(
+                    mega_tts3_service.generate_audio(
+                        text=text,
+                        reference_audio_bytes=reference_audio_bytes,
+                        reference_audio_filename=reference_audio_filename,
+                        on_task_created=lambda rh_id: self.update_task_later(task_id, runninghub_audio_task_id=rh_id),
+                        reference_audio_file=reference_audio_file,
+                    )
                 )
-            )
-            if timeout_sec > 0:
-                done, _ = await asyncio.wait({generation_task}, timeout=timeout_sec)
-                if generation_task not in done:
-                    generation_task.cancel()
-                    generation_task.add_done_callback(self._drain_background_task)
-                    raise asyncio.TimeoutError()
-
-                result = generation_task.result()
-            else:
-                result = await generation_task
+                self._track(task_id, generation_task)
+                if timeout_sec > 0:
+                    done, _ = await asyncio.wait({generation_task}, timeout=timeout_sec)
+                    if generation_task not in done:
+                        generation_task.cancel()
+                        generation_task.add_done_callback(self._drain_background_task)
+                        raise asyncio.TimeoutError()
+
+                    result = generation_task.result()
+                else:
+                    result = await generation_task
             audio_bytes = result["audio_bytes"]
             generated_name = result.get("audio_filename", "mega_tts3_output.flac")
-
-            audio_duration = self._audio_duration(audio_bytes, generated_name)
-            audio_url = await self._upload_audio_bytes(task_id, audio_bytes, generated_name)
-
-            self.update_task(
+            original_duration = duration_sec = self._audio_duration(audio_bytes, generated_name)
+
+            trimmed_sec, frames_saved = 0.0, 0
+            video_audio: Optional[Tuple[bytes, str]] = None
+            if settings.audio_trim_enabled or settings.audio_target_sample_rate:
+                with tracer.span("audio.condition"):
+                    # the user hears the full-band audio (only trimmed) ...
+                    conditioned = await asyncio.to_thread(
+                        condition_audio,
+                        audio_bytes,
+                        generated_name,
+                        trim=settings.audio_trim_enabled,
+                        target_sample_rate=0,
+                        silence_db=settings.audio_trim_silence_db,
+                        edge_pad_sec=settings.audio_trim_edge_pad_sec,
+                        max_pause_sec=settings.audio_trim_max_pause_sec,
+                    )
+                    if conditioned.original_duration_sec:
+                        # decoded sample count; more reliable than the container header
+                        original_duration = duration_sec = conditioned.original_duration_sec
+                    if conditioned.applied:
+                        audio_bytes, generated_name = conditioned.audio_bytes, conditioned.filename
+                        duration_sec = conditioned.duration_sec
+                        trimmed_sec = conditioned.saved_sec
+                        frames_saved = conditioned.saved_frames(infinitetalk_service.FPS)
+                    if conditioned.notes:
+                        logger.info("task %s: audio conditioning: %s", task_id, "; ".join(conditioned.notes))
+                    # ... the video model gets a mono copy at its input rate (lossless FLAC)
+                    if settings.audio_target_sample_rate:
+                        model_input = await asyncio.to_thread(
+                            condition_audio,
+                            audio_bytes,
+                            generated_name,
+                            trim=False,
+                            target_sample_rate=settings.audio_target_sample_rate,
+                            native_format="FLAC",
+                        )
+                        if model_input.applied:
+                            video_audio = (model_input.audio_bytes, model_input.filename)
+            with tracer.span("oss.upload_audio"):
+                audio_url = await self._upload_audio_bytes(task_id, audio_bytes, generated_name)
+                video_audio_url = None
+                if video_audio:
+                    video_audio_url = await self._upload_audio_bytes(
+                        task_id, video_audio[0], f"video_input_{video_audio[1]}"
+                    )
+            if await self._is_cancelled(task_id):
+                raise AppError("TASK_CANCELLED", "任务已取消")
+
+            await self.update_task_async(
                 task_id,
                 status=TaskStatus.AUDIO_READY,
                 current_step="音频就绪",
                 progress=72,
                 audio_url=audio_url,
                 final_audio_url=audio_url,
-                audio_duration_sec=audio_duration,
+                video_audio_url=video_audio_url,
+                audio_duration_sec=duration_sec,
+                audio_original_duration_sec=original_duration,
+                audio_trimmed_sec=trimmed_sec,
+                video_frames_saved=frames_saved,
                 tts_engine_used=TTSEngineEnum.MEGA_TTS3,
                 audio_source=AudioSourceEnum.EXISTING_GENERATED,
                 comfy_prompt_id=result.get("comfy_prompt_id"),
@@ -379,26 +661,43 @@ class TaskManager:
             return {
                 "task_id": task_id,
                 "audio_url": audio_url,
-                "audio_duration_sec": audio_duration,
+                "audio_duration_sec": duration_sec,
+                "audio_trimmed_sec": trimmed_sec,
+                "video_frames_saved": frames_saved,
                 "tts_engine_used": TTSEngineEnum.MEGA_TTS3,
                 "fallback_used": False,
             }
 
+        except asyncio.CancelledError as e:
+            if not await self._is_cancelled(task_id):
+                raise
+            raise AppError("TASK_CANCELLED", "任务已取消") from e
         except asyncio.TimeoutError as e:
             timeout_error = AppError(
                 "MEGA_TTS3_TIMEOUT",
                 f"MegaTTS3 超时（>{settings.tts_generation_timeout_sec}s）。如需无限等待，请将 TTS_GENERATION_TIMEOUT_SEC 设为 0。",
             )
-            self._fail_task(task_id, timeout_error.code, timeout_error.message)
+            await self._fail_task(task_id, timeout_error.code, timeout_error.message)
             raise timeout_error from e
         except AppError as e:
-            self._fail_task(task_id, e.code, e.message)
+            if voice_id and reference_audio_file and self._reference_file_rejected(e, reference_audio_file):
+                # the cached sample expired on RunningHub; upload it again next time
+                await asyncio.to_thread(voice_library_service.forget_runninghub_file, voice_id)
+            await self._fail_task(task_id, e.code, e.message)
             raise
         except Exception as e:
             wrapped = AppError("MEGA_TTS3_FAILED", str(e))
-            self._fail_task(task_id, wrapped.code, wrapped.message)
+            await self._fail_task(task_id, wrapped.code, wrapped.message)
             raise wrapped from e
 
+    @staticmethod
+    def _reference_file_rejected(error: AppError, runninghub_file: str) -> bool:
+        """RunningHub refused the uploaded voice sample itself, as opposed to a timeout or an unrelated failure."""
+        if error.code == "RUNNINGHUB_PROMPT_INVALID":
+            # node validation failed, e.g. the input file is missing or unreadable
+            return True
+        return error.code == "RUNNINGHUB_TASK_FAILED" and runninghub_file in error.message
+
     async def start_generation(
         self,
         task_id: str,
@@ -406,7 +705,7 @@ class TaskManager:
         duration_mode: str = "follow_audio",
         fixed_duration_sec: Optional[int] = None,
     ) -> None:
-        task = self.get_task(task_id)
+        task = await self.get_task_async(task_id)
         if not task:
             raise AppError("TASK_NOT_FOUND", f"Task {task_id} not found")
 
@@ -433,18 +732,36 @@ class TaskManager:
             if fixed_sec <= 0:
                 raise AppError("INVALID_REQUEST", "fixed_duration_sec 必须大于 0")
 
-        self.update_task(
+        reopened = {}
+        if task.status == TaskStatus.CANCELLED:
+            # starting again; a cancel from now on applies to the new run
+            reopened = {"status": TaskStatus.AUDIO_READY, "current_step": "音频就绪", "progress": 72}
+        await self.update_task_async(
             task_id,
+            reopen=True,
             platform=platform_enum,
             duration_mode=duration_mode_enum,
             fixed_duration_sec=fixed_sec,
             video_provider=settings.video_provider,
             error=None,
             error_code=None,
+            **reopened,
         )
-        self._save_intermediate(task_id)
 
-        asyncio.create_task(self._run_generation(task_id))
+        if self.shared_store:
+            await self._in_store_thread(self.store.enqueue_job, task_id, self.GENERATE_VIDEO_JOB)
+        else:
+            self._track(task_id, asyncio.create_task(self._run_generation(task_id)))
+
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        """Run one queued job inside a generation worker process (see worker.py)."""
+        if job["kind"] == self.GENERATE_VIDEO_JOB:
+            # cancelled while the job was still queued
+            if await self._is_cancelled(job["task_id"]):
+                return
+            await self._run_generation(job["task_id"])
+            return
+        raise AppError("INVALID_REQUEST", f"unknown job kind: {job['kind']}")
 
     async def _resolve_audio_for_video(self, task: TaskData) -> str:
         if task.final_audio_url:
@@ -455,18 +772,25 @@ class TaskManager:
             "请先上传参考音频并完成音频生成，再开始视频生成。",
         )
 
+    @tracer.stage("generate_video_pipeline")
     async def _run_generation(self, task_id: str) -> None:
-        task = self.get_task(task_id)
+        task = await self.get_task_async(task_id)
         if not task:
             return
 
+        image_upload: Optional[asyncio.Task] = None
         try:
-            self.update_task(
+            started = await self.update_task_async(
                 task_id,
                 status=TaskStatus.GENERATING_IMAGE,
                 current_step="生成模特图片",
                 progress=55,
+                runninghub_video_task_id=None,
+                ark_video_task_id=None,
             )
+            if not started:
+                # cancelled (or deleted) before the pipeline got to run
+                return
 
             if not task.portrait_image:
                 raise AppError("PORTRAIT_IMAGE_REQUIRED", "缺少老板正面照（portrait_image），无法生成首帧图。")
@@ -476,12 +800,13 @@ class TaskManager:
             if not primary_scene_image:
                 raise AppError("SCENE_IMAGE_REQUIRED", "缺少有效工厂场景图 URL，无法生成首帧图。")
 
-            prompts = await llm_service.generate_model_prompt(
-                product_name=task.product_name,
-                selling_points=task.core_selling_points,
-                portrait_image_url=task.portrait_image,
-            )
-            self.update_task(
+            with tracer.span("llm.model_prompt"):
+                prompts = await llm_service.generate_model_prompt(
+                    product_name=task.product_name,
+                    selling_points=task.core_selling_points,
+                    portrait_image_url=task.portrait_image,
+                )
+            await self.update_task_async(
                 task_id,
                 person_prompt=prompts["person_prompt"],
                 action_text=prompts["action_text"],
@@ -494,33 +819,41 @@ class TaskManager:
             reference_images.extend(
                 [scene_url.strip() for scene_url in (task.scene_images or []) if (scene_url or "").strip()]
             )
-            refreshed_for_image = self.get_task(task_id)
+            refreshed_for_image = await self.get_task_async(task_id)
             if not refreshed_for_image:
                 raise AppError("TASK_NOT_FOUND", f"Task {task_id} not found")
-            model_image_url = await ark_service.generate_image(
-                refreshed_for_image.person_prompt,
-                reference_images,
-                platform=refreshed_for_image.platform,
-            )
+            with tracer.span("seedream.generate_image"):
+                model_image_bytes = await ark_service.generate_image_bytes(
+                    prompts["person_prompt"],
+                    reference_images,
+                    platform=refreshed_for_image.platform,
+                )
+            model_image_filename = f"model_{task_id}{ark_service.image_extension(model_image_bytes)}"
 
-            self.update_task(
+            # The image goes to OSS (for the task record and URL-based providers) while the
+            # video backend already uploads the same bytes to its own storage.
+            image_upload = asyncio.create_task(
+                self._persist_model_image(task_id, model_image_bytes, model_image_filename)
+            )
+            await self.update_task_async(
                 task_id,
-                model_image_url=model_image_url,
                 seedream_reference_image_url=reference_images[0],
                 progress=70,
             )
 
-            self.update_task(task_id, current_step="准备音频", progress=73)
-            refreshed_task = self.get_task(task_id)
+            await self.update_task_async(task_id, current_step="准备音频", progress=73)
+            refreshed_task = await self.get_task_async(task_id)
             if not refreshed_task:
                 raise AppError("TASK_NOT_FOUND", f"Task {task_id} not found")
 
             final_audio_url = await self._resolve_audio_for_video(refreshed_task)
-            refreshed_task = self.get_task(task_id)
+            refreshed_task = await self.get_task_async(task_id)
             if not refreshed_task:
                 raise AppError("TASK_NOT_FOUND", f"Task {task_id} not found")
+            if await self._is_cancelled(task_id):
+                return
 
-            self.update_task(
+            await self.update_task_async(
                 task_id,
                 status=TaskStatus.GENERATING_VIDEO,
                 current_step="生成数字人视频",
@@ -529,30 +862,63 @@ class TaskManager:
                 video_provider=settings.video_provider,
             )
 
-            if not refreshed_task.model_image_url:
-                raise AppError("VIDEO_GENERATION_FAILED", "缺少模型图片 URL")
-
-            image_bytes = await self._download_binary(refreshed_task.model_image_url)
-            audio_bytes = await self._download_binary(final_audio_url)
-
-            video_result = await infinitetalk_service.generate_video(
-                image_bytes=image_bytes,
-                image_filename=f"model_{task_id}.jpg",
-                audio_bytes=audio_bytes,
-                audio_filename=f"audio_{task_id}.mp3",
-                prompt_text=refreshed_task.action_text,
+            video_request = VideoRequest(
+                task_id=task_id,
+                image_url="",
+                image_url_ready=image_upload,
+                image_bytes=model_image_bytes,
+                image_filename=model_image_filename,
+                # the delivered audio stays full-band; the model only needs its 16 kHz input
+                audio_url=refreshed_task.video_audio_url or final_audio_url,
+                prompt_text=prompts["action_text"],
+                voice_text=refreshed_task.voice_text,
+                language=refreshed_task.language.value,
                 platform=refreshed_task.platform,
                 duration_mode=refreshed_task.duration_mode,
                 fixed_duration_sec=refreshed_task.fixed_duration_sec or 12,
+                audio_duration_sec=refreshed_task.audio_duration_sec,
+                fetch=self._download_binary,
+                on_task_created=lambda rh_id: self.update_task_later(task_id, runninghub_video_task_id=rh_id),
+                on_ark_task_created=lambda ark_id: self.update_task_later(task_id, ark_video_task_id=ark_id),
             )
-
-            video_url = await tos_service.upload_file(
-                video_result["video_bytes"],
-                f"video_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{task_id}_{video_result['video_filename']}",
-                "video/mp4",
+            video_result = await video_router.generate(
+                video_request,
+                on_backend=lambda name: self.update_task_later(
+                    task_id, video_provider=name, runninghub_video_task_id=None, ark_video_task_id=None
+                ),
             )
-
-            self.update_task(
+            if await self._is_cancelled(task_id):
+                return
+            try:
+                await image_upload
+            except AppError as e:
+                # the render is done; only model_image_url stays empty
+                logger.warning("task %s: %s", task_id, e.message)
+
+            # moov in front of mdat so players can start before the whole file is downloaded
+            video_file = None
+            if settings.video_faststart_enabled:
+                with tracer.span("video.faststart"):
+                    try:
+                        video_file = await asyncio.to_thread(
+                            faststart_to_spool,
+                            video_result["video_bytes"],
+                            int(settings.video_faststart_spool_mb * 1024 * 1024),
+                        )
+                    except FaststartError as e:
+                        logger.warning("task %s: video left as is, faststart failed: %s", task_id, e)
+            try:
+                with tracer.span("oss.upload_video"):
+                    video_url = await tos_service.upload_file(
+                        video_file or video_result["video_bytes"],
+                        f"video_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{task_id}_{video_result['video_filename']}",
+                        "video/mp4",
+                    )
+            finally:
+                if video_file:
+                    video_file.close()
+
+            await self.update_task_async(
                 task_id,
                 status=TaskStatus.COMPLETED,
                 current_step="完成",
@@ -562,15 +928,37 @@ class TaskManager:
                 final_audio_url=final_audio_url,
                 comfy_prompt_id=video_result.get("comfy_prompt_id"),
                 runninghub_video_task_id=video_result.get("runninghub_task_id"),
+                ark_video_task_id=video_result.get("ark_video_task_id"),
+                video_provider=video_result["provider"],
+                video_frame_budget=video_result.get("frame_budget"),
                 aspect_ratio_applied=video_result.get("aspect_ratio_applied"),
                 error=None,
                 error_code=None,
             )
 
         except AppError as e:
-            self._fail_task(task_id, e.code, e.message)
+            await self._fail_task(task_id, e.code, e.message)
         except Exception as e:
-            self._fail_task(task_id, "VIDEO_GENERATION_FAILED", str(e))
+            await self._fail_task(task_id, "VIDEO_GENERATION_FAILED", str(e))
+        finally:
+            if image_upload and not image_upload.done():
+                image_upload.cancel()
+            elif image_upload and not image_upload.cancelled():
+                image_upload.exception()  # retrieved, so a failed upload nobody awaited is not logged twice
+
+    async def _persist_model_image(self, task_id: str, image_bytes: bytes, filename: str) -> str:
+        content_type, _ = mimetypes.guess_type(filename)
+        with tracer.span("oss.upload_model_image"):
+            try:
+                url = await tos_service.upload_file(
+                    image_bytes,
+                    f"model_image_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}",
+                    content_type or "image/jpeg",
+                )
+            except Exception as e:
+                raise AppError("IMAGE_UPLOAD_FAILED", f"模特图片上传失败: {e}") from e
+        await self.update_task_async(task_id, model_image_url=url)
+        return url
 
 
 task_manager = TaskManager()
@@ -0,0 +1,335 @@
+"""SQLite-backed task store and generation job queue shared by API and worker processes."""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from models import TaskData, TaskStatus, VoiceProfile
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, job_id);
+CREATE TABLE IF NOT EXISTS task_spans (
+    task_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_spans_task ON task_spans (task_id);
+CREATE TABLE IF NOT EXISTS task_blobs (
+    task_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (task_id, field)
+);
+CREATE TABLE IF NOT EXISTS voices (
+    voice_id TEXT PRIMARY KEY,
+    source_sha256 TEXT NOT NULL,
+    data TEXT NOT NULL,
+    audio BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_voices_source ON voices (source_sha256);
+"""
+
+
+class TaskStore:
+    """Persist tasks, queued jobs, trace spans and the voice library in one SQLite file (WAL mode)."""
+
+    JOB_QUEUED = "queued"
+    JOB_RUNNING = "running"
+    JOB_DONE = "done"
+    JOB_FAILED = "failed"
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000) -> None:
+        self.path = os.path.abspath(path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    # ------------------------------------------------------------------ tasks
+
+    def save_task(self, task: TaskData) -> None:
+        self._conn().execute(
+            "INSERT INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(task_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (task.task_id, task.model_dump_json(), time.time()),
+        )
+
+    def load_task(self, task_id: str) -> Optional[TaskData]:
+        row = self._conn().execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if not row:
+            return None
+        return TaskData.model_validate_json(row["data"])
+
+    def load_version(self, task_id: str) -> Optional[int]:
+        row = self._conn().execute(
+            "SELECT COALESCE(json_extract(data, '$.version'), 0) AS version FROM tasks WHERE task_id = ?",
+            (task_id,),
+        ).fetchone()
+        return int(row["version"]) if row else None
+
+    def update_task(self, task_id: str, apply: Callable[[TaskData], Optional[bool]]) -> Optional[TaskData]:
+        """Atomic read-modify-write so concurrent processes do not drop each other's fields.
+
+        apply may return False to leave the record untouched (then None is returned).
+        """
+
+        def run(conn: sqlite3.Connection) -> Optional[TaskData]:
+            row = conn.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if not row:
+                return None
+            task = TaskData.model_validate_json(row["data"])
+            if apply(task) is False:
+                return None
+            conn.execute(
+                "UPDATE tasks SET data = ?, updated_at = ? WHERE task_id = ?",
+                (task.model_dump_json(), time.time(), task_id),
+            )
+            return task
+
+        return self._transaction(run)
+
+    def delete_task(self, task_id: str) -> bool:
+        def run(conn: sqlite3.Connection) -> bool:
+            deleted = conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,)).rowcount
+            conn.execute("DELETE FROM task_spans WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM task_blobs WHERE task_id = ?", (task_id,))
+            return deleted > 0
+
+        return self._transaction(run)
+
+    # ------------------------------------------------------------------ blobs
+
+    def save_blobs(self, task_id: str, values: Dict[str, Optional[str]]) -> None:
+        """Store large text fields outside the task record; None or "" removes the field."""
+
+        def run(conn: sqlite3.Connection) -> None:
+            for field, value in values.items():
+                if value:
+                    conn.execute(
+                        "INSERT INTO task_blobs (task_id, field, value) VALUES (?, ?, ?) "
+                        "ON CONFLICT(task_id, field) DO UPDATE SET value = excluded.value",
+                        (task_id, field, value),
+                    )
+                else:
+                    conn.execute("DELETE FROM task_blobs WHERE task_id = ? AND field = ?", (task_id, field))
+
+        self._transaction(run)
+
+    def load_blobs(self, task_id: str) -> Dict[str, str]:
+        rows = self._conn().execute("SELECT field, value FROM task_blobs WHERE task_id = ?", (task_id,)).fetchall()
+        return {row["field"]: row["value"] for row in rows}
+
+    def blob_bytes(self) -> int:
+        row = self._conn().execute("SELECT COALESCE(SUM(LENGTH(CAST(value AS BLOB))), 0) AS n FROM task_blobs").fetchone()
+        return int(row["n"])
+
+    # ------------------------------------------------------------------ jobs
+
+    def enqueue_job(self, task_id: str, kind: str) -> int:
+        cursor = self._conn().execute(
+            "INSERT INTO jobs (task_id, kind, status, created_at) VALUES (?, ?, ?, ?)",
+            (task_id, kind, self.JOB_QUEUED, time.time()),
+        )
+        return int(cursor.lastrowid)
+
+    def claim_job(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Move the oldest queued job to running and return it."""
+
+        def run(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY job_id LIMIT 1",
+                (self.JOB_QUEUED,),
+            ).fetchone()
+            if not row:
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ? WHERE job_id = ?",
+                (self.JOB_RUNNING, worker_id, now, now, row["job_id"]),
+            )
+            job = dict(row)
+            job.update(status=self.JOB_RUNNING, worker_id=worker_id, attempts=row["attempts"] + 1)
+            return job
+
+        return self._transaction(run)
+
+    def heartbeat_jobs(self, job_ids: List[int]) -> None:
+        if not job_ids:
+            return
+        placeholders = ",".join("?" for _ in job_ids)
+        self._conn().execute(
+            f"UPDATE jobs SET heartbeat_at = ? WHERE job_id IN ({placeholders})",
+            (time.time(), *job_ids),
+        )
+
+    def finish_job(self, job_id: int, error: Optional[str] = None) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ?",
+            (self.JOB_FAILED if error else self.JOB_DONE, time.time(), error, job_id),
+        )
+
+    def requeue_stale_jobs(self, stale_after_sec: float, max_attempts: int) -> int:
+        """Requeue running jobs whose worker stopped sending heartbeats; fail them after max_attempts.
+
+        A job that gives up also fails its task record, so status polls stop reporting it as running.
+        """
+        cutoff = time.time() - stale_after_sec
+
+        def run(conn: sqlite3.Connection) -> int:
+            lost = conn.execute(
+                "SELECT job_id, task_id FROM jobs WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                (self.JOB_RUNNING, cutoff, max_attempts),
+            ).fetchall()
+            now = time.time()
+            for row in lost:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = 'worker lost' WHERE job_id = ?",
+                    (self.JOB_FAILED, now, row["job_id"]),
+                )
+                task_row = conn.execute("SELECT data FROM tasks WHERE task_id = ?", (row["task_id"],)).fetchone()
+                if not task_row:
+                    continue
+                task = TaskData.model_validate_json(task_row["data"])
+                if task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED):
+                    continue
+                task.status = TaskStatus.FAILED
+                task.current_step = "失败"
+                task.error = f"生成进程失联，已重试 {max_attempts} 次"
+                task.error_code = "WORKER_LOST"
+                task.version += 1
+                conn.execute(
+                    "UPDATE tasks SET data = ?, updated_at = ? WHERE task_id = ?",
+                    (task.model_dump_json(), now, row["task_id"]),
+                )
+            return conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL WHERE status = ? AND heartbeat_at < ?",
+                (self.JOB_QUEUED, self.JOB_RUNNING, cutoff),
+            ).rowcount
+
+        return self._transaction(run)
+
+    def video_jobs_in_flight(self, exclude_task_id: Optional[str] = None) -> Dict[str, int]:
+        """Running jobs per video provider recorded on their task, across all worker processes."""
+        rows = self._conn().execute(
+            "SELECT json_extract(t.data, '$.video_provider') AS provider, COUNT(*) AS n "
+            "FROM jobs j JOIN tasks t ON t.task_id = j.task_id "
+            "WHERE j.status = ? AND j.task_id != ? GROUP BY provider",
+            (self.JOB_RUNNING, exclude_task_id or ""),
+        ).fetchall()
+        return {row["provider"]: row["n"] for row in rows if row["provider"]}
+
+    def job_counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    # ------------------------------------------------------------------ voices
+
+    def save_voice(self, voice: VoiceProfile, audio: bytes) -> None:
+        self._conn().execute(
+            "INSERT INTO voices (voice_id, source_sha256, data, audio, created_at) VALUES (?, ?, ?, ?, ?)",
+            (voice.voice_id, voice.source_sha256, voice.model_dump_json(), sqlite3.Binary(audio), time.time()),
+        )
+
+    def load_voice(self, voice_id: str) -> Optional[VoiceProfile]:
+        row = self._conn().execute("SELECT data FROM voices WHERE voice_id = ?", (voice_id,)).fetchone()
+        return VoiceProfile.model_validate_json(row["data"]) if row else None
+
+    def load_voice_audio(self, voice_id: str) -> Optional[bytes]:
+        row = self._conn().execute("SELECT audio FROM voices WHERE voice_id = ?", (voice_id,)).fetchone()
+        return bytes(row["audio"]) if row else None
+
+    def find_voice_by_source(self, source_sha256: str) -> Optional[VoiceProfile]:
+        row = self._conn().execute(
+            "SELECT data FROM voices WHERE source_sha256 = ? ORDER BY created_at LIMIT 1", (source_sha256,)
+        ).fetchone()
+        return VoiceProfile.model_validate_json(row["data"]) if row else None
+
+    def list_voices(self) -> List[VoiceProfile]:
+        rows = self._conn().execute("SELECT data FROM voices ORDER BY created_at").fetchall()
+        return [VoiceProfile.model_validate_json(row["data"]) for row in rows]
+
+    def update_voice(self, voice_id: str, apply: Callable[[VoiceProfile], None]) -> Optional[VoiceProfile]:
+        def run(conn: sqlite3.Connection) -> Optional[VoiceProfile]:
+            row = conn.execute("SELECT data FROM voices WHERE voice_id = ?", (voice_id,)).fetchone()
+            if not row:
+                return None
+            voice = VoiceProfile.model_validate_json(row["data"])
+            apply(voice)
+            conn.execute("UPDATE voices SET data = ? WHERE voice_id = ?", (voice.model_dump_json(), voice_id))
+            return voice
+
+        return self._transaction(run)
+
+    def delete_voice(self, voice_id: str) -> bool:
+        cursor = self._conn().execute("DELETE FROM voices WHERE voice_id = ?", (voice_id,))
+        return cursor.rowcount > 0
+
+    # ------------------------------------------------------------------ spans
+
+    def append_spans(self, task_id: str, spans: List[Dict[str, Any]]) -> None:
+        self._transaction(
+            lambda conn: conn.executemany(
+                "INSERT INTO task_spans (task_id, data) VALUES (?, ?)",
+                [(task_id, json.dumps(span, ensure_ascii=False, default=str)) for span in spans],
+            )
+        )
+
+    def prune_spans(self, ended_before: float) -> int:
+        """Delete spans that ended before the given unix time; returns how many were removed."""
+        cursor = self._conn().execute(
+            "DELETE FROM task_spans WHERE json_extract(data, '$.end') < ?", (ended_before,)
+        )
+        return cursor.rowcount
+
+    def load_spans(self, task_id: str) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT data FROM task_spans WHERE task_id = ? ORDER BY rowid", (task_id,)
+        ).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def delete_spans(self, task_id: str) -> None:
+        self._conn().execute("DELETE FROM task_spans WHERE task_id = ?", (task_id,))
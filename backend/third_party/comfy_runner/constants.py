@@ -10,16 +10,36 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 comfy_dir = os.path.join(os.path.dirname(current_dir), "ComfyUI/")
 COMFY_BASE_PATH = os.getenv("COMFY_BASE_PATH", comfy_dir) or comfy_dir
 COMFY_MODELS_BASE_PATH = os.getenv("COMFY_RUNNER_MODELS_BASE_PATH", comfy_dir) or comfy_dir
+# absolute paths, so the runner does not depend on the process working directory
 MODEL_DOWNLOAD_PATH_LIST = [
-    "./data/civit_model_weights.json",
-    "./data/replicate_model_weights.json",
-    "./data/huggingface_weights.json",
+    os.path.join(current_dir, "data", "civit_model_weights.json"),
+    os.path.join(current_dir, "data", "replicate_model_weights.json"),
+    os.path.join(current_dir, "data", "huggingface_weights.json"),
 ]
 COMFY_MODEL_PATH_LIST = [
-    "../ComfyUI/custom_nodes/ComfyUI-Manager/model-list.json",
-    "./data/extra_comfy_weights.json",
+    os.path.join(COMFY_BASE_PATH, "custom_nodes", "ComfyUI-Manager", "model-list.json"),
+    os.path.join(current_dir, "data", "extra_comfy_weights.json"),
 ]
 
+# results of successful predict() preflights (requirements, custom nodes, model discovery)
+PREFLIGHT_CACHE_PATH = os.getenv(
+    "COMFY_RUNNER_PREFLIGHT_CACHE", os.path.join(current_dir, "data", "preflight_cache.json")
+)
+
+# model downloads: HTTP Range connections per file, smallest range worth its own connection,
+# and how many models are fetched at once
+DOWNLOAD_CONNECTIONS = int(os.getenv("COMFY_RUNNER_DOWNLOAD_CONNECTIONS", "4"))
+DOWNLOAD_MIN_SEGMENT_SIZE = 16 * 1024 * 1024
+DOWNLOAD_CONCURRENCY = int(os.getenv("COMFY_RUNNER_DOWNLOAD_CONCURRENCY", "3"))
+
+# seconds between directory-mtime checks of the model index, so models added by another
+# process, by hand or on a mounted volume are found without a restart
+MODEL_INDEX_CHECK_INTERVAL = float(os.getenv("COMFY_RUNNER_MODEL_INDEX_CHECK_INTERVAL", "30"))
+
+# custom nodes: repos fetched in parallel, and the pip cache shared by all node installs
+NODE_INSTALL_CONCURRENCY = int(os.getenv("COMFY_RUNNER_NODE_INSTALL_CONCURRENCY", "4"))
+PIP_CACHE_DIR = os.getenv("COMFY_RUNNER_PIP_CACHE", os.path.join(current_dir, "data", "pip_cache"))
+
 # enable this to view comfy console logs and other debug statements
 DEBUG_LOG_ENABLED = True
 
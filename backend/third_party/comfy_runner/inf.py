@@ -19,6 +19,8 @@ import git
 from git import Repo
 
 from .utils.gen_status_tracker import GenerationStatusTracker
+from .utils.model_index import get_model_index
+from .utils.preflight_cache import PreflightCache
 
 from .utils.node_installer import get_node_installer
 from .constants import (
@@ -26,9 +28,11 @@ from .constants import (
     COMFY_BASE_PATH,
     COMFY_MODELS_BASE_PATH,
     DEBUG_LOG_ENABLED,
+    DOWNLOAD_CONCURRENCY,
     MODEL_DOWNLOAD_PATH_LIST,
     MODEL_FILETYPES,
     OPTIONAL_MODELS,
+    PREFLIGHT_CACHE_PATH,
     SERVER_ADDR,
     comfy_dir,
 )
@@ -38,10 +42,9 @@ from .utils.common import (
     clear_directory,
     convert_to_relative_path,
     copy_files,
-    find_file_in_directory,
     find_process_by_port,
     is_url,
-    search_file,
+    move_file,
     update_toml_config,
 )
 from .utils.file_downloader import FileDownloader, FileStatus, ModelDownloader
@@ -49,17 +52,58 @@ from .utils.logger import LoggingType, app_logger
 
 
 class ComfyRunner:
-    def __init__(self):
-        self.comfy_api = ComfyAPI(SERVER_ADDR, APP_PORT)
+    def __init__(self, port=APP_PORT, server_addr=SERVER_ADDR, startup_timeout=120, workspace_dir=None):
+        """
+        port:             ComfyUI port owned by this runner (one runner per pooled server)
+        startup_timeout:  seconds to wait for the server to answer health checks after launch
+        workspace_dir:    private input/output/temp root for this server, so several servers
+                          sharing one ComfyUI install do not clear each other's files
+        """
+        self.port = int(port)
+        self.server_addr = server_addr
+        self.startup_timeout = startup_timeout
+        self.server_process = None
+        self.workspace_dir = os.path.abspath(workspace_dir) if workspace_dir else None
+        if self.workspace_dir:
+            self.input_dir = os.path.join(self.workspace_dir, "input")
+            self.output_dir = os.path.join(self.workspace_dir, "output")
+            self.temp_dir = os.path.join(self.workspace_dir, "temp")
+            self.log_dir = self.workspace_dir
+        else:
+            self.input_dir = os.path.join(COMFY_BASE_PATH, "input")
+            self.output_dir = os.path.join(COMFY_BASE_PATH, "output")
+            self.temp_dir = None
+            self.log_dir = os.path.abspath(COMFY_BASE_PATH)
+        self.comfy_api = ComfyAPI(server_addr, self.port)
         self.model_downloader = ModelDownloader(MODEL_DOWNLOAD_PATH_LIST)
         self.gen_status_tracker = GenerationStatusTracker()
+        self.preflight_cache = PreflightCache(PREFLIGHT_CACHE_PATH)
+        self.cancelled_prompts = set()  # ComfyUI prompt ids cancelled through cancel_prompt
 
     # TODO: create mixins for these kind of methods
     def is_server_running(self):
-        pid = find_process_by_port(APP_PORT)
+        pid = find_process_by_port(self.port)
         return True if pid else False
 
+    def owns_server(self):
+        return self.server_process is not None
+
+    def server_exited(self):
+        """True if the server this runner launched has died (crash or external kill)."""
+        return self.server_process is not None and self.server_process.poll() is not None
+
+    def is_ready(self):
+        """Readiness: our process (if any) is alive and the HTTP API answers."""
+        if self.server_exited():
+            return False
+        return self.comfy_api.health_check()
+
     def start_server(self):
+        if self.server_exited():
+            self.server_process = None
+        if self.server_process is not None and self.is_ready():
+            return
+
         # checking if comfy is already running
         if not self.is_server_running():
             kwargs = {
@@ -74,7 +118,18 @@ class ComfyRunner:
             comfy_main = os.path.join(COMFY_BASE_PATH, "main.py")
             if not os.path.exists(comfy_main):
                 raise Exception(f"ComfyUI main.py not found: {comfy_main}")
-            command = [python_executable, comfy_main, "--port", str(APP_PORT)]
+            command = [python_executable, comfy_main, "--port", str(self.port)]
+            if self.workspace_dir:
+                for path in (self.input_dir, self.output_dir, self.temp_dir):
+                    os.makedirs(path, exist_ok=True)
+                command += [
+                    "--input-directory",
+                    self.input_dir,
+                    "--output-directory",
+                    self.output_dir,
+                    "--temp-directory",
+                    self.temp_dir,
+                ]
             force_cpu = str(os.getenv("COMFY_FORCE_CPU", "")).strip().lower() in (
                 "1",
                 "true",
@@ -90,83 +145,357 @@ class ComfyRunner:
                     force_cpu = False
             if force_cpu:
                 command.append("--cpu")
+            os.makedirs(self.log_dir, exist_ok=True)
             self.server_process = subprocess.Popen(
                 command,
+                cwd=self.log_dir,
                 **kwargs,
             )
 
             # waiting for server to start accepting requests
             start_at = time.time()
-            while not self.is_server_running():
+            while not self.comfy_api.health_check(timeout=2):
                 if self.server_process.poll() is not None:
                     raise Exception("ComfyUI process exited during startup")
-                if time.time() - start_at > 120:
-                    raise Exception("ComfyUI startup timeout (>120s)")
+                if time.time() - start_at > self.startup_timeout:
+                    raise Exception(f"ComfyUI startup timeout (>{self.startup_timeout}s)")
                 time.sleep(0.5)
 
             app_logger.log(LoggingType.DEBUG, "comfy server is running")
         else:
-            try:
-                if not self.comfy_api.health_check():
-                    raise Exception(f"Port {APP_PORT} blocked")
-                else:
-                    app_logger.log(LoggingType.DEBUG, "Server already running")
-            except Exception as e:
-                raise Exception(f"Port {APP_PORT} blocked")
+            if not self.comfy_api.health_check():
+                raise Exception(f"Port {self.port} blocked")
+            app_logger.log(LoggingType.DEBUG, "Server already running")
 
     def stop_server(self):
-        pid = find_process_by_port(APP_PORT)
+        process = self.server_process
+        self.server_process = None
+        if process is not None:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            return
+
+        pid = find_process_by_port(self.port)
         if pid:
             process = psutil.Process(pid)
             process.terminate()
             process.wait()
 
     def clear_comfy_logs(self):
-        log_file_list = glob.glob("comfyui*.log")
+        log_file_list = glob.glob(os.path.join(self.log_dir, "comfyui*.log"))
         for file in log_file_list:
             if os.path.exists(file):
                 os.remove(file)
 
-    def get_output(self, ws, prompt, client_id, output_node_ids):
-        prompt_id = self.comfy_api.queue_prompt(prompt, client_id)["prompt_id"]
-
-        # waiting for the execution to finish
-        while True:
-            out = ws.recv()
-            if isinstance(out, str):
-                message = json.loads(out)
-                if message["type"] == "executing":
-                    data = message["data"]
-                    if data["node"] is None and data["prompt_id"] == prompt_id:
-                        break  # Execution is done
+    def get_output(
+        self,
+        ws,
+        prompt,
+        client_id,
+        output_node_ids,
+        progress_callback=None,
+        recv_timeout=30,
+        execution_timeout=None,
+        history_poll_interval=3,
+    ):
+        """
+        progress_callback:      called with a progress dict on every progress/executing/execution_cached event
+        recv_timeout:           max wait for a single ws message; on timeout the history is polled instead
+        execution_timeout:      overall limit for the prompt (None: no limit)
+        history_poll_interval:  poll gap once the websocket is gone
+        """
+        return self.get_outputs(
+            ws,
+            [prompt],
+            client_id,
+            [output_node_ids],
+            progress_callback=progress_callback,
+            recv_timeout=recv_timeout,
+            execution_timeout=execution_timeout,
+            history_poll_interval=history_poll_interval,
+            raise_errors=True,
+        )[0]
+
+    def get_outputs(
+        self,
+        ws,
+        prompts,
+        client_id,
+        output_node_ids_list=None,
+        progress_callback=None,
+        recv_timeout=30,
+        execution_timeout=None,
+        history_poll_interval=3,
+        on_complete=None,
+        raise_errors=False,
+        on_queued=None,
+    ):
+        """
+        Queues every prompt up front (so ComfyUI runs them back to back) and waits for all of them
+        on one websocket, routing messages by prompt_id. Returns one entry per prompt: the outputs
+        (see _history_outputs) or {"error", "error_type"} when that prompt failed.
+
+        on_complete:    fn(index, entry) called as soon as each prompt finishes
+        on_queued:      fn(index, comfy_prompt_id) called once each prompt is queued (see cancel_prompt)
+        raise_errors:   raise a prompt's execution error instead of returning it
+        execution_timeout applies to the whole batch.
+        """
+        output_node_ids_list = output_node_ids_list or [None] * len(prompts)
+        states = {}
+        for index, prompt in enumerate(prompts):
+            prompt_id = self.comfy_api.queue_prompt(prompt, client_id)["prompt_id"]
+            if on_queued:
+                on_queued(index, prompt_id)
+            states[prompt_id] = {
+                "index": index,
+                "prompt": prompt,
+                "nodes_done": set(),
+                "node": None,
+                "value": 0,
+                "max": 0,
+            }
+        results = [None] * len(prompts)
+        pending = set(states)
+        running = [None]  # prompt executing right now (old ComfyUI omits prompt_id on progress)
+        deadline = time.monotonic() + execution_timeout if execution_timeout else None
+
+        def report(prompt_id, event):
+            if not progress_callback:
+                return
+            state = states[prompt_id]
+            nodes_total = max(1, len(state["prompt"]))
+            node_fraction = state["value"] / state["max"] if state["max"] else 0
+            done = len(state["nodes_done"])
+            try:
+                progress_callback(
+                    {
+                        "event": event,
+                        "prompt_id": prompt_id,
+                        "index": state["index"],
+                        "node": state["node"],
+                        "node_class": (state["prompt"].get(str(state["node"])) or {}).get("class_type")
+                        if state["node"] is not None
+                        else None,
+                        "value": state["value"],
+                        "max": state["max"],
+                        "nodes_done": done,
+                        "nodes_total": nodes_total,
+                        "fraction": min(1.0, (done + node_fraction) / nodes_total),
+                    }
+                )
+            except Exception as e:
+                app_logger.log(LoggingType.DEBUG, f"progress callback failed: {e}")
+
+        def finish(prompt_id, error=None):
+            pending.discard(prompt_id)
+            self.cancelled_prompts.discard(prompt_id)
+            if running[0] == prompt_id:
+                running[0] = None
+            state = states[prompt_id]
+            if error is not None:
+                if raise_errors:
+                    raise error
+                entry = {"error": str(error), "error_type": type(error).__name__}
             else:
+                state["nodes_done"].update(state["prompt"].keys())
+                state.update(node=None, value=0, max=0)
+                report(prompt_id, "executed")
+                entry = self._history_outputs(prompt_id, output_node_ids_list[state["index"]])
+            results[state["index"]] = entry
+            if on_complete:
+                on_complete(state["index"], entry)
+
+        def check_deadline():
+            # only our own prompts are stopped; other clients may share this server's queue
+            if deadline and time.monotonic() > deadline:
+                for prompt_id in list(pending):
+                    self.cancel_prompt(prompt_id)
+                raise TimeoutError(f"prompt(s) {sorted(pending)} exceeded {execution_timeout}s")
+            if self.server_exited():
+                raise RuntimeError(f"ComfyUI server on port {self.port} exited while running {sorted(pending)}")
+            if self.gen_status_tracker.is_generation_cancelled(client_id):
+                for prompt_id in list(pending):
+                    self.cancel_prompt(prompt_id)
+                raise RuntimeError(f"generation {client_id} cancelled")
+            for prompt_id in pending & self.cancelled_prompts:
+                # a dequeued prompt sends no message, so it is finished here
+                self.cancelled_prompts.discard(prompt_id)
+                finish(prompt_id, RuntimeError(f"prompt {prompt_id} cancelled"))
+
+        def poll_history():
+            for prompt_id in list(pending):
+                try:
+                    history = self.comfy_api.get_history(prompt_id) or {}
+                except Exception as e:
+                    app_logger.log(LoggingType.DEBUG, f"history poll failed: {e}")
+                    return
+                entry = history.get(prompt_id)
+                if not entry:
+                    continue
+                status = entry.get("status") or {}
+                if status.get("status_str") == "error":
+                    finish(prompt_id, RuntimeError(f"ComfyUI execution failed for prompt {prompt_id}"))
+                elif status.get("completed", True):
+                    finish(prompt_id)
+
+        ws_alive = True
+        ws.settimeout(recv_timeout)
+        # waiting for the executions to finish
+        while pending:
+            check_deadline()
+            if not ws_alive:
+                poll_history()
+                if pending:
+                    time.sleep(history_poll_interval)
+                continue
+
+            try:
+                out = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                # quiet ws: a long node, or a final message was missed
+                poll_history()
+                continue
+            except (websocket.WebSocketConnectionClosedException, OSError) as e:
+                app_logger.log(LoggingType.DEBUG, f"ws lost ({e}), polling history instead")
+                ws_alive = False
+                continue
+
+            if not isinstance(out, str):
                 continue  # previews are binary data
+            message = json.loads(out)
+            data = message.get("data") or {}
+            prompt_id = data.get("prompt_id") or running[0]
+            if prompt_id not in pending:
+                continue
+            state = states[prompt_id]
+
+            msg_type = message.get("type")
+            if msg_type == "execution_start":
+                running[0] = prompt_id
+            elif msg_type == "executing":
+                running[0] = prompt_id
+                if state["node"] is not None:
+                    state["nodes_done"].add(state["node"])
+                if data.get("node") is None:
+                    if data.get("prompt_id") == prompt_id:
+                        finish(prompt_id)  # Execution is done
+                    continue
+                state.update(node=data["node"], value=0, max=0)
+                report(prompt_id, "executing")
+            elif msg_type == "execution_cached":
+                state["nodes_done"].update(str(n) for n in data.get("nodes") or [])
+                report(prompt_id, "execution_cached")
+            elif msg_type == "progress":
+                state.update(
+                    node=data.get("node", state["node"]),
+                    value=data.get("value", 0),
+                    max=data.get("max", 0),
+                )
+                report(prompt_id, "progress")
+            elif msg_type == "execution_error":
+                finish(
+                    prompt_id,
+                    RuntimeError(
+                        f"ComfyUI node {data.get('node_id')} ({data.get('node_type')}) failed: "
+                        f"{data.get('exception_message', '').strip()}"
+                    ),
+                )
+            elif msg_type == "execution_interrupted":
+                finish(prompt_id, RuntimeError(f"ComfyUI execution interrupted for prompt {prompt_id}"))
+
+        return results
 
+    def _history_outputs(self, prompt_id, output_node_ids):
         # fetching results
         history = self.comfy_api.get_history(prompt_id)[prompt_id]
-        output_list = {"file_list": [], "text_output": []}
+        # files: requested outputs, other_files: outputs of the remaining nodes (removed by predict)
+        output_list = {"file_list": [], "files": [], "other_files": [], "text_output": []}
         output_node_ids = [str(id) for id in output_node_ids] if output_node_ids else []
-        for node_id in history["outputs"]:
-            if (
-                output_node_ids and len(output_node_ids) and node_id in output_node_ids
-            ) or not output_node_ids:
-                node_output = history["outputs"][node_id]
-                # Keep text outputs for callers that need structured textual data.
-                if "text" in node_output and isinstance(node_output["text"], list):
-                    for txt in node_output["text"]:
-                        output_list["text_output"].append(txt)
-
-                # Collect any output list that contains {filename: "..."}.
-                # This covers images/gifs/audio/video and custom node outputs.
-                for _, value in node_output.items():
-                    if not isinstance(value, list):
+        for node_id, node_output in history["outputs"].items():
+            wanted = not output_node_ids or node_id in output_node_ids
+            # Keep text outputs for callers that need structured textual data.
+            if wanted and "text" in node_output and isinstance(node_output["text"], list):
+                for txt in node_output["text"]:
+                    output_list["text_output"].append(txt)
+
+            # Collect any output list that contains {filename, subfolder, type}.
+            # This covers images/gifs/audio/video and custom node outputs.
+            for group, value in node_output.items():
+                if not isinstance(value, list):
+                    continue
+                for item in value:
+                    if not (isinstance(item, dict) and item.get("filename")):
                         continue
-                    for item in value:
-                        if isinstance(item, dict) and item.get("filename"):
-                            output_list["file_list"].append(item["filename"])
+                    file = {
+                        "node_id": node_id,
+                        "group": group,
+                        "filename": item["filename"],
+                        "subfolder": item.get("subfolder") or "",
+                        "type": item.get("type") or "output",
+                    }
+                    if wanted:
+                        output_list["files"].append(file)
+                        output_list["file_list"].append(item["filename"])
+                    else:
+                        output_list["other_files"].append(file)
 
         return output_list
 
+    def _collect_outputs(self, node_output, output_folder):
+        """Move a prompt's requested outputs into output_folder and drop the rest."""
+        # outputs are located from the history metadata (subfolder/type) and renamed
+        # into output_folder; no directory scans or copies on the same filesystem
+        output_folder = os.path.abspath(output_folder)
+        file_paths, files = [], []
+        for idx, file in enumerate(node_output["files"]):
+            src_path = self._output_source_path(file)
+            # some intermediary temp files are deleted at this point
+            if not src_path or not os.path.isfile(src_path):
+                continue
+            dest_path = os.path.join(output_folder, file["filename"])
+            if dest_path in file_paths:
+                dest_path = os.path.join(output_folder, f"{file['node_id']}_{idx}_{file['filename']}")
+            move_file(src_path, dest_path)
+            file_paths.append(dest_path)
+            files.append({**file, "path": dest_path})
+
+        # outputs of nodes that weren't requested would otherwise pile up in the workspace
+        for file in node_output["other_files"]:
+            src_path = self._output_source_path(file)
+            if src_path and os.path.isfile(src_path):
+                os.remove(src_path)
+
+        app_logger.log(
+            LoggingType.DEBUG, f"output file list len: {len(file_paths)}"
+        )
+        return {
+            "file_paths": file_paths,
+            "files": files,
+            "text_output": node_output["text_output"],
+        }
+
+    def _connect_ws(self, client_id, timeout):
+        ws = websocket.WebSocket()
+        host = self.server_addr + ":" + str(self.port)
+        host = host.replace("http://", "").replace("https://", "")
+        ws.connect("ws://{}/ws?clientId={}".format(host, client_id), timeout=timeout)
+        return ws
+
+    def _output_source_path(self, file):
+        """Absolute path of a saved history output; None for temp previews, inputs or unsafe names."""
+        if file["type"] != "output":
+            return None
+        base = os.path.abspath(self.output_dir)
+        path = os.path.abspath(os.path.join(base, file["subfolder"], file["filename"]))
+        if not path.startswith(base + os.sep):
+            return None
+        return path
+
     def filter_missing_node(self, workflow):
         mappings = self.comfy_api.get_node_mapping_list()
         custom_node_list = self.comfy_api.get_all_custom_node_list()
@@ -269,26 +598,53 @@ class ComfyRunner:
             else:
                 app_logger.log(LoggingType.DEBUG, f"Ignoring model {m['filename']}")
 
+        # each destination is downloaded once: a model named twice, or listed both in the
+        # catalog and in extra_models_list, would otherwise race on the same .part file
         m_l = []
+        dest_paths = set()
+        model_index = get_model_index(os.path.join(COMFY_MODELS_BASE_PATH, "models"))
         for model in models_to_download:
             _, model = os.path.split(model)
-            _, _, base_path = self.model_downloader.get_model_details(model)
-            base_path = os.path.basename(base_path) if base_path else None
-            if not search_file(
-                model,
-                COMFY_MODELS_BASE_PATH,
-                parent_folder=base_path,
-            ):
+            if model in m_l:
+                continue
+            filename, _, base_path = self.model_downloader.get_model_details(model)
+            if not model_index.exists(model, parent_folder=os.path.basename(base_path) if base_path else None):
                 m_l.append(model)
+                if filename and base_path:
+                    dest_paths.add(os.path.abspath(os.path.join(base_path, filename)))
         models_to_download = m_l
 
-        for model in models_to_download:
+        extra_to_download = []
+        for model in extra_models_list:
+            dest_path = os.path.abspath(os.path.join(model["dest"], model["filename"]))
+            if dest_path not in dest_paths:
+                dest_paths.add(dest_path)
+                extra_to_download.append(model)
+
+        def download_catalog_model(model):
             if self.gen_status_tracker.is_generation_cancelled(client_id):
-                break
+                return None
+            return self.model_downloader.download_model(model)
 
-            status, similar_models, file_status = self.model_downloader.download_model(
-                model
+        def download_extra_model(model):
+            if self.gen_status_tracker.is_generation_cancelled(client_id):
+                return None
+            return self.model_downloader.download_file(
+                model["filename"],
+                model["url"],
+                model["dest"],
+                sha256=model.get("sha256"),
             )
+
+        # several models are fetched at once, each over multiple range connections
+        with ThreadPoolExecutor(max_workers=max(1, DOWNLOAD_CONCURRENCY)) as executor:
+            catalog_results = list(executor.map(download_catalog_model, models_to_download))
+            extra_results = list(executor.map(download_extra_model, extra_to_download))
+
+        for model, result in zip(models_to_download, catalog_results):
+            if result is None:
+                continue
+            status, similar_models, file_status = result
             if not status:
                 models_not_found.append(
                     {
@@ -300,29 +656,25 @@ class ComfyRunner:
                 models_downloaded = True
 
         # downloading extra models
-        for model in extra_models_list:
-            if self.gen_status_tracker.is_generation_cancelled(client_id):
-                break
-
-            status, file_status = self.model_downloader.download_file(
-                model["filename"],
-                model["url"],
-                model["dest"],
-            )
-
+        for model, result in zip(extra_to_download, extra_results):
+            if result is None:
+                continue
+            status, file_status = result
             if status:
-                models_downloaded = (
-                    True if file_status == FileStatus.NEW_DOWNLOAD.value else False
-                )
+                models_downloaded = models_downloaded or file_status == FileStatus.NEW_DOWNLOAD.value
                 for m in models_not_found:
                     if m["model"] == model["filename"]:
                         models_not_found.remove(m)
                         break
 
+        if models_downloaded:
+            model_index.refresh(force=True)  # pick up the files downloaded above
         # checking if models_not_found are already inside comfy
-        for model in models_not_found:
-            if search_file(model["model"].split("/")[-1], COMFY_BASE_PATH):
-                models_not_found.remove(model)
+        models_not_found = [
+            model
+            for model in models_not_found
+            if not model_index.exists(model["model"].split("/")[-1])
+        ]
 
         return {
             "data": {
@@ -418,22 +770,28 @@ class ComfyRunner:
                         LoggingType.ERROR, "Failed to install custom node ", n["title"]
                     )
 
-            custom_node_installer = get_node_installer()
-            for n in nodes_to_install_with_commit_hash:
-                if self.gen_status_tracker.is_generation_cancelled(client_id):
-                    break
-
-                app_logger.log(LoggingType.DEBUG, f"Installing {n['title']}")
+            if nodes_to_install_with_commit_hash and not self.gen_status_tracker.is_generation_cancelled(client_id):
+                custom_node_installer = get_node_installer()
+                custom_node_installer.progress_callback = lambda event: app_logger.log(
+                    LoggingType.DEBUG, f"custom node install progress: {event}"
+                )
                 nodes_installed = True
-                json_data = {
-                    "files": [n["url"]],
-                    "install_type": "git-clone",
-                    "commit_hash": [n["commit_hash"]],
-                }
-                status = custom_node_installer.install_node(json_data)
+                # fetched in parallel, requirements resolved in one pip run
+                status = custom_node_installer.install_nodes(
+                    [
+                        {
+                            "files": [n["url"]],
+                            "install_type": "git-clone",
+                            "commit_hash": [n["commit_hash"]],
+                        }
+                        for n in nodes_to_install_with_commit_hash
+                    ]
+                )
                 if not status:
                     app_logger.log(
-                        LoggingType.ERROR, "Failed to install custom node ", n["title"]
+                        LoggingType.ERROR,
+                        "Failed to install custom node(s) ",
+                        ", ".join(n.get("title") or n["url"] for n in nodes_to_install_with_commit_hash),
                     )
 
         return {
@@ -458,7 +816,7 @@ class ComfyRunner:
 
     def stop_current_generation(self, client_id=None, retry_window=3):
         """
-        CAUTION: This stops any running generation on active comfyui APP_PORT (default 8188)
+        CAUTION: This stops any running generation on this runner's comfyui port
         client_id: tag used to identify generations
         retry_window: the amount of time (in secs) it will try to find the process (as it takes a while for comfy to start the generation)
         """
@@ -499,6 +857,23 @@ class ComfyRunner:
         app_logger.log(LoggingType.INFO, "Generation marked as cancelled")
         return True
 
+    def cancel_prompt(self, prompt_id):
+        """
+        Stops one ComfyUI prompt: removed from the queue if still pending, interrupted if running.
+        Other prompts on this server (other users, other batch entries) keep going.
+        """
+        self.cancelled_prompts.add(prompt_id)
+        try:
+            queue = self.comfy_api.get_queue() or {}
+            if any(item[1] == prompt_id for item in queue.get("queue_pending", [])):
+                self.comfy_api.delete_queued([prompt_id])
+            elif any(item[1] == prompt_id for item in queue.get("queue_running", [])):
+                self.comfy_api.interrupt_prompt(prompt_id)
+        except Exception as e:
+            app_logger.log(LoggingType.DEBUG, f"Error cancelling prompt {prompt_id}: {e}")
+            return False
+        return True
+
     def get_queue_items(self):
         connection_attempts = 12
         for i in range(connection_attempts):
@@ -552,94 +927,166 @@ class ComfyRunner:
         else:
             return copy_files(source, dest_path, overwrite=True, filename=filename)
 
-    def predict(
+    def _preflight_key(self, workflow, extra_models_list, extra_node_urls, ignore_model_list):
+        return self.preflight_cache.make_key(
+            workflow,
+            COMFY_BASE_PATH,
+            extra={
+                "extra_models": extra_models_list,
+                "extra_nodes": extra_node_urls,
+                "ignore_models": ignore_model_list,
+                "models_base_path": COMFY_MODELS_BASE_PATH,
+            },
+        )
+
+    def _resolve_model_paths(self, workflow):
+        """
+        returns ({node_id: {input_name: model path relative to its models/ folder}}, [absolute model paths])
+        """
+        model_rewrites = {}
+        model_paths = []
+        # checkpoints, lora, default etc..
+        comfy_directory = COMFY_MODELS_BASE_PATH + "models/"
+        # same index as download_models, which refreshes it after downloading
+        model_index = get_model_index(comfy_directory)
+        comfy_model_folders = [
+            folder
+            for folder in os.listdir(comfy_directory)
+            if os.path.isdir(os.path.join(comfy_directory, folder))
+        ]
+        for node in workflow:
+            if "inputs" in workflow[node]:
+                for key, input in workflow[node]["inputs"].items():
+                    if (
+                        isinstance(input, str)
+                        and any(input.endswith(ft) for ft in MODEL_FILETYPES)
+                        and not any(input.endswith(m) for m in OPTIONAL_MODELS)
+                    ):
+                        base = None
+                        # if os.path.sep in input:
+                        base, input = os.path.split(input)
+                        model_path_list = model_index.find(input)
+                        if len(model_path_list):
+                            print(model_path_list)
+                            # selecting the model_path which has the base, if neither has the base then selecting the first one or the one in the 'checkpoints' folder
+                            model_path = next(
+                                (
+                                    path
+                                    for path in model_path_list
+                                    if "checkpoints" in path
+                                ),
+                                model_path_list[0],
+                            )  # preferring the "checkpoints" folder
+                            if base:
+                                matching_text_seq = (
+                                    ["SD1.5"]
+                                    if base in ["SD1.5", "SD1.x"]
+                                    else ["SDXL"]
+                                )
+                                for txt in matching_text_seq:
+                                    for p in model_path_list:
+                                        if txt in p:
+                                            model_path = p
+                                            break
+
+                            model_paths.append(os.path.abspath(model_path))
+                            model_path = model_path.replace(comfy_directory, "")
+                            if any(
+                                model_path.startswith(folder)
+                                for folder in comfy_model_folders
+                            ):
+                                model_path = model_path.split(os.path.sep, 1)[-1]
+                            app_logger.log(
+                                LoggingType.DEBUG,
+                                f"Updating {input} to {model_path}",
+                            )
+                            model_rewrites.setdefault(node, {})[key] = model_path
+
+        return model_rewrites, model_paths
+
+    def _prepare_workflow(
         self,
         workflow_input,
-        file_path_list=[],
-        extra_models_list=[],
-        extra_node_urls=[],  # [{'url': github_url, 'commit_hash': xyz},...]
-        stop_server_after_completion=False,
-        clear_comfy_logs=True,
-        output_folder="./output",
-        output_node_ids=None,
-        ignore_model_list=[],
-        client_id=None,
-        comfy_commit_hash=None,
-        strict_dep_list=None,  # {numpy: 1.24.4, ...}
-        checkpointing_data=None,  # { "network_data" : {"type": "Salad", "organisation": "xyz", "api-key": "xyz"}}
+        file_path_list,
+        extra_models_list,
+        extra_node_urls,
+        ignore_model_list,
+        client_id,
+        comfy_commit_hash,
+        strict_dep_list,
+        checkpointing_data,
+        use_preflight_cache,
     ):
         """
-        workflow_input:                 API json of the workflow. Can be a filepath or str
-        file_path_list:                 files to copy inside the '/input' folder which are being used in the workflow
-        extra_models_list:              extra models to be downloaded
-        extra_node_urls:                extra nodes to be downloaded (with the option to specify commit version)
-        stop_server_after_completion:   stop server as soon as inference completes (or fails)
-        clear_comfy_logs:               clears the temp comfy logs after every inference
-        output_folder:                  for storing inference output
-        output_node_ids:                nodes to look in for the output
-        ignore_model_list:              these models won't be downloaded (in cases where these are manually placed)
-        client_id:                      this can be used as a tag for the generations
-        comfy_commit_hash:              specific comfy commit to checkout
-        strict_dep_list:                list of pkgs and their versions that can't be overrided by new nodes installation
-        checkpointing_data:             config to enable sampler latent checkpointing
+        Everything predict() does before queueing: ComfyUI/Manager checkout, requirements, server
+        start, checkpointing, custom nodes, models, input files and model path rewrites.
+        Returns the API workflow ready to queue, or None when the run can't go ahead.
         """
-        output_list = {}
-        try:
-            # TODO: add support for image and normal json files
-            client_id = client_id or str(uuid.uuid4())
-            workflow = self.load_workflow(workflow_input)
-            if not workflow:
-                app_logger.log(LoggingType.ERROR, "Invalid workflow file")
-                return
-
-            # cloning comfy repo
-            comfy_repo_url = "https://github.com/comfyanonymous/ComfyUI"
-            comfy_manager_url = "https://github.com/ltdrdata/ComfyUI-Manager"
-            if not os.path.exists(COMFY_BASE_PATH):
-                app_logger.log(LoggingType.DEBUG, "cloning comfy repo")
-                comfy_repo = Repo.clone_from(comfy_repo_url, COMFY_BASE_PATH)
-
-            if comfy_commit_hash is not None:
-                try:
-                    comfy_repo = Repo(COMFY_BASE_PATH)
-                    current_hash = comfy_repo.rev_parse("HEAD")
-
-                    if str(current_hash) == comfy_commit_hash:
-                        # app_logger.log(
-                        #     LoggingType.DEBUG,
-                        #     "ComfyUI already at specified commit hash",
-                        # )
-                        pass
-                    else:
-                        app_logger.log(
-                            LoggingType.DEBUG,
-                            f"Attempting to move ComfyUI to commit {comfy_commit_hash}",
-                        )
-                        comfy_repo.remotes.origin.fetch()
-                        comfy_repo.git.checkout(comfy_commit_hash)
-                        app_logger.log(
-                            LoggingType.DEBUG,
-                            f"Successfully moved ComfyUI to commit {comfy_commit_hash}",
-                        )
-                except Exception as e:
+        # the checkpointing node may be installed on the fly, which needs the full preflight
+        use_preflight_cache = use_preflight_cache and not checkpointing_data
+        workflow = self.load_workflow(workflow_input)
+        if not workflow:
+            app_logger.log(LoggingType.ERROR, "Invalid workflow file")
+            return None
+
+        # cloning comfy repo
+        comfy_repo_url = "https://github.com/comfyanonymous/ComfyUI"
+        comfy_manager_url = "https://github.com/ltdrdata/ComfyUI-Manager"
+        if not os.path.exists(COMFY_BASE_PATH):
+            app_logger.log(LoggingType.DEBUG, "cloning comfy repo")
+            comfy_repo = Repo.clone_from(comfy_repo_url, COMFY_BASE_PATH)
+
+        if comfy_commit_hash is not None:
+            try:
+                comfy_repo = Repo(COMFY_BASE_PATH)
+                current_hash = comfy_repo.rev_parse("HEAD")
+
+                if str(current_hash) == comfy_commit_hash:
+                    # app_logger.log(
+                    #     LoggingType.DEBUG,
+                    #     "ComfyUI already at specified commit hash",
+                    # )
+                    pass
+                else:
+                    app_logger.log(
+                        LoggingType.DEBUG,
+                        f"Attempting to move ComfyUI to commit {comfy_commit_hash}",
+                    )
+                    comfy_repo.remotes.origin.fetch()
+                    comfy_repo.git.checkout(comfy_commit_hash)
                     app_logger.log(
-                        LoggingType.ERROR, f"Unable to checkout ComfyUI: {str(e)}"
+                        LoggingType.DEBUG,
+                        f"Successfully moved ComfyUI to commit {comfy_commit_hash}",
                     )
-                    return None
-
-            comfy_custom_nodes = os.path.join(COMFY_BASE_PATH, "custom_nodes")
-            if not os.path.exists(os.path.join(comfy_custom_nodes, "ComfyUI-Manager")):
-                custom_manager_hash = None
-                for n in extra_node_urls:
-                    if n["title"] == "ComfyUI-Mananger":
-                        custom_manager_hash = n["commit_hash"]
-                current_dir = os.getcwd()
-                os.chdir(comfy_custom_nodes)
-                manager_repo = Repo.clone_from(comfy_manager_url, "ComfyUI-Manager")
-                if custom_manager_hash:
-                    manager_repo.git.checkout(custom_manager_hash)
-                os.chdir(current_dir)
+            except Exception as e:
+                app_logger.log(
+                    LoggingType.ERROR, f"Unable to checkout ComfyUI: {str(e)}"
+                )
+                return None
 
+        comfy_custom_nodes = os.path.join(COMFY_BASE_PATH, "custom_nodes")
+        if not os.path.exists(os.path.join(comfy_custom_nodes, "ComfyUI-Manager")):
+            custom_manager_hash = None
+            for n in extra_node_urls:
+                if n["title"] == "ComfyUI-Mananger":
+                    custom_manager_hash = n["commit_hash"]
+            manager_repo = Repo.clone_from(
+                comfy_manager_url, os.path.join(comfy_custom_nodes, "ComfyUI-Manager")
+            )
+            if custom_manager_hash:
+                manager_repo.git.checkout(custom_manager_hash)
+
+        preflight_key = None
+        preflight = None
+        if use_preflight_cache:
+            preflight_key = self._preflight_key(
+                workflow, extra_models_list, extra_node_urls, ignore_model_list
+            )
+            preflight = self.preflight_cache.get(preflight_key)
+            if preflight:
+                app_logger.log(LoggingType.DEBUG, "Preflight cache hit, skipping checks")
+
+        if preflight is None:
             # installing requirements
             app_logger.log(
                 LoggingType.DEBUG,
@@ -657,47 +1104,49 @@ class ComfyRunner:
                     check=True,
                 )
 
-            # clearing the previous logs
-            if not self.is_server_running():
-                self.clear_comfy_logs()
-
-            # start the comfy server if not already running
-            self.start_server()
+        # clearing the previous logs
+        if not self.is_server_running():
+            self.clear_comfy_logs()
 
-            # enabling checkpointing
-            checkpoint_node_added = False
-            checkpoint_node_path = os.path.join(
-                COMFY_BASE_PATH, "custom_nodes", "comfy-checkpointing"
-            )
-            checkpoint_config_path = os.path.join(checkpoint_node_path, "config.toml")
-            if checkpointing_data:
-                status = True
-                if not os.path.exists(checkpoint_node_path):
-                    custom_node_installer = get_node_installer()
-                    json_data = {
-                        "files": ["https://github.com/piyushK52/comfy-checkpointing"],
-                        "install_type": "git-clone",
-                    }
-                    status = custom_node_installer.install_node(json_data)
-                    checkpoint_node_added = status
+        # start the comfy server if not already running
+        self.start_server()
 
-                if not status:
-                    app_logger.log(
-                        LoggingType.ERROR, "Unable to enable checkpoint node"
-                    )
-                else:
-                    if not os.path.exists(checkpoint_config_path):
-                        with open(checkpoint_config_path, "w") as config_file:
-                            toml.dump({}, config_file)
+        # enabling checkpointing
+        checkpoint_node_added = False
+        checkpoint_node_path = os.path.join(
+            COMFY_BASE_PATH, "custom_nodes", "comfy-checkpointing"
+        )
+        checkpoint_config_path = os.path.join(checkpoint_node_path, "config.toml")
+        if checkpointing_data:
+            status = True
+            if not os.path.exists(checkpoint_node_path):
+                custom_node_installer = get_node_installer()
+                json_data = {
+                    "files": ["https://github.com/piyushK52/comfy-checkpointing"],
+                    "install_type": "git-clone",
+                }
+                status = custom_node_installer.install_node(json_data)
+                checkpoint_node_added = status
 
-                    update_toml_config(checkpoint_config_path, checkpointing_data)
-                    app_logger.log(LoggingType.INFO, "Checkpointing enabled")
+            if not status:
+                app_logger.log(
+                    LoggingType.ERROR, "Unable to enable checkpoint node"
+                )
             else:
-                if os.path.exists(checkpoint_node_path) and os.path.exists(
-                    checkpoint_config_path
-                ):
-                    update_toml_config(checkpoint_config_path, {})
+                if not os.path.exists(checkpoint_config_path):
+                    with open(checkpoint_config_path, "w") as config_file:
+                        toml.dump({}, config_file)
+
+                update_toml_config(checkpoint_config_path, checkpointing_data)
+                app_logger.log(LoggingType.INFO, "Checkpointing enabled")
+        else:
+            if os.path.exists(checkpoint_node_path) and os.path.exists(
+                checkpoint_config_path
+            ):
+                update_toml_config(checkpoint_config_path, {})
 
+        nodes_installed = False
+        if preflight is None:
             # download custom nodes
             res_custom_nodes = self.download_custom_nodes(
                 workflow,
@@ -706,7 +1155,7 @@ class ComfyRunner:
             )
             if not res_custom_nodes["status"]:
                 app_logger.log(LoggingType.ERROR, res_custom_nodes["message"])
-                return
+                return None
 
             # download models if not already present
             res_models = self.download_models(
@@ -733,7 +1182,9 @@ class ComfyRunner:
                         else:
                             print(" - None")
                         print("---------------------------")
-                return
+                return None
+
+            nodes_installed = res_custom_nodes["data"]["nodes_installed"]
 
             # restart the server if custom nodes or models are installed
             # also check for the strict dependencies (strict_dep_list)
@@ -764,90 +1215,112 @@ class ComfyRunner:
                 self.stop_server()
                 self.start_server()
 
-            if len(file_path_list):
-                task_list = []
-                comfy_input_dir = os.path.join(COMFY_BASE_PATH, "input")
-                os.makedirs(comfy_input_dir, exist_ok=True)
-                clear_directory(comfy_input_dir)
-                for filepath in file_path_list:
-                    if isinstance(filepath, str):
-                        source, dest_path = filepath, comfy_input_dir
-                        filename = None
-                    else:
-                        source, dest_path = (
-                            filepath["filepath"],
-                            os.path.join(comfy_input_dir, filepath["dest_folder"]),
-                        )
-                        filename = filepath.get("filename", None)
+        if len(file_path_list):
+            task_list = []
+            comfy_input_dir = self.input_dir
+            os.makedirs(comfy_input_dir, exist_ok=True)
+            clear_directory(comfy_input_dir)
+            for filepath in file_path_list:
+                if isinstance(filepath, str):
+                    source, dest_path = filepath, comfy_input_dir
+                    filename = None
+                else:
+                    source, dest_path = (
+                        filepath["filepath"],
+                        os.path.join(comfy_input_dir, filepath["dest_folder"]),
+                    )
+                    filename = filepath.get("filename", None)
 
-                    task_list.append((source, dest_path, filename))
+                task_list.append((source, dest_path, filename))
 
-                with ThreadPoolExecutor(max_workers=5) as executor:
-                    futures = [
-                        executor.submit(self.process_file, task) for task in task_list
-                    ]
-                    for future in as_completed(futures):
-                        try:
-                            future.result()
-                        except Exception as exc:
-                            print(f"An error occurred: {exc}")
-
-            # checkpoints, lora, default etc..
-            comfy_directory = COMFY_MODELS_BASE_PATH + "models/"
-            comfy_model_folders = [
-                folder
-                for folder in os.listdir(comfy_directory)
-                if os.path.isdir(os.path.join(comfy_directory, folder))
-            ]
-            # update model paths e.g. 'v3_sd15_sparsectrl_rgb.ckpt' --> 'SD1.5/animatediff/v3_sd15_sparsectrl_rgb.ckpt'
-            for node in workflow:
-                if "inputs" in workflow[node]:
-                    for key, input in workflow[node]["inputs"].items():
-                        if (
-                            isinstance(input, str)
-                            and any(input.endswith(ft) for ft in MODEL_FILETYPES)
-                            and not any(input.endswith(m) for m in OPTIONAL_MODELS)
-                        ):
-                            base = None
-                            # if os.path.sep in input:
-                            base, input = os.path.split(input)
-                            model_path_list = find_file_in_directory(
-                                comfy_directory, input
-                            )
-                            if len(model_path_list):
-                                print(model_path_list)
-                                # selecting the model_path which has the base, if neither has the base then selecting the first one or the one in the 'checkpoints' folder
-                                model_path = next(
-                                    (
-                                        path
-                                        for path in model_path_list
-                                        if "checkpoints" in path
-                                    ),
-                                    model_path_list[0],
-                                )  # preferring the "checkpoints" folder
-                                if base:
-                                    matching_text_seq = (
-                                        ["SD1.5"]
-                                        if base in ["SD1.5", "SD1.x"]
-                                        else ["SDXL"]
-                                    )
-                                    for txt in matching_text_seq:
-                                        for p in model_path_list:
-                                            if txt in p:
-                                                model_path = p
-                                                break
-
-                                model_path = model_path.replace(comfy_directory, "")
-                                if any(
-                                    model_path.startswith(folder)
-                                    for folder in comfy_model_folders
-                                ):
-                                    model_path = model_path.split(os.path.sep, 1)[-1]
-                                app_logger.log(
-                                    LoggingType.DEBUG,
-                                    f"Updating {input} to {model_path}",
-                                )
-                                workflow[node]["inputs"][key] = model_path
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                futures = [
+                    executor.submit(self.process_file, task) for task in task_list
+                ]
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        print(f"An error occurred: {exc}")
+
+        # update model paths e.g. 'v3_sd15_sparsectrl_rgb.ckpt' --> 'SD1.5/animatediff/v3_sd15_sparsectrl_rgb.ckpt'
+        if preflight is not None:
+            model_rewrites = preflight["model_rewrites"]
+        else:
+            model_rewrites, model_paths = self._resolve_model_paths(workflow)
+            if use_preflight_cache:
+                if nodes_installed:
+                    # custom_nodes changed during this run, key the entry on the new state
+                    preflight_key = self._preflight_key(
+                        workflow, extra_models_list, extra_node_urls, ignore_model_list
+                    )
+                self.preflight_cache.put(preflight_key, model_rewrites, model_paths)
+        for node, rewrites in model_rewrites.items():
+            if node in workflow and "inputs" in workflow[node]:
+                workflow[node]["inputs"].update(rewrites)
+
+        return workflow
+
+    def predict(
+        self,
+        workflow_input,
+        file_path_list=[],
+        extra_models_list=[],
+        extra_node_urls=[],  # [{'url': github_url, 'commit_hash': xyz},...]
+        stop_server_after_completion=False,
+        clear_comfy_logs=True,
+        output_folder="./output",
+        output_node_ids=None,
+        ignore_model_list=[],
+        client_id=None,
+        comfy_commit_hash=None,
+        strict_dep_list=None,  # {numpy: 1.24.4, ...}
+        checkpointing_data=None,  # { "network_data" : {"type": "Salad", "organisation": "xyz", "api-key": "xyz"}}
+        use_preflight_cache=True,
+        progress_callback=None,  # fn(dict) called from this thread with node-level progress
+        ws_recv_timeout=30,
+        execution_timeout=None,
+        history_poll_interval=3,
+    ):
+        """
+        workflow_input:                 API json of the workflow. Can be a filepath or str
+        file_path_list:                 files to copy inside the '/input' folder which are being used in the workflow
+        extra_models_list:              extra models to be downloaded
+        extra_node_urls:                extra nodes to be downloaded (with the option to specify commit version)
+        stop_server_after_completion:   stop server as soon as inference completes (or fails)
+        clear_comfy_logs:               clears the temp comfy logs after every inference
+        output_folder:                  for storing inference output
+        output_node_ids:                nodes to look in for the output
+        ignore_model_list:              these models won't be downloaded (in cases where these are manually placed)
+        client_id:                      this can be used as a tag for the generations
+        comfy_commit_hash:              specific comfy commit to checkout
+        strict_dep_list:                list of pkgs and their versions that can't be overrided by new nodes installation
+        checkpointing_data:             config to enable sampler latent checkpointing
+        use_preflight_cache:            skip requirements/custom node/model checks when this workflow already
+                                        passed them on the same ComfyUI commit and custom_nodes state
+        progress_callback:              receives node-level progress (see get_output)
+        ws_recv_timeout:                seconds without a ws message before checking history for completion
+        execution_timeout:              overall seconds allowed for the prompt; interrupts ComfyUI when exceeded
+        history_poll_interval:          history poll gap when the websocket connection is lost
+        """
+        output_list = {}
+        try:
+            # TODO: add support for image and normal json files
+            client_id = client_id or str(uuid.uuid4())
+            workflow = self._prepare_workflow(
+                workflow_input,
+                file_path_list,
+                extra_models_list,
+                extra_node_urls,
+                ignore_model_list,
+                client_id,
+                comfy_commit_hash,
+                strict_dep_list,
+                checkpointing_data,
+                use_preflight_cache,
+            )
+            if workflow is None:
+                return None
 
             # get the result
             app_logger.log(LoggingType.INFO, "Generating output please wait")
@@ -855,60 +1328,25 @@ class ComfyRunner:
                 app_logger.log(LoggingType.INFO, "Generation cancelled by the user")
                 return None
 
-            ws = websocket.WebSocket()
-            host = SERVER_ADDR + ":" + str(APP_PORT)
-            host = host.replace("http://", "").replace("https://", "")
-            ws.connect("ws://{}/ws?clientId={}".format(host, client_id))
-            node_output = self.get_output(ws, workflow, client_id, output_node_ids)
-            output_list = []
-            comfy_output_dir = os.path.join(COMFY_BASE_PATH, "output")
-            copied_src_paths = set()
-
-            for file in node_output["file_list"]:
-                path = find_file_in_directory(comfy_output_dir, file)
-                # some intermediary temp files are deleted at this point
-                if path:
-                    copied_src_paths.add(path[0])
-                    output_list.append(
-                        copy_files(
-                            path[0],
-                            output_folder,
-                            overwrite=False,
-                            delete_original=True,
-                        )
-                    )
-
-            # Fallback: some nodes (e.g. SaveAudio) may not expose filename metadata
-            # in history outputs but still write files to Comfy output directory.
-            if not output_list:
-                for root, _, files in os.walk(comfy_output_dir):
-                    for file_name in files:
-                        src_path = os.path.join(root, file_name)
-                        if src_path in copied_src_paths:
-                            continue
-                        output_list.append(
-                            copy_files(
-                                src_path,
-                                output_folder,
-                                overwrite=False,
-                                delete_original=True,
-                            )
-                        )
-            # print("node output: ", node_output)
-            # print("output_list: ", output_list)
-            app_logger.log(
-                LoggingType.DEBUG, f"output file list len: {len(output_list)}"
-            )
-            os.makedirs(comfy_output_dir, exist_ok=True)
-            clear_directory(comfy_output_dir)
-
-            output_list = {
-                "file_paths": output_list,
-                "text_output": node_output["text_output"],
-            }
+            ws = self._connect_ws(client_id, ws_recv_timeout)
+            try:
+                node_output = self.get_output(
+                    ws,
+                    workflow,
+                    client_id,
+                    output_node_ids,
+                    progress_callback=progress_callback,
+                    recv_timeout=ws_recv_timeout,
+                    execution_timeout=execution_timeout,
+                    history_poll_interval=history_poll_interval,
+                )
+            finally:
+                ws.close()
+            output_list = self._collect_outputs(node_output, output_folder)
         except Exception as e:
             app_logger.log(LoggingType.INFO, "Error generating output " + str(e))
             print(traceback.format_exc())
+            output_list = {"error": str(e), "error_type": type(e).__name__}
 
         # stopping the server
         if stop_server_after_completion:
@@ -919,3 +1357,114 @@ class ComfyRunner:
             self.clear_comfy_logs()
 
         return output_list
+
+    def predict_batch(
+        self,
+        workflow_inputs,
+        output_folders,
+        output_node_ids=None,
+        extra_models_list=[],
+        extra_node_urls=[],
+        ignore_model_list=[],
+        client_id=None,
+        comfy_commit_hash=None,
+        strict_dep_list=None,
+        use_preflight_cache=True,
+        progress_callback=None,
+        on_complete=None,
+        on_queued=None,
+        ws_recv_timeout=30,
+        execution_timeout=None,
+        history_poll_interval=3,
+    ):
+        """
+        Runs several workflows on this (warm) server in one go: each workflow is prepared like in
+        predict(), then all prompts are queued together and followed over a single websocket, so
+        ComfyUI's queue never runs dry between them. Outputs of prompt i are moved to
+        output_folders[i] as soon as it finishes.
+
+        Input files must already be in self.input_dir (there is no file_path_list; it would clear
+        the shared input dir under the other prompts).
+        Returns one entry per workflow: {"file_paths", "files", "text_output"} or {"error", "error_type"}.
+        on_complete(index, entry) fires per prompt as it finishes.
+        on_queued(index, comfy_prompt_id) fires per prompt once queued; pass that id to cancel_prompt
+        to stop a single entry.
+        execution_timeout applies to the whole batch.
+        """
+        client_id = client_id or str(uuid.uuid4())
+        results = [None] * len(workflow_inputs)
+        prepared, indexes = [], []
+        for index, workflow_input in enumerate(workflow_inputs):
+            try:
+                workflow = self._prepare_workflow(
+                    workflow_input,
+                    [],
+                    extra_models_list,
+                    extra_node_urls,
+                    ignore_model_list,
+                    client_id,
+                    comfy_commit_hash,
+                    strict_dep_list,
+                    None,
+                    use_preflight_cache,
+                )
+                if workflow is None:
+                    raise RuntimeError("workflow preparation failed")
+            except Exception as e:
+                results[index] = {"error": str(e), "error_type": type(e).__name__}
+                if on_complete:
+                    on_complete(index, results[index])
+                continue
+            prepared.append(workflow)
+            indexes.append(index)
+
+        if not prepared:
+            return results
+        if self.gen_status_tracker.is_generation_cancelled(client_id):
+            app_logger.log(LoggingType.INFO, "Generation cancelled by the user")
+            for index in indexes:
+                results[index] = {"error": "Generation cancelled by the user", "error_type": "Cancelled"}
+            return results
+
+        batch_progress = None
+        if progress_callback:
+            # report the caller's workflow index, not the position among the prepared ones
+            batch_progress = lambda event: progress_callback({**event, "index": indexes[event["index"]]})
+
+        def collect(batch_index, node_output):
+            index = indexes[batch_index]
+            if "error" not in node_output:
+                try:
+                    node_output = self._collect_outputs(node_output, output_folders[index])
+                except Exception as e:
+                    node_output = {"error": str(e), "error_type": type(e).__name__}
+            results[index] = node_output
+            if on_complete:
+                on_complete(index, node_output)
+
+        app_logger.log(LoggingType.INFO, f"Generating {len(prepared)} outputs please wait")
+        ws = self._connect_ws(client_id, ws_recv_timeout)
+        try:
+            self.get_outputs(
+                ws,
+                prepared,
+                client_id,
+                [output_node_ids] * len(prepared),
+                progress_callback=batch_progress,
+                recv_timeout=ws_recv_timeout,
+                execution_timeout=execution_timeout,
+                history_poll_interval=history_poll_interval,
+                on_complete=collect,
+                on_queued=(lambda batch_index, prompt_id: on_queued(indexes[batch_index], prompt_id))
+                if on_queued
+                else None,
+            )
+        except Exception as e:
+            app_logger.log(LoggingType.INFO, "Error generating batch output " + str(e))
+            for index in indexes:
+                if results[index] is None:
+                    results[index] = {"error": str(e), "error_type": type(e).__name__}
+        finally:
+            ws.close()
+
+        return results
@@ -78,9 +78,11 @@ class ComfyAPI(BaseAPI):
         res = self.http_get(self.MODEL_LIST_URL + "?mode=local")
         return res["models"] if "models" in res else []
 
-    # TODO: add health check api
-    def health_check(self):
-        res = requests.get(self.SERVER_URL + self.HISTORY_URL + "/123")
+    def health_check(self, timeout=5):
+        try:
+            res = requests.get(self.SERVER_URL + self.HISTORY_URL + "/123", timeout=timeout)
+        except requests.RequestException:
+            return False
         return True if res.status_code == 200 else False
 
     def get_history(self, prompt_id):
@@ -102,9 +104,14 @@ class ComfyAPI(BaseAPI):
         p = {"prompt": prompt, "client_id": client_id}
         return self.http_post(self.QUEUE_PROMPT_URL, data=p)
 
-    # NOTE: stops the current generation in progress
-    def interrupt_prompt(self):
-        return self.http_post(self.INTERRUPT_URL, data={}, json_output=False)
+    # NOTE: stops the current generation in progress (newer ComfyUI only if it is prompt_id)
+    def interrupt_prompt(self, prompt_id=None):
+        data = {"prompt_id": prompt_id} if prompt_id else {}
+        return self.http_post(self.INTERRUPT_URL, data=data, json_output=False)
+
+    # removes prompts that are still waiting in the queue
+    def delete_queued(self, prompt_ids):
+        return self.http_post(self.QUEUE_URL, data={"delete": list(prompt_ids)}, json_output=False)
 
     def get_queue(self):
         return self.http_get(self.QUEUE_URL)
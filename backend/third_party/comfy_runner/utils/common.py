@@ -107,6 +107,16 @@ def find_process_by_port(port):
     return pid
 
 
+# rename into place (atomic on the same filesystem), copy only across filesystems
+def move_file(source_path, destination_file):
+    os.makedirs(os.path.dirname(destination_file), exist_ok=True)
+    try:
+        os.replace(source_path, destination_file)
+    except OSError:
+        shutil.move(source_path, destination_file)
+    return destination_file
+
+
 def find_file_in_directory(directory, target_file):
     file_list = []
     for root, dirs, files in os.walk(directory, followlinks=True):
@@ -138,18 +148,14 @@ def find_git_root(path):
 # possible issues
 # 1. a different file of same name can be present in some other directory
 # 2. file may be corrupted
+# (ComfyRunner itself answers this from utils.model_index instead of walking the tree)
 def search_file(filename, directory, parent_folder=None):
+    # os.walk already descends into every subdirectory, a single pass is enough
     for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file == filename and (
-                not parent_folder
-                or (parent_folder and os.path.basename(root) == parent_folder)
-            ):
-                return True
-        for subdir in dirs:
-            subdir_path = os.path.join(root, subdir)
-            if search_file(filename, subdir_path, parent_folder):
-                return True  # File found in subdirectory
+        if filename in files and (
+            not parent_folder or os.path.basename(root) == parent_folder
+        ):
+            return True
     return False
 
 
@@ -1,5 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
+import hashlib
 import os
+import threading
 import time
 from urllib.parse import urlparse
 
@@ -12,12 +16,13 @@ from ..constants import (
     APP_PORT,
     COMFY_MODELS_BASE_PATH,
     COMFY_MODEL_PATH_LIST,
+    DOWNLOAD_CONNECTIONS,
+    DOWNLOAD_MIN_SEGMENT_SIZE,
     SERVER_ADDR,
 )
 from .comfy.api import ComfyAPI
 
 from .common import (
-    find_git_root,
     convert_to_relative_path,
     fuzzy_text_match,
     get_default_save_path,
@@ -26,6 +31,11 @@ from .common import (
 )
 from .logger import LoggingType, app_logger
 
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
 
 class FileStatus(Enum):
     NEW_DOWNLOAD = "new_download"
@@ -34,27 +44,46 @@ class FileStatus(Enum):
     FAILED = "failed"  # not proper
 
 
-class FileDownloader:
-    def __init__(self):
-        pass
+class DownloadError(Exception):
+    pass
 
-    def is_file_downloaded(self, filename, url, dest):
-        zip_file = False
-        percentage_diff = lambda a, b: int(round(abs(a - b) / b, 2) * 100)
-        if url.endswith(".zip") or url.endswith(".tar"):
-            # filename = filename + (".zip" if url.endswith(".zip") else ".tar")
-            zip_file = True
 
-        dest_path = f"{dest}/{filename}"
+class FileDownloader:
+    """
+    Model/file downloads into <dest>/<filename>.
+
+    Large files are fetched with several HTTP Range connections into <filename>.part; the byte
+    ranges already written are kept in <filename>.part.json so an interrupted download (or a
+    crashed process) resumes instead of starting over. The file only appears under its final
+    name after its size (and sha256, when the catalog has one) checked out. Only one download per
+    destination runs at a time (threads and, through <filename>.lock, other processes), since two
+    writers would share and clobber the same .part file.
+    """
+
+    _dest_locks = {}
+    _dest_locks_guard = threading.Lock()
+
+    chunk_size = 1024 * 1024
+    request_timeout = (10, 60)
+    max_retries = 3
+    retry_delay = 3
+
+    def __init__(self, connections=DOWNLOAD_CONNECTIONS, min_segment_size=DOWNLOAD_MIN_SEGMENT_SIZE):
+        self.connections = max(1, connections)
+        self.min_segment_size = min_segment_size
+
+    def is_file_downloaded(self, filename, url, dest, sha256=None):
+        dest_path = os.path.join(dest, filename)
         app_logger.log(LoggingType.DEBUG, "checking file: ", dest_path)
-        return os.path.exists(dest_path)
-        #     downloaded_file_size = os.path.getsize(dest_path)
-        #     url_file_size = get_file_size(url)
-        #     # NOTE: hackish sol of checking if zip file is downloaded or not (by checking if the extracted file is approximately the same size)
-        #     # possible issues 1. partially downloaded zip file 2. new model file with smaller size
-        #     return downloaded_file_size == url_file_size if not zip_file else \
-        #         percentage_diff(downloaded_file_size, url_file_size) <= 2
-        # return False
+        if not os.path.exists(dest_path):
+            return False
+        # files are only renamed into place once complete, so presence is enough unless
+        # the catalog gives a checksum to hold it against
+        if sha256 and os.path.isfile(dest_path) and self._sha256(dest_path) != sha256.lower():
+            app_logger.log(LoggingType.INFO, f"{filename} does not match its sha256, downloading again")
+            os.remove(dest_path)
+            return False
+        return True
 
     def background_download(self, url, dest, filename=None):
         # downloads without a progress bar + overwrites existing files (no checks performed)
@@ -69,60 +98,222 @@ class FileDownloader:
                 f.write(chunk)
         return filepath
 
-    def download_file(self, filename, url, dest):
+    def download_file(self, filename, url, dest, sha256=None):
         os.makedirs(dest, exist_ok=True)
-
-        # checking if the file is already downloaded
-        if self.is_file_downloaded(filename, url, dest):
+        dest_path = os.path.join(dest, filename)
+        with self._dest_lock(dest_path):
+            return self._download_file_locked(filename, url, dest, dest_path, sha256)
+
+    @classmethod
+    @contextmanager
+    def _dest_lock(cls, dest_path):
+        key = os.path.abspath(dest_path)
+        with cls._dest_locks_guard:
+            thread_lock = cls._dest_locks.setdefault(key, threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(key + ".lock", "a+b") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _download_file_locked(self, filename, url, dest, dest_path, sha256):
+        # checking if the file is already downloaded (possibly by whoever held the lock before us)
+        if self.is_file_downloaded(filename, url, dest, sha256):
             app_logger.log(LoggingType.DEBUG, f"{filename} already present")
             return True, FileStatus.ALREADY_PRESENT.value
-        else:
-            # deleting partial downloads
-            if os.path.exists(f"{dest}/{filename}"):
-                os.remove(f"{dest}/{filename}")
 
-        max_retries = 3
-        retry_delay = 3
-        for _ in range(max_retries):
+        for attempt in range(self.max_retries):
             try:
-                # download progress bar
                 app_logger.log(LoggingType.INFO, f"Downloading {filename}")
-                response = requests.get(url, stream=True)
-                total_size = int(response.headers.get("content-length", 0))
-                progress_bar = tqdm(total=total_size, unit="B", unit_scale=True)
-                with open(f"{dest}/{filename}", "wb") as handle:
-                    for data in tqdm(response.iter_content(chunk_size=1024)):
-                        handle.write(data)
-                        progress_bar.update(len(data))
+                self._download(url, dest_path, sha256)
 
                 # extract files if the downloaded file is a .zip or .tar
                 if url.endswith(".zip") or url.endswith(".tar"):
                     new_filename = filename + (
                         ".zip" if url.endswith(".zip") else ".tar"
                     )
-                    os.rename(f"{dest}/{filename}", f"{dest}/{new_filename}")
+                    os.rename(dest_path, os.path.join(dest, new_filename))
                     if url.endswith(".zip"):
-                        with zipfile.ZipFile(f"{dest}/{new_filename}", "r") as zip_ref:
+                        with zipfile.ZipFile(os.path.join(dest, new_filename), "r") as zip_ref:
                             zip_ref.extractall(dest)
                     else:
-                        with tarfile.open(f"{dest}/{new_filename}", "r") as tar_ref:
+                        with tarfile.open(os.path.join(dest, new_filename), "r") as tar_ref:
                             tar_ref.extractall(dest)
-                    os.remove(f"{dest}/{new_filename}")
+                    os.remove(os.path.join(dest, new_filename))
 
                 return True, FileStatus.NEW_DOWNLOAD.value
             except Exception as e:
                 app_logger.log(
                     LoggingType.ERROR,
-                    f"Download failed: {str(e)}. Retrying in {retry_delay} seconds...",
+                    f"Download failed: {str(e)}. Retrying in {self.retry_delay} seconds...",
                 )
-                time.sleep(retry_delay)
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay)
 
         app_logger.log(
             LoggingType.ERROR,
-            f"Failed to download {filename} after {max_retries} attempts",
+            f"Failed to download {filename} after {self.max_retries} attempts",
         )
         return False, FileStatus.FAILED.value
 
+    # ------------------------------------------------------------------ internals
+
+    @staticmethod
+    def _sha256(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(4 * 1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _probe(self, url):
+        """(final url, size or None, supports ranges, validator) from a 1-byte range request."""
+        with requests.get(
+            url,
+            headers={"Range": "bytes=0-0"},
+            stream=True,
+            allow_redirects=True,
+            timeout=self.request_timeout,
+        ) as res:
+            res.raise_for_status()
+            validator = res.headers.get("ETag") or res.headers.get("Last-Modified")
+            content_range = res.headers.get("Content-Range", "")
+            if res.status_code == 206 and "/" in content_range:
+                total = content_range.rsplit("/", 1)[-1]
+                return res.url, int(total) if total.isdigit() else None, True, validator
+            length = res.headers.get("Content-Length")
+            return res.url, int(length) if length and length.isdigit() else None, False, validator
+
+    def _plan_segments(self, size):
+        count = max(1, min(self.connections, size // max(1, self.min_segment_size)))
+        step = -(-size // count)
+        # [start, end (inclusive), bytes already written]
+        return [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+
+    def _load_state(self, state_path, part_path, url, size, validator):
+        if not (os.path.exists(state_path) and os.path.exists(part_path)):
+            return None
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # a changed remote file cannot be resumed
+        if state.get("size") != size or state.get("validator") != validator or state.get("url") != url:
+            return None
+        if os.path.getsize(part_path) != size:
+            return None
+        return state
+
+    @staticmethod
+    def _save_state(state_path, state):
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    def _download(self, url, dest_path, sha256=None):
+        part_path = dest_path + ".part"
+        state_path = part_path + ".json"
+        final_url, size, ranges, validator = self._probe(url)
+
+        if size and ranges:
+            state = self._load_state(state_path, part_path, url, size, validator)
+            if state is None:
+                state = {"url": url, "size": size, "validator": validator, "segments": self._plan_segments(size)}
+                with open(part_path, "wb") as f:
+                    f.truncate(size)
+                self._save_state(state_path, state)
+            else:
+                app_logger.log(LoggingType.INFO, f"Resuming {os.path.basename(dest_path)}")
+            self._download_segments(final_url, part_path, state_path, state)
+        else:
+            # no range support: one plain stream, nothing to resume from
+            self._download_stream(final_url, part_path, size)
+
+        if size is not None and os.path.getsize(part_path) != size:
+            raise DownloadError(f"size mismatch: got {os.path.getsize(part_path)} bytes, expected {size}")
+        if sha256:
+            actual = self._sha256(part_path)
+            if actual != sha256.lower():
+                # a corrupt file would resume into the same corrupt file, start over next time
+                os.remove(part_path)
+                if os.path.exists(state_path):
+                    os.remove(state_path)
+                raise DownloadError(f"sha256 mismatch: got {actual}, expected {sha256}")
+
+        os.replace(part_path, dest_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+    def _download_segments(self, url, part_path, state_path, state):
+        segments = state["segments"]
+        done = sum(seg[2] for seg in segments)
+        lock = threading.Lock()
+        progress_bar = tqdm(total=state["size"], initial=done, unit="B", unit_scale=True)
+        save_every = 64 * 1024 * 1024
+        unsaved = [0]
+
+        def fetch(seg):
+            start, end, written = seg
+            if start + written > end:
+                return
+            with requests.get(
+                url,
+                headers={"Range": f"bytes={start + written}-{end}"},
+                stream=True,
+                timeout=self.request_timeout,
+            ) as res:
+                if res.status_code != 206:
+                    raise DownloadError(f"range request returned HTTP {res.status_code}")
+                # unbuffered, so whatever the state file counts has reached the OS
+                with open(part_path, "r+b", buffering=0) as f:
+                    f.seek(start + written)
+                    for chunk in res.iter_content(chunk_size=self.chunk_size):
+                        if not chunk:
+                            continue
+                        chunk = chunk[: end + 1 - (start + seg[2])]
+                        f.write(chunk)
+                        with lock:
+                            seg[2] += len(chunk)
+                            progress_bar.update(len(chunk))
+                            unsaved[0] += len(chunk)
+                            if unsaved[0] >= save_every:
+                                self._save_state(state_path, state)
+                                unsaved[0] = 0
+                        if start + seg[2] > end:
+                            break
+            if start + seg[2] <= end:
+                raise DownloadError(f"range {start}-{end} ended early")
+
+        try:
+            pending = [seg for seg in segments if seg[0] + seg[2] <= seg[1]]
+            if pending:
+                with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                    for future in [executor.submit(fetch, seg) for seg in pending]:
+                        future.result()
+        finally:
+            progress_bar.close()
+            with lock:
+                self._save_state(state_path, state)
+
+    def _download_stream(self, url, part_path, size):
+        with requests.get(url, stream=True, timeout=self.request_timeout) as res:
+            res.raise_for_status()
+            progress_bar = tqdm(total=size or 0, unit="B", unit_scale=True)
+            try:
+                with open(part_path, "wb") as handle:
+                    for chunk in res.iter_content(chunk_size=self.chunk_size):
+                        handle.write(chunk)
+                        progress_bar.update(len(chunk))
+            finally:
+                progress_bar.close()
+
 
 class ModelDownloader(FileDownloader):
     def __init__(self, model_weights_file_path_list, download_similar_model=False):
@@ -133,10 +324,7 @@ class ModelDownloader(FileDownloader):
 
         # loading local data
         for model_weights_file_path in model_weights_file_path_list:
-            current_dir = find_git_root(os.path.dirname(__file__))  # finding root
-            file_path = os.path.abspath(
-                os.path.join(current_dir, model_weights_file_path)
-            )
+            file_path = os.path.abspath(model_weights_file_path)
             # print("------- opening file path: ", file_path)
             with open(file_path, "r", encoding="utf-8") as file:
                 data = json.load(file)
@@ -149,6 +337,7 @@ class ModelDownloader(FileDownloader):
                                 data[model_name]["dest"],
                                 base_comfy=COMFY_MODELS_BASE_PATH,
                             ),
+                            "sha256": data[model_name].get("sha256"),
                         }
 
     def _get_similar_models(self, model_name):
@@ -169,10 +358,7 @@ class ModelDownloader(FileDownloader):
         # and should be ignored here
         ignore_manager_models = ["sd_xl_base_1.0.safetensors", "sd_xl_refiner_1.0_0.9vae.safetensors"]
         for model_list_path in COMFY_MODEL_PATH_LIST:
-            current_dir = find_git_root(os.path.dirname(__file__))  # finding root
-            model_list_path = os.path.abspath(
-                os.path.join(current_dir, model_list_path)
-            )
+            model_list_path = os.path.abspath(model_list_path)
             if not os.path.exists(model_list_path):
                 app_logger.log(
                     LoggingType.DEBUG, f"model list path not found - {model_list_path}"
@@ -222,6 +408,13 @@ class ModelDownloader(FileDownloader):
 
         return None, None, None
 
+    def get_model_sha256(self, model_name):
+        """Expected sha256 from the catalogs, None when no catalog lists one."""
+        for model in self.comfy_model_dict.get(model_name, []):
+            if model.get("sha256"):
+                return model["sha256"]
+        return (self.model_download_dict.get(model_name) or {}).get("sha256")
+
     def download_model(self, model_name):
         # handling nomenclature like "SD1.5/pytorch_model.bin"
         base, model_name = (
@@ -233,7 +426,14 @@ class ModelDownloader(FileDownloader):
         filename, url, dest = self.get_model_details(model_name)
 
         if filename and url and dest:
-            _, file_status = self.download_file(filename=filename, url=url, dest=dest)
+            status, file_status = self.download_file(
+                filename=filename,
+                url=url,
+                dest=dest,
+                sha256=self.get_model_sha256(model_name),
+            )
+            if not status:
+                return (False, [], file_status)
 
         else:
             app_logger.log(
@@ -1,71 +1,92 @@
 import os
+import sqlite3
 import time
 import threading
-import portalocker
 
 
 class GenerationStatusTracker:
-    def __init__(self, file_name="generation_status.txt", lock_timeout=10):
+    """
+    Cancelled generations (by client_id) shared between processes through a small SQLite table.
+
+    Lookups are answered from an in-memory dict; `PRAGMA data_version` (which changes only when
+    another connection commits) tells us when that dict has to be dropped, so a check that finds
+    nothing new costs one pragma instead of re-reading a file. Rows older than ttl are compacted
+    away when new cancellations are written.
+    """
+
+    def __init__(
+        self,
+        file_name="generation_status.db",
+        lock_timeout=10,
+        ttl=24 * 3600,
+        compact_interval=600,
+    ):
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.file_path = os.path.join(current_dir, file_name)
-        self.cache = {}
-        self.last_file_check = 0
-        self.file_check_interval = 1  # check file every 1 second
+        self.lock_timeout = lock_timeout  # sqlite busy timeout in seconds
+        self.ttl = ttl
+        self.compact_interval = compact_interval
+        self.cache = {}  # client_id -> cancelled
         self.lock = threading.Lock()
-        self.lock_timeout = lock_timeout  # timeout for acquiring lock in seconds
+        self.data_version = None
+        self.last_compaction = 0
+        self.conn = sqlite3.connect(
+            self.file_path,
+            timeout=self.lock_timeout,
+            isolation_level=None,  # autocommit, every write is visible to other processes at once
+            check_same_thread=False,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cancelled_generations ("
+            "client_id TEXT PRIMARY KEY, cancelled INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
 
     def mark_generation_cancelled(self, client_id):
         if not client_id:
             return False
 
+        now = time.time()
         try:
-            with portalocker.Lock(self.file_path, "a", timeout=self.lock_timeout) as f:
-                f.write(f"{client_id},True,{time.time()}\n")
-                f.flush()
-                os.fsync(f.fileno())
-        except portalocker.exceptions.LockException:
-            print(
-                f"Failed to acquire lock for writing within {self.lock_timeout} seconds."
-            )
+            with self.lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO cancelled_generations (client_id, cancelled, updated_at) "
+                    "VALUES (?, 1, ?)",
+                    (str(client_id), now),
+                )
+                self.cache[str(client_id)] = True
+                if now - self.last_compaction > self.compact_interval:
+                    self.conn.execute(
+                        "DELETE FROM cancelled_generations WHERE updated_at < ?", (now - self.ttl,)
+                    )
+                    self.last_compaction = now
+        except sqlite3.Error as e:
+            print(f"Failed to record cancelled generation {client_id}: {e}")
             return False
-
-        with self.lock:
-            self.cache[client_id] = (True, time.time())
         return True
 
     def is_generation_cancelled(self, client_id):
         if not client_id:
             return False
 
-        current_time = time.time()
-        if current_time - self.last_file_check > self.file_check_interval:
-            self._update_cache_from_file()
-            self.last_file_check = current_time
-
+        client_id = str(client_id)
         with self.lock:
-            status, _ = self.cache.get(client_id, (False, 0))
-        return status
-
-    def _update_cache_from_file(self):
-        if not os.path.exists(self.file_path):
-            return
-
-        try:
-            with portalocker.Lock(self.file_path, "r", timeout=self.lock_timeout) as f:
-                for line in f:
-                    client_id, status, timestamp = line.strip().split(",")
-                    status = status.lower() == "true"
-                    timestamp = float(timestamp)
-                    with self.lock:
-                        if (
-                            client_id not in self.cache
-                            or timestamp > self.cache[client_id][1]
-                        ):
-                            self.cache[client_id] = (status, timestamp)
-        except portalocker.exceptions.LockException:
-            print(
-                f"Failed to acquire lock for reading within {self.lock_timeout} seconds."
-            )
+            try:
+                version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+                if version != self.data_version or len(self.cache) > 10000:
+                    # another process wrote since our last look
+                    self.cache.clear()
+                    self.data_version = version
+                if client_id not in self.cache:
+                    row = self.conn.execute(
+                        "SELECT cancelled FROM cancelled_generations WHERE client_id = ?",
+                        (client_id,),
+                    ).fetchone()
+                    self.cache[client_id] = bool(row and row[0])
+            except sqlite3.Error as e:
+                print(f"Failed to read cancelled generations: {e}")
+                return self.cache.get(client_id, False)
+            return self.cache[client_id]
 
 
 # quick check to test cross-platform compatibility
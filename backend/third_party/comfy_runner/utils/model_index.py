@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+
+from ..constants import MODEL_INDEX_CHECK_INTERVAL
+
+
+class ModelFileIndex:
+    """
+    In-memory filename -> paths index of a directory tree (the ComfyUI models/ folder).
+
+    The tree is walked once and lookups are then answered from memory without touching the
+    disk. refresh() compares directory mtimes and re-lists only the directories that changed:
+    adding, removing or renaming a file changes its parent directory's mtime. The check runs at
+    most every check_interval seconds (None: only on explicit refreshes), right away after this
+    process downloads models (force=True), and once more before a lookup reports a miss, so a
+    model added by another process, by hand or on a mounted volume is not reported missing.
+    """
+
+    def __init__(self, root, check_interval=MODEL_INDEX_CHECK_INTERVAL, follow_symlinks=True):
+        self.root = os.path.abspath(root)
+        self.check_interval = check_interval
+        self.follow_symlinks = follow_symlinks
+        self.lock = threading.RLock()
+        self._dir_mtimes = {}  # dir -> mtime when listed
+        self._dir_files = {}  # dir -> [filenames]
+        self._dir_subdirs = {}  # dir -> [subdirs]
+        self._files = {}  # filename -> [paths]
+        self._last_check = 0.0
+        self._built = False
+
+    # ------------------------------------------------------------------ building
+
+    def _list_dir(self, directory, seen_real):
+        try:
+            mtime = os.stat(directory).st_mtime
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+
+        files, subdirs = [], []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=True):
+                    files.append(entry.name)
+            except OSError:
+                continue
+
+        self._dir_mtimes[directory] = mtime
+        self._dir_files[directory] = files
+        self._dir_subdirs[directory] = subdirs
+        for name in files:
+            self._files.setdefault(name, []).append(os.path.join(directory, name))
+
+        for subdir in subdirs:
+            real = os.path.realpath(subdir)
+            if real in seen_real:  # symlink loop
+                continue
+            seen_real.add(real)
+            self._list_dir(subdir, seen_real)
+
+    def _drop_dir(self, directory):
+        for name in self._dir_files.pop(directory, []):
+            paths = self._files.get(name)
+            if paths:
+                path = os.path.join(directory, name)
+                if path in paths:
+                    paths.remove(path)
+                if not paths:
+                    self._files.pop(name, None)
+        self._dir_mtimes.pop(directory, None)
+        for subdir in self._dir_subdirs.pop(directory, []):
+            self._drop_dir(subdir)
+
+    def _build(self):
+        self._dir_mtimes, self._dir_files, self._dir_subdirs, self._files = {}, {}, {}, {}
+        if os.path.isdir(self.root):
+            self._list_dir(self.root, {os.path.realpath(self.root)})
+        self._built = True
+        self._last_check = time.monotonic()
+
+    def refresh(self, force=False):
+        """Re-list directories whose mtime changed since they were indexed."""
+        with self.lock:
+            if not self._built:
+                self._build()
+                return
+            now = time.monotonic()
+            if not force and (self.check_interval is None or now - self._last_check < self.check_interval):
+                return
+            self._last_check = now
+
+            changed = []
+            for directory, mtime in list(self._dir_mtimes.items()):
+                try:
+                    current = os.stat(directory).st_mtime
+                except OSError:
+                    current = None
+                if current != mtime:
+                    changed.append(directory)
+
+            if self.root not in self._dir_mtimes and os.path.isdir(self.root):
+                self._build()  # root did not exist when first indexed
+                return
+
+            # parents first: re-listing a directory also re-lists everything below it
+            relisted = []
+            for directory in sorted(changed, key=len):
+                if any(directory.startswith(done + os.sep) for done in relisted):
+                    continue
+                self._drop_dir(directory)
+                if os.path.isdir(directory):
+                    seen = {os.path.realpath(d) for d in self._dir_mtimes}
+                    self._list_dir(directory, seen)
+                relisted.append(directory)
+
+    def invalidate(self):
+        with self.lock:
+            self._built = False
+
+    # ------------------------------------------------------------------ lookups
+
+    def _lookup(self, filename, parent_folder, force_refresh):
+        self.refresh(force=force_refresh)
+        with self.lock:
+            paths = list(self._files.get(os.path.basename(filename), []))
+        if parent_folder:
+            paths = [p for p in paths if os.path.basename(os.path.dirname(p)) == parent_folder]
+        return paths
+
+    def find(self, filename, force_refresh=False, parent_folder=None):
+        """All indexed paths whose basename is filename (re-checked against the disk before a miss)."""
+        paths = self._lookup(filename, parent_folder, force_refresh)
+        if not paths and not force_refresh:
+            paths = self._lookup(filename, parent_folder, True)
+        return paths
+
+    def exists(self, filename, parent_folder=None, force_refresh=False):
+        """Same contract as utils.common.search_file, answered from the index."""
+        return bool(self.find(filename, force_refresh=force_refresh, parent_folder=parent_folder))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_model_index(root):
+    """Shared index per directory root."""
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ModelFileIndex(key)
+        return index
@@ -1,9 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
 import random
 import shutil
 import subprocess
 import sys
 import os
 import platform
+import tempfile
+import threading
 import time
 import urllib
 from urllib.parse import urlparse
@@ -12,7 +15,7 @@ import zipfile
 import git
 from git import RemoteProgress
 from tqdm import tqdm
-from .common import find_git_root
+from ..constants import COMFY_BASE_PATH, NODE_INSTALL_CONCURRENCY, PIP_CACHE_DIR
 
 
 def get_node_installer():
@@ -25,10 +28,7 @@ def get_node_installer():
 # NOTE: this code is taken from comfy manager and is modified to support cloning of specific commits
 class NodeInstaller:
     def __init__(self, file_downloader):
-        comfy_runner_dir = find_git_root(
-            os.path.dirname(__file__)
-        )  # NOTE: this assumes ComfyUI is always next to comfy_runner
-        self.comfy_path = os.path.join(os.path.dirname(comfy_runner_dir), "ComfyUI")
+        self.comfy_path = os.path.abspath(COMFY_BASE_PATH)
         self.comfyui_manager_path = os.path.abspath(
             os.path.join(self.comfy_path, "custom_nodes", "ComfyUI-Manager")
         )
@@ -41,15 +41,29 @@ class NodeInstaller:
             self.comfyui_manager_path, "startup-scripts"
         )
         self.download_url = file_downloader
+        self.progress_callback = None  # fn(dict), see _report
+        self._progress_lock = threading.Lock()
 
     # ----------- helper utils ----------------
     def _is_valid_url(self, url):
         try:
             result = urlparse(url)
-            return all([result.scheme, result.netloc])
+            # file:// urls (local/bare repos) have no netloc
+            return result.scheme == "file" or all([result.scheme, result.netloc])
         except ValueError:
             return False
 
+    def _report(self, stage, node, done=None, total=None, status=None):
+        if not self.progress_callback:
+            return
+        try:
+            with self._progress_lock:
+                self.progress_callback(
+                    {"stage": stage, "node": node, "done": done, "total": total, "status": status}
+                )
+        except Exception as e:
+            print(f"progress callback failed: {e}")
+
     def _run_script(self, cmd, cwd="."):
         if len(cmd) > 0 and cmd[0].startswith("#"):
             print(f"[ComfyUI-Manager] Unexpected behavior: `{cmd}`")
@@ -69,32 +83,46 @@ class NodeInstaller:
         else:
             return pkg
 
-    def _execute_install_script(self, url, repo_path):
-        install_script_path = os.path.join(repo_path, "install.py")
+    def _read_requirements(self, repo_path):
         requirements_path = os.path.join(repo_path, "requirements.txt")
+        if not os.path.exists(requirements_path):
+            return []
+        requirements = []
+        with open(requirements_path, "r") as requirements_file:
+            for line in requirements_file:
+                package_name = self._remap_pip_package(line.strip())
+                if package_name and not package_name.startswith("#"):
+                    requirements.append(package_name)
+        return requirements
+
+    def _pip_install(self, requirements, cwd="."):
+        """One resolver run for all requirements; built wheels are kept in PIP_CACHE_DIR."""
+        if not requirements:
+            return True
+        fd, requirements_file = tempfile.mkstemp(prefix="comfy_nodes_", suffix=".txt")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(requirements) + "\n")
+            install_cmd = [
+                sys.executable,
+                "-m",
+                "pip",
+                "install",
+                "--cache-dir",
+                PIP_CACHE_DIR,
+                "-r",
+                requirements_file,
+            ]
+            self._run_script(install_cmd, cwd=cwd)
+            return True
+        except Exception as e:
+            print(f"pip install failed: {e}")
+            return False
+        finally:
+            os.remove(requirements_file)
 
-        if os.path.exists(requirements_path):
-            print("Install: pip packages")
-            with open(requirements_path, "r") as requirements_file:
-                for line in requirements_file:
-                    package_name = self._remap_pip_package(line.strip())
-                    if package_name and not package_name.startswith("#"):
-                        install_cmd = [
-                            sys.executable,
-                            "-m",
-                            "pip",
-                            "install",
-                            package_name,
-                        ]
-                        if package_name.strip() != "" and not package_name.startswith(
-                            "#"
-                        ):
-                            try:
-                                self._run_script(install_cmd, cwd=repo_path)
-                            except Exception as e:
-                                print(f"error installing {url} ")
-                                return False
-
+    def _run_install_py(self, url, repo_path):
+        install_script_path = os.path.join(repo_path, "install.py")
         if os.path.exists(install_script_path):
             print(f"Install: install script")
             install_cmd = [sys.executable, "install.py"]
@@ -103,35 +131,74 @@ class NodeInstaller:
             except Exception as e:
                 print(f"error installing {url} ")
                 return False
-
         return True
 
+    def _execute_install_script(self, url, repo_path):
+        print("Install: pip packages")
+        if not self._pip_install(self._read_requirements(repo_path), cwd=repo_path):
+            print(f"error installing {url} ")
+            return False
+        return self._run_install_py(url, repo_path)
+
+    @staticmethod
+    def _same_remote(repo, url):
+        try:
+            remote_url = repo.remotes.origin.url
+        except (AttributeError, ValueError):
+            return False
+        normalize = lambda u: u.rstrip("/").removesuffix(".git")
+        return normalize(remote_url) == normalize(url)
+
     def _gitclone(self, custom_nodes_path, url, target_hash=None):
+        """
+        Shallow, single-commit fetch of url into custom_nodes/<repo>. An existing checkout of the
+        same remote is reused (only the missing commit is fetched) and kept across retries.
+        """
         repo_name = os.path.splitext(os.path.basename(url))[0]
         repo_path = os.path.join(custom_nodes_path, repo_name)
 
         max_retries = 5
         for attempt in range(max_retries):
             try:
-                if os.path.exists(repo_path):
-                    shutil.rmtree(repo_path)
-                
-                repo = git.Repo.clone_from(
-                    url,
-                    repo_path,
-                    recursive=True,
-                    progress=GitProgress(),
-                )
-
-                if target_hash is not None:
-                    print(f"CHECKOUT: {repo_name} [{target_hash}]")
-                    repo.git.checkout(target_hash)
+                repo = None
+                if os.path.isdir(os.path.join(repo_path, ".git")):
+                    repo = git.Repo(repo_path)
+                    if not self._same_remote(repo, url):
+                        repo.close()
+                        repo = None
+                if repo is None:
+                    if os.path.exists(repo_path):
+                        shutil.rmtree(repo_path)
+                    repo = git.Repo.init(repo_path)
+                    repo.create_remote("origin", url)
+
+                head = repo.head.commit.hexsha if repo.head.is_valid() else None
+                if head is None or (target_hash and not head.startswith(target_hash)):
+                    ref = target_hash or "HEAD"
+                    print(f"FETCH: {repo_name} [{ref}]")
+                    try:
+                        repo.git.fetch("origin", ref, depth=1)
+                    except git.GitCommandError:
+                        if not target_hash:
+                            raise
+                        # servers that refuse fetching an unadvertised sha: fetch history instead
+                        if os.path.exists(os.path.join(repo.git_dir, "shallow")):
+                            repo.git.fetch("origin", unshallow=True)
+                        else:
+                            repo.git.fetch("origin")
+                        repo.git.checkout(target_hash, force=True)
+                    else:
+                        repo.git.checkout("FETCH_HEAD", force=True)
+                    if os.path.exists(os.path.join(repo_path, ".gitmodules")):
+                        repo.git.submodule("update", "--init", "--recursive", "--depth", "1")
+                else:
+                    print(f"REUSE: {repo_name} [{head[:12]}]")
 
                 repo.git.clear_cache()
                 repo.close()
                 print(f"Successfully cloned {repo_name}")
                 return True
-            
+
             except Exception as e:
                 print(f"An unexpected error occurred while cloning {repo_name}: {str(e)}")
                 if attempt < max_retries - 1:
@@ -140,7 +207,7 @@ class NodeInstaller:
                     time.sleep(delay)
                 else:
                     print(f"Failed to clone {repo_name} after {max_retries} attempts")
-        
+
         return False
 
     def _unzip_install(self, files):
@@ -197,74 +264,90 @@ class NodeInstaller:
         return True
 
     def _gitclone_install(self, files, commit_hash_list=[]):
-        print(f"Install: {files}")
-        for idx, url in enumerate(files):
-            if not self._is_valid_url(url):
-                print(f"Invalid git url: '{url}'")
-                return False
-
-            max_retries = 5
-            if url.endswith("/"):
-                url = url[:-1]
-            
-            status = True
-            for attempt in range(max_retries):
-                try:
-                    print(f"Download: git clone '{url}'")
-                    repo_name = os.path.splitext(os.path.basename(url))[0]
-                    repo_path = os.path.join(self.custom_nodes_path, repo_name)
-
-                    # Clone the repository from the remote URL
-                    res = self._gitclone(
-                        self.custom_nodes_path,
-                        url,
-                        commit_hash_list[idx] if idx < len(commit_hash_list) else None,
-                    )
-                    if not res:
-                        status = False
-                        break
-                    
-                    # debugging code
-                    # if not random.random() <= 0.5:
-                    #     raise Exception("manual exception")
-
-                    if not self._execute_install_script(url, repo_path):
-                        status = False
-                    
-                    break
-                except Exception as e:
-                    print(f"Install(git-clone) error: {url} / {e}", file=sys.stderr)
-                    print("***** RETRYING...")
-
-        print("Installation was " + ("successfull" if status else "unsuccessfull"))
-        return status
+        return self.install_nodes(
+            [{"files": files, "install_type": "git-clone", "commit_hash": commit_hash_list}]
+        )
 
     # ----------- main method -----------------
     def install_node(self, json_data):
-        install_type = json_data["install_type"]
-        if install_type == "unzip":
-            res = self._unzip_install(json_data["files"])
+        return self.install_nodes([json_data])
+
+    def install_nodes(self, json_data_list, max_workers=NODE_INSTALL_CONCURRENCY):
+        """
+        Installs several nodes at once: git repos are fetched concurrently, the requirements of
+        every node (plus their "pip" entries) go through a single pip run, then install.py scripts
+        run one after another. Returns True only if every node installed.
+        """
+        status = True
+        clones = []  # (url, commit hash)
+        for json_data in json_data_list:
+            install_type = json_data["install_type"]
+            if install_type == "unzip":
+                status = self._unzip_install(json_data["files"]) and status
+            elif install_type == "copy":
+                js_path_name = json_data["js_path"] if "js_path" in json_data else "."
+                status = self._copy_install(json_data["files"], js_path_name) and status
+            elif install_type == "git-clone":
+                commit_hash_list = json_data.get("commit_hash", [])
+                for idx, url in enumerate(json_data["files"]):
+                    if not self._is_valid_url(url):
+                        print(f"Invalid git url: '{url}'")
+                        status = False
+                        continue
+                    clones.append(
+                        (url.rstrip("/"), commit_hash_list[idx] if idx < len(commit_hash_list) else None)
+                    )
 
-        if install_type == "copy":
-            js_path_name = json_data["js_path"] if "js_path" in json_data else "."
-            res = self._copy_install(json_data["files"], js_path_name)
+        # fetching repos
+        print(f"Install: {[url for url, _ in clones]}")
+        total = len(clones)
+        done = [0]
+
+        def clone(item):
+            url, commit_hash = item
+            self._report("clone", url, done[0], total)
+            res = self._gitclone(self.custom_nodes_path, url, commit_hash)
+            with self._progress_lock:
+                done[0] += 1
+            self._report("clone", url, done[0], total, "ok" if res else "failed")
+            return res
 
-        elif install_type == "git-clone":
-            res = self._gitclone_install(
-                json_data["files"], json_data.get("commit_hash", [])
-            )
+        cloned = []
+        if clones:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+                results = list(executor.map(clone, clones))
+            for (url, _), res in zip(clones, results):
+                if res:
+                    cloned.append((url, os.path.join(self.custom_nodes_path, os.path.splitext(os.path.basename(url))[0])))
+                else:
+                    status = False
 
         # installing the dependencies
-        if "pip" in json_data:
-            for pname in json_data["pip"]:
-                pkg = self._remap_pip_package(pname)
-                install_cmd = [sys.executable, "-m", "pip", "install", pkg]
-                try:
-                    self._run_script(install_cmd, cwd=".")
-                except Exception as e:
-                    print(f"error installing {json_data['files'][0]} ")
-
-        return True if res else False
+        requirements = []
+        for _, repo_path in cloned:
+            requirements.extend(self._read_requirements(repo_path))
+        for json_data in json_data_list:
+            requirements.extend(self._remap_pip_package(p) for p in json_data.get("pip", []))
+        requirements = list(dict.fromkeys(requirements))
+
+        if requirements:
+            print(f"Install: pip packages ({len(requirements)})")
+            self._report("pip", None, 0, len(requirements))
+            if not self._pip_install(requirements):
+                # conflicting pins: install node by node to pinpoint the one that fails
+                for url, repo_path in cloned:
+                    if not self._pip_install(self._read_requirements(repo_path), cwd=repo_path):
+                        print(f"error installing {url} ")
+                        status = False
+            self._report("pip", None, len(requirements), len(requirements))
+
+        for idx, (url, repo_path) in enumerate(cloned):
+            self._report("install_script", url, idx, len(cloned))
+            if not self._run_install_py(url, repo_path):
+                status = False
+
+        print("Installation was " + ("successfull" if status else "unsuccessfull"))
+        return status
 
 
 # TODO: move to a separate interface
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from ..constants import MODEL_FILETYPES
+from .logger import LoggingType, app_logger
+
+
+class PreflightCache:
+    """
+    Persists the outcome of a successful predict() preflight (requirements check, custom node
+    check, model discovery and model path rewriting) so repeated runs of the same workflow can
+    skip it. Entries are keyed by the workflow structure, the ComfyUI commit and the
+    custom_nodes mtime, so updating ComfyUI or installing/removing a node invalidates them.
+    """
+
+    def __init__(self, file_path, max_entries=256):
+        self.file_path = os.path.abspath(file_path)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._entries = None
+
+    # ------------------------------------------------------------------ keys
+
+    @staticmethod
+    def workflow_fingerprint(workflow):
+        """
+        Hash of what the preflight depends on: node ids, class types, links and model-like
+        inputs. Prompt text, seeds and input filenames change per run and are ignored.
+        """
+        structure = []
+        for node_id in sorted(workflow, key=str):
+            node = workflow[node_id]
+            inputs = {}
+            for key, value in (node.get("inputs") or {}).items():
+                if isinstance(value, list):
+                    inputs[key] = value
+                elif isinstance(value, str) and any(value.endswith(ft) for ft in MODEL_FILETYPES):
+                    inputs[key] = value
+            structure.append([str(node_id), node.get("class_type", ""), inputs])
+        return hashlib.sha256(json.dumps(structure, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def comfy_revision(comfy_base_path):
+        """Current ComfyUI commit read from .git without spawning git."""
+        git_dir = os.path.join(comfy_base_path, ".git")
+        try:
+            with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+                head = f.read().strip()
+            if not head.startswith("ref:"):
+                return head
+            ref = head[4:].strip()
+            ref_path = os.path.join(git_dir, ref)
+            if os.path.exists(ref_path):
+                with open(ref_path, "r", encoding="utf-8") as f:
+                    return f.read().strip()
+            packed = os.path.join(git_dir, "packed-refs")
+            if os.path.exists(packed):
+                with open(packed, "r", encoding="utf-8") as f:
+                    for line in f:
+                        parts = line.strip().split(" ")
+                        if len(parts) == 2 and parts[1] == ref:
+                            return parts[0]
+        except OSError:
+            pass
+        return "unknown"
+
+    @staticmethod
+    def custom_nodes_mtime(comfy_base_path):
+        custom_nodes = os.path.join(comfy_base_path, "custom_nodes")
+        if not os.path.isdir(custom_nodes):
+            return 0
+        latest = os.path.getmtime(custom_nodes)
+        with os.scandir(custom_nodes) as entries:
+            for entry in entries:
+                try:
+                    latest = max(latest, entry.stat().st_mtime)
+                except OSError:
+                    continue
+        return latest
+
+    def make_key(self, workflow, comfy_base_path, extra=None):
+        payload = {
+            "workflow": self.workflow_fingerprint(workflow),
+            "comfy_revision": self.comfy_revision(comfy_base_path),
+            "custom_nodes_mtime": self.custom_nodes_mtime(comfy_base_path),
+            "extra": extra or {},
+        }
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    # ------------------------------------------------------------------ storage
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        if os.path.exists(self.file_path):
+            try:
+                with open(self.file_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    self._entries = data
+            except (OSError, ValueError) as e:
+                app_logger.log(LoggingType.DEBUG, f"Ignoring unreadable preflight cache: {e}")
+        return self._entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        tmp_path = f"{self.file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.file_path)
+
+    def get(self, key):
+        with self.lock:
+            entry = self._load().get(key)
+        if not entry:
+            return None
+        # model files may have been moved or deleted since the entry was written
+        for path in entry.get("model_paths", []):
+            if not os.path.exists(path):
+                self.invalidate(key)
+                return None
+        return entry
+
+    def put(self, key, model_rewrites, model_paths):
+        """
+        model_rewrites: {node_id: {input_name: rewritten model path}}
+        model_paths:    absolute model files the workflow resolved to (checked on every hit)
+        """
+        with self.lock:
+            self._entries = None  # merge with entries written by other processes
+            entries = self._load()
+            entries[key] = {
+                "model_rewrites": model_rewrites,
+                "model_paths": sorted(set(model_paths)),
+                "created_at": time.time(),
+            }
+            if len(entries) > self.max_entries:
+                oldest = sorted(entries, key=lambda k: entries[k].get("created_at", 0))
+                for k in oldest[: len(entries) - self.max_entries]:
+                    entries.pop(k, None)
+            self._save()
+
+    def invalidate(self, key=None):
+        with self.lock:
+            self._entries = None
+            entries = self._load()
+            if key is None:
+                entries.clear()
+            else:
+                entries.pop(key, None)
+            self._save()
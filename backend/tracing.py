@@ -0,0 +1,332 @@
+"""Per-task timing spans: stage timings, upstream HTTP calls and queue phases."""
+import asyncio
+import functools
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_task_id: ContextVar[Optional[str]] = ContextVar("trace_task_id", default=None)
+_current_span_id: ContextVar[Optional[str]] = ContextVar("trace_span_id", default=None)
+
+
+class _CountingStream(httpx.AsyncByteStream):
+    """Wrap a response stream to count received bytes and report on close."""
+
+    def __init__(self, inner: Any, on_close: Callable[[int], None]) -> None:
+        self._inner = inner
+        self._on_close = on_close
+        self._size = 0
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            self._size += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._inner.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close(self._size)
+
+
+class TaskTracer:
+    """Collect timing spans per task and export them as waterfall / Chrome trace / OTLP.
+
+    With a store attached, spans are buffered in memory and written in one batch, off the event
+    loop, when the last running stage of the task in this process ends.
+    """
+
+    SERVICE_NAME = "digital-human-backend"
+    PRUNE_INTERVAL_SEC = 3600.0
+
+    def __init__(self, max_spans_per_task: int = 2000, retention_days: float = 7.0) -> None:
+        self.max_spans_per_task = max(1, int(max_spans_per_task))
+        self.retention_days = float(retention_days)
+        # spans not yet written to the store (all spans when there is no store)
+        self._spans: Dict[str, List[Dict[str, Any]]] = {}
+        # spans recorded per task while one of its stages runs here; dropped when the last one ends
+        self._counts: Dict[str, int] = {}
+        self._active_stages: Dict[str, int] = {}
+        self._store: Any = None
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+
+    def attach_store(self, store: Any) -> None:
+        """Persist spans via a TaskStore so spans from worker processes are visible to the API."""
+        self._store = store
+
+    @staticmethod
+    def current_task_id() -> Optional[str]:
+        return _current_task_id.get()
+
+    def record(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        end: float,
+        task_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        span_id: Optional[str] = None,
+        **attrs: Any,
+    ) -> Optional[str]:
+        """Record a finished span; returns its id, or None when no task is bound."""
+        task_id = task_id or _current_task_id.get()
+        if not task_id:
+            return None
+
+        span = {
+            "span_id": span_id or uuid.uuid4().hex[:16],
+            "parent_id": parent_id if parent_id is not None else _current_span_id.get(),
+            "name": name,
+            "category": category,
+            "start": float(start),
+            "end": float(end),
+            "attrs": {k: v for k, v in attrs.items() if v is not None},
+        }
+        with self._lock:
+            count = self._counts.get(task_id, 0)
+            if count >= self.max_spans_per_task:
+                return None
+            self._counts[task_id] = count + 1
+            self._spans.setdefault(task_id, []).append(span)
+        return span["span_id"]
+
+    @contextmanager
+    def span(self, name: str, category: str = "stage", task_id: Optional[str] = None, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """Time a block; yields a mutable attrs dict. Binds task_id for nested spans and HTTP calls."""
+        span_id = uuid.uuid4().hex[:16]
+        parent_id = _current_span_id.get()
+        task_token = _current_task_id.set(task_id) if task_id else None
+        span_token = _current_span_id.set(span_id)
+        span_attrs: Dict[str, Any] = dict(attrs)
+        start = time.time()
+        try:
+            yield span_attrs
+        except BaseException as e:
+            span_attrs.setdefault("error", f"{type(e).__name__}: {e}"[:300])
+            raise
+        finally:
+            _current_span_id.reset(span_token)
+            bound_task_id = _current_task_id.get()
+            if task_token is not None:
+                _current_task_id.reset(task_token)
+            self.record(
+                name,
+                category,
+                start,
+                time.time(),
+                task_id=bound_task_id,
+                parent_id=parent_id,
+                span_id=span_id,
+                **span_attrs,
+            )
+
+    def stage(self, name: str) -> Callable:
+        """Decorate an async TaskManager method whose first argument is task_id."""
+
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            async def wrapper(owner: Any, *args: Any, **kwargs: Any) -> Any:
+                task_id = kwargs.get("task_id", args[0] if args else None)
+                with self._lock:
+                    self._active_stages[task_id] = self._active_stages.get(task_id, 0) + 1
+                try:
+                    with self.span(name, task_id=task_id):
+                        return await fn(owner, *args, **kwargs)
+                finally:
+                    with self._lock:
+                        remaining = self._active_stages.pop(task_id, 1) - 1
+                        if remaining:
+                            self._active_stages[task_id] = remaining
+                        else:
+                            self._counts.pop(task_id, None)
+                    if not remaining and self._store is not None:
+                        await asyncio.to_thread(self.flush, task_id)
+
+            return wrapper
+
+        return decorator
+
+    def flush(self, task_id: str) -> None:
+        """Write the buffered spans of task_id to the store (blocking) and prune expired ones."""
+        if self._store is None:
+            return
+        with self._lock:
+            spans = self._spans.pop(task_id, None)
+        try:
+            if spans:
+                self._store.append_spans(task_id, spans)
+            now = time.time()
+            if self.retention_days > 0 and now - self._last_prune >= self.PRUNE_INTERVAL_SEC:
+                self._last_prune = now
+                self._store.prune_spans(now - self.retention_days * 86400)
+        except Exception:
+            logger.exception("task %s: writing trace spans failed", task_id)
+
+    def get_spans(self, task_id: str) -> List[Dict[str, Any]]:
+        stored = self._store.load_spans(task_id) if self._store is not None else []
+        with self._lock:
+            return stored + [dict(span) for span in self._spans.get(task_id, [])]
+
+    def drop(self, task_id: str) -> None:
+        with self._lock:
+            self._spans.pop(task_id, None)
+            self._counts.pop(task_id, None)
+        if self._store is not None:
+            self._store.delete_spans(task_id)
+
+    @staticmethod
+    def _trace_id(task_id: str) -> str:
+        return uuid.uuid5(uuid.NAMESPACE_URL, task_id).hex
+
+    # ------------------------------------------------------------------ exports
+
+    def waterfall(self, task_id: str) -> Dict[str, Any]:
+        """Spans sorted by start time with offsets relative to the first span."""
+        spans = sorted(self.get_spans(task_id), key=lambda s: (s["start"], -s["end"]))
+        if not spans:
+            return {"started_at": None, "total_ms": 0, "spans": []}
+
+        origin = spans[0]["start"]
+        finish = max(s["end"] for s in spans)
+        depth_by_id: Dict[str, int] = {}
+        rows = []
+        for span in spans:
+            depth = depth_by_id.get(span["parent_id"], -1) + 1 if span["parent_id"] else 0
+            depth_by_id[span["span_id"]] = depth
+            rows.append(
+                {
+                    "name": span["name"],
+                    "category": span["category"],
+                    "depth": depth,
+                    "offset_ms": round((span["start"] - origin) * 1000, 1),
+                    "duration_ms": round((span["end"] - span["start"]) * 1000, 1),
+                    "attrs": span["attrs"],
+                }
+            )
+        return {
+            "started_at": origin,
+            "total_ms": round((finish - origin) * 1000, 1),
+            "spans": rows,
+        }
+
+    def to_chrome_trace(self, task_id: str) -> Dict[str, Any]:
+        """Chrome trace event format (load in chrome://tracing or Perfetto)."""
+        lanes = {"stage": 1, "http": 2, "upstream": 3}
+        events = [
+            {
+                "name": span["name"],
+                "cat": span["category"],
+                "ph": "X",
+                "ts": int(span["start"] * 1_000_000),
+                "dur": max(0, int((span["end"] - span["start"]) * 1_000_000)),
+                "pid": 1,
+                "tid": lanes.get(span["category"], 4),
+                "args": span["attrs"],
+            }
+            for span in self.get_spans(task_id)
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"task_id": task_id}}
+
+    def to_otlp(self, task_id: str) -> Dict[str, Any]:
+        """OTLP/JSON (ExportTraceServiceRequest) payload."""
+        trace_id = self._trace_id(task_id)
+        otlp_spans = []
+        for span in self.get_spans(task_id):
+            attributes = [{"key": "task.id", "value": {"stringValue": task_id}}]
+            attributes.append({"key": "span.category", "value": {"stringValue": span["category"]}})
+            for key, value in span["attrs"].items():
+                attributes.append({"key": key, "value": self._otlp_value(value)})
+            otlp_span = {
+                "traceId": trace_id,
+                "spanId": span["span_id"],
+                "name": span["name"],
+                "kind": 3 if span["category"] == "http" else 1,
+                "startTimeUnixNano": str(int(span["start"] * 1_000_000_000)),
+                "endTimeUnixNano": str(int(span["end"] * 1_000_000_000)),
+                "attributes": attributes,
+                "status": {"code": 2 if "error" in span["attrs"] else 1},
+            }
+            if span["parent_id"]:
+                otlp_span["parentSpanId"] = span["parent_id"]
+            otlp_spans.append(otlp_span)
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [{"key": "service.name", "value": {"stringValue": self.SERVICE_NAME}}]
+                    },
+                    "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otlp_spans}],
+                }
+            ]
+        }
+
+    @staticmethod
+    def _otlp_value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    # ------------------------------------------------------------------ httpx
+
+    def http_event_hooks(self) -> Dict[str, List[Callable]]:
+        """httpx event hooks recording one span per upstream request of the bound task."""
+
+        async def on_request(request: httpx.Request) -> None:
+            request.extensions["trace_start"] = time.time()
+            request.extensions["trace_task_id"] = _current_task_id.get()
+            request.extensions["trace_parent_id"] = _current_span_id.get()
+
+        async def on_response(response: httpx.Response) -> None:
+            request = response.request
+            task_id = request.extensions.get("trace_task_id")
+            if not task_id:
+                return
+            start = request.extensions.get("trace_start") or time.time()
+            parent_id = request.extensions.get("trace_parent_id")
+            request_bytes = request.headers.get("content-length")
+
+            def finish(size: int) -> None:
+                self.record(
+                    f"{request.method} {request.url.host}{request.url.path}",
+                    "http",
+                    start,
+                    time.time(),
+                    task_id=task_id,
+                    parent_id=parent_id,
+                    status_code=response.status_code,
+                    request_bytes=int(request_bytes) if request_bytes and request_bytes.isdigit() else None,
+                    response_bytes=size,
+                )
+
+            if response.is_closed:
+                finish(len(response.content))
+            else:
+                response.stream = _CountingStream(response.stream, finish)
+
+        return {"request": [on_request], "response": [on_response]}
+
+
+tracer = TaskTracer(
+    max_spans_per_task=settings.trace_max_spans_per_task,
+    retention_days=settings.trace_retention_days,
+)
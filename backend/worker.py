@@ -0,0 +1,180 @@
+"""Generation worker processes.
+
+Run alongside the API when GENERATION_WORKER_MODE=process:
+
+    python worker.py --processes 2 --concurrency 2
+
+Each process pulls queued jobs from the shared task store (TASK_STORE_PATH) and runs
+the pipeline stages; the API processes only enqueue jobs and read task status.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Set
+
+from config import settings
+
+logger = logging.getLogger("worker")
+
+
+class _Heartbeat(threading.Thread):
+    """Refresh heartbeat_at of the running jobs from its own thread.
+
+    The event loop can stall (a blocking call, a long synchronous step); beating from the loop
+    would then let the job go stale and be requeued while it still runs, submitting it twice.
+    """
+
+    def __init__(self, store, interval_sec: float) -> None:
+        super().__init__(name="job-heartbeat", daemon=True)
+        self.store = store
+        self.interval_sec = interval_sec
+        self._job_ids: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def add(self, job_id: int) -> None:
+        with self._lock:
+            self._job_ids.add(job_id)
+
+    def discard(self, job_id: int) -> None:
+        with self._lock:
+            self._job_ids.discard(job_id)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        while not self._stop.wait(self.interval_sec):
+            with self._lock:
+                job_ids = list(self._job_ids)
+            try:
+                self.store.heartbeat_jobs(job_ids)
+            except Exception:
+                logger.exception("job heartbeat failed")
+
+
+async def _serve(worker_id: str, concurrency: int) -> None:
+    from models import TaskStatus
+    from task_manager import task_manager
+
+    store = task_manager.store
+    running: Dict[int, asyncio.Task] = {}
+    running_task_ids: Dict[int, str] = {}
+    maintenance_interval = max(1.0, settings.worker_job_stale_sec / 4)
+    heartbeat = _Heartbeat(store, maintenance_interval)
+    heartbeat.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    async def run(job: dict) -> None:
+        error = None
+        try:
+            await task_manager.run_job(job)
+            task = await task_manager.get_task_async(job["task_id"])
+            if task and task.status == TaskStatus.FAILED:
+                error = task.error or task.error_code or "failed"
+        except asyncio.CancelledError:
+            error = "cancelled"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            logger.exception("job %s failed", job["job_id"])
+        finally:
+            heartbeat.discard(job["job_id"])
+            await asyncio.to_thread(store.finish_job, job["job_id"], error)
+            running.pop(job["job_id"], None)
+            running_task_ids.pop(job["job_id"], None)
+
+    async def reap_cancelled() -> None:
+        # Cancellation is requested through the API process, which only marks the task;
+        # the worker that owns the job stops the pipeline and the local ComfyUI run.
+        for job_id, task_id in list(running_task_ids.items()):
+            task = await asyncio.to_thread(store.load_task, task_id)
+            if task is None or task.status == TaskStatus.CANCELLED:
+                logger.info("job %s cancelled (task %s)", job_id, task_id)
+                await task_manager.cancel_local(task_id)
+                job_task = running.get(job_id)
+                if job_task and not job_task.done():
+                    job_task.cancel()
+
+    logger.info("worker %s started (concurrency=%s)", worker_id, concurrency)
+    last_maintenance = 0.0
+    while not stop.is_set():
+        now = time.monotonic()
+        if now - last_maintenance >= maintenance_interval:
+            requeued = await asyncio.to_thread(
+                store.requeue_stale_jobs, settings.worker_job_stale_sec, settings.worker_job_max_attempts
+            )
+            if requeued:
+                logger.warning("requeued %s stale job(s)", requeued)
+            last_maintenance = now
+
+        if len(running) < concurrency:
+            job = await asyncio.to_thread(store.claim_job, worker_id)
+            if job:
+                heartbeat.add(job["job_id"])
+                running[job["job_id"]] = asyncio.create_task(run(job))
+                running_task_ids[job["job_id"]] = job["task_id"]
+                continue
+
+        if running_task_ids:
+            await reap_cancelled()
+
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.worker_poll_interval_sec)
+        except asyncio.TimeoutError:
+            pass
+
+    if running:
+        logger.info("worker %s waiting for %s running job(s)", worker_id, len(running))
+        await asyncio.gather(*running.values(), return_exceptions=True)
+    heartbeat.stop()
+
+
+def _worker_main(index: int, concurrency: int) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    asyncio.run(_serve(worker_id, concurrency))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Digital human generation workers")
+    parser.add_argument("--processes", type=int, default=settings.worker_processes)
+    parser.add_argument("--concurrency", type=int, default=settings.worker_concurrency)
+    args = parser.parse_args()
+
+    processes = max(1, args.processes)
+    concurrency = max(1, args.concurrency)
+    if processes == 1:
+        _worker_main(0, concurrency)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    children = [ctx.Process(target=_worker_main, args=(i, concurrency), daemon=False) for i in range(processes)]
+    for child in children:
+        child.start()
+
+    def forward(signum, frame) -> None:
+        # Children stop claiming jobs on SIGTERM and finish the ones in flight.
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for child in children:
+        child.join()
+
+
+if __name__ == "__main__":
+    main()